@@ -0,0 +1,410 @@
+"""An in-process stand-in for the parts of the splunkd REST API this package uses
+
+It implements login, server info, job create/list/status/control, paged
+results (csv and json_cols), results previews, the export endpoint and lookup
+file deletion, with configurable latency, payload sizes and failure injection.
+Every request is counted and result downloads are timed on the server side,
+so benchmarks can report REST call counts, dispatch-to-first-byte times and
+download throughput without instrumenting the client.
+"""
+
+import re
+import json
+import time
+import random
+import itertools
+import threading
+import datetime
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+from xml.sax.saxutils import escape
+
+ATOM_NAMESPACES = 'xmlns="http://www.w3.org/2005/Atom" xmlns:s="http://dev.splunk.com/ns/rest" xmlns:opensearch="http://a9.com/-/spec/opensearch/1.1/"'
+
+JOBS_PATH = re.compile(r"^/services(?:NS/[^/]+/[^/]+)?/search(?:/v2)?/jobs(?:/(?P<sid>[^/]+))?(?:/(?P<action>[^/]+))?/?$")
+LOOKUP_FILES_PATH = re.compile(r"^/services(?:NS/[^/]+/[^/]+)?/data/lookup-table-files/(?P<name>[^/]+)$")
+LOOKUP_DEFINITION_PATH = re.compile(r"^/services(?:NS/[^/]+/[^/]+)?/data/transforms/lookups/(?P<name>[^/]+)$")
+HEAD_COMMAND = re.compile(r"\|\s*head\s+(?:limit=)?(\d+)")
+
+
+def _atom_dict(values):
+    keys = "".join(f'<s:key name="{escape(str(key))}">{_atom_dict(value) if isinstance(value, dict) else escape(str(value))}</s:key>'
+                   for key, value in values.items())
+    return f"<s:dict>{keys}</s:dict>"
+
+
+class FakeJob:
+    """A search job whose progress is driven by the wall clock"""
+
+    def __init__(self, sid, query, rows, duration):
+        self.sid = sid
+        self.query = query
+        self.rows = rows
+        self.duration = duration
+        self.created = time.time()
+        self.finalized = None
+        self.cancelled = False
+        self.first_byte = None
+        self.last_byte = None
+        self.bytes_sent = 0
+
+    def progress(self):
+        if self.finalized is not None:
+            return 1.0
+        if self.duration <= 0:
+            return 1.0
+        return min(1.0, (time.time() - self.created) / self.duration)
+
+    def result_count(self):
+        """Results available right now (all of them once done, a partial count after finalize)"""
+        done = self.progress() >= 1.0
+        if self.finalized is not None:
+            return int(self.rows * min(1.0, (self.finalized - self.created) / self.duration)) if self.duration > 0 else self.rows
+        return self.rows if done else 0
+
+    def content(self):
+        progress = self.progress()
+        done = progress >= 1.0
+        return {"sid": self.sid,
+                "isDone": "1" if done else "0",
+                "isFailed": "0",
+                "isFinalized": "1" if self.finalized is not None else "0",
+                "dispatchState": "DONE" if done else "RUNNING",
+                "doneProgress": f"{progress:.3f}",
+                "scanCount": str(int(self.rows * progress)),
+                "eventCount": str(int(self.rows * progress)),
+                "resultCount": str(self.result_count()),
+                "resultPreviewCount": str(int(self.rows * progress)),
+                "runDuration": f"{min(time.time() - self.created, self.duration):.3f}",
+                "ttl": "600",
+                "eai:acl": {"owner": "admin", "app": "search", "sharing": "global"}}
+
+
+class FakeSplunkd:
+    """A threaded HTTP server answering like splunkd
+
+    Args:
+        rows (int, optional): results per job, unless the query ends in "| head N"
+        columns (int, optional): fields per result besides _time and host
+        value_size (int, optional): characters per field value
+        cardinality (int, optional): distinct values per field
+        latency (float, optional): seconds added before every response
+        job_duration (float, optional): seconds a job runs before it's done
+        failure_rate (float, optional): fraction of requests (other than logins) answered with fail_status
+        fail_status (int, optional): the HTTP status of injected failures
+        version (string, optional): the splunkd version reported by server/info
+        seed (int, optional): seeds the failure injection
+    """
+
+    def __init__(self, rows=100000, columns=8, value_size=12, cardinality=50, latency=0.0, job_duration=0.5,
+                 failure_rate=0.0, fail_status=503, version="9.0.1", seed=0):
+        self.rows = int(rows)
+        self.columns = int(columns)
+        self.value_size = int(value_size)
+        self.cardinality = max(1, int(cardinality))
+        self.latency = float(latency)
+        self.job_duration = float(job_duration)
+        self.failure_rate = float(failure_rate)
+        self.fail_status = int(fail_status)
+        self.version = version
+        self.session_key = "fake-session-key"
+        self.jobs = {}
+        self.counts = Counter()
+        self.failures = 0
+        self._random = random.Random(seed)
+        self._sids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+        self.fields = ["_time", "host"] + [f"field_{number}" for number in range(self.columns)]
+        self._epoch = int(time.time())
+
+    # Server lifecycle
+
+    def start(self):
+        """Start serving on a free localhost port"""
+        splunkd = self
+
+        class Handler(FakeSplunkdHandler):
+            server_state = splunkd
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-splunkd", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    @property
+    def port(self):
+        return self._server.server_address[1]
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def reset_counters(self):
+        """Forget the request counts and jobs of the previous run"""
+        with self._lock:
+            self.counts.clear()
+            self.jobs.clear()
+            self.failures = 0
+
+    # Bookkeeping
+
+    def count(self, endpoint):
+        with self._lock:
+            self.counts[endpoint] += 1
+
+    def should_fail(self, endpoint):
+        if self.failure_rate <= 0 or endpoint == "login":
+            return False
+        with self._lock:
+            failed = self._random.random() < self.failure_rate
+            if failed:
+                self.failures += 1
+            return failed
+
+    def create_job(self, query):
+        head = HEAD_COMMAND.search(query)
+        rows = int(head.group(1)) if head else self.rows
+        if "outputlookup" in query:
+            rows = 0
+        with self._lock:
+            sid = f"fake_{next(self._sids)}_{int(time.time() * 1000)}"
+            self.jobs[sid] = FakeJob(sid, query, rows, self.job_duration)
+        return self.jobs[sid]
+
+    def download_stats(self):
+        """Server side timings of the result downloads of every job so far
+
+        Returns:
+            stats (dict): dispatch_to_first_byte (seconds, first job), download_bytes and download_seconds
+        """
+        with self._lock:
+            jobs = [job for job in self.jobs.values() if job.first_byte is not None]
+        if not jobs:
+            return {"dispatch_to_first_byte": None, "download_bytes": 0, "download_seconds": 0.0}
+        first_byte = min(jobs, key=lambda job: job.created)
+        return {"dispatch_to_first_byte": first_byte.first_byte - first_byte.created,
+                "download_bytes": sum(job.bytes_sent for job in jobs),
+                "download_seconds": max(job.last_byte for job in jobs) - min(job.first_byte for job in jobs)}
+
+    # Payloads
+
+    def _value(self, row, column):
+        return f"{column}_{row % self.cardinality}".ljust(self.value_size, "x")
+
+    def _row(self, number):
+        stamp = datetime.datetime.fromtimestamp(self._epoch - number, tz=datetime.timezone.utc)
+        values = [stamp.strftime("%Y-%m-%dT%H:%M:%S.000+00:00"), f"host{number % 10}"]
+        values.extend(self._value(number, column) for column in range(self.columns))
+        return values
+
+    def results_body(self, offset, count, total, output_mode):
+        end = total if count <= 0 else min(total, offset + count)
+        rows = [self._row(number) for number in range(offset, end)]
+        if output_mode == "json_cols":
+            if not rows:
+                return b"", "application/json"
+            columns = [list(column) for column in zip(*rows)]
+            return json.dumps({"preview": False, "init_offset": offset, "fields": self.fields, "columns": columns}).encode("utf-8"), "application/json"
+        if output_mode == "json":
+            return json.dumps({"preview": False, "init_offset": offset,
+                               "results": [dict(zip(self.fields, row)) for row in rows]}).encode("utf-8"), "application/json"
+        if not rows:
+            return b"", "text/csv"
+        lines = [",".join(self.fields)] + [",".join(row) for row in rows]
+        return ("\n".join(lines) + "\n").encode("utf-8"), "text/csv"
+
+    def export_body(self, total):
+        lines = []
+        for number in range(total):
+            lines.append(json.dumps({"preview": False, "offset": number, "lastrow": number == total - 1,
+                                     "result": dict(zip(self.fields, self._row(number)))}))
+        return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+class FakeSplunkdHandler(BaseHTTPRequestHandler):
+    """Routes requests to the FakeSplunkd in server_state"""
+
+    protocol_version = "HTTP/1.1"
+    server_state = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def do_DELETE(self):
+        self._dispatch("DELETE")
+
+    def _send(self, status, body=b"", content_type="text/xml; charset=utf-8"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Connection", "Keep-Alive")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _error(self, status, message):
+        body = f'<?xml version="1.0" encoding="UTF-8"?><response><messages><msg type="ERROR">{escape(message)}</msg></messages></response>'
+        self._send(status, body.encode("utf-8"))
+
+    def _params(self):
+        url = urlsplit(self.path)
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > 0:
+            body = self.rfile.read(length).decode("utf-8")
+            params.update({key: values[-1] for key, values in parse_qs(body).items()})
+        return url.path, params
+
+    def _dispatch(self, method):
+        splunkd = self.server_state
+        path, params = self._params()
+        endpoint = self._endpoint(method, path)
+        splunkd.count(endpoint)
+
+        if splunkd.latency > 0:
+            time.sleep(splunkd.latency)
+
+        if splunkd.should_fail(endpoint):
+            self.send_response(splunkd.fail_status)
+            self.send_header("Retry-After", "0")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        if endpoint != "login" and self.headers.get("Authorization") != f"Splunk {splunkd.session_key}":
+            return self._error(401, "call not properly authenticated")
+
+        getattr(self, f"_handle_{endpoint}", self._handle_unknown)(method, path, params)
+
+    def _endpoint(self, method, path):
+        if path.endswith("/auth/login"):
+            return "login"
+        if path.endswith("/server/info"):
+            return "server_info"
+        if LOOKUP_FILES_PATH.match(path):
+            return "lookup_file"
+        if LOOKUP_DEFINITION_PATH.match(path):
+            return "lookup_definition"
+        match = JOBS_PATH.match(path)
+        if match is None:
+            return "unknown"
+        if match.group("sid") == "export":
+            return "export"
+        if match.group("sid") is None:
+            return "jobs_create" if method == "POST" else "jobs_list"
+        return {None: "job_status", "results": "results", "results_preview": "results_preview", "control": "job_control"}.get(match.group("action"), "unknown")
+
+    def _handle_unknown(self, method, path, params):
+        self._error(404, f"Unknown endpoint {method} {path}")
+
+    def _handle_login(self, method, path, params):
+        body = f'<?xml version="1.0" encoding="UTF-8"?><response><sessionKey>{self.server_state.session_key}</sessionKey></response>'
+        self._send(200, body.encode("utf-8"))
+
+    def _handle_server_info(self, method, path, params):
+        entry = (f'<entry><title>server-info</title><content type="text/xml">'
+                 f'{_atom_dict({"version": self.server_state.version, "serverName": "fake-splunkd"})}</content></entry>')
+        self._send(200, f'<?xml version="1.0" encoding="UTF-8"?><feed {ATOM_NAMESPACES}><title>server-info</title>{entry}</feed>'.encode("utf-8"))
+
+    def _job_entry(self, job, root=False):
+        namespaces = f" {ATOM_NAMESPACES}" if root else ""
+        return (f'<entry{namespaces}><title>{escape(job.query)}</title><id>/services/search/jobs/{job.sid}</id>'
+                f'<link href="/services/search/jobs/{job.sid}" rel="alternate"/>'
+                f'<content type="text/xml">{_atom_dict(job.content())}</content></entry>')
+
+    def _job(self, path):
+        # Cancelled jobs are kept for their download stats, but splunkd has forgotten them
+        job = self.server_state.jobs.get(JOBS_PATH.match(path).group("sid"))
+        return None if job is None or job.cancelled else job
+
+    def _handle_jobs_create(self, method, path, params):
+        job = self.server_state.create_job(params.get("search", ""))
+        self._send(201, f'<?xml version="1.0" encoding="UTF-8"?><response><sid>{job.sid}</sid></response>'.encode("utf-8"))
+
+    def _handle_jobs_list(self, method, path, params):
+        jobs = [job for job in self.server_state.jobs.values() if not job.cancelled]
+        # Only the "sid=<sid> OR sid=<sid>" filter the job monitor sends is understood
+        sids = re.findall(r"sid=(\S+)", params.get("search", ""))
+        if sids:
+            jobs = [job for job in jobs if job.sid in sids]
+        if int(params.get("count", 0)) > 0:
+            jobs = jobs[:int(params["count"])]
+        entries = "".join(self._job_entry(job) for job in jobs)
+        body = (f'<?xml version="1.0" encoding="UTF-8"?><feed {ATOM_NAMESPACES}><title>jobs</title>'
+                f'<opensearch:totalResults>{len(jobs)}</opensearch:totalResults>{entries}</feed>')
+        self._send(200, body.encode("utf-8"))
+
+    def _handle_job_status(self, method, path, params):
+        job = self._job(path)
+        if job is None:
+            return self._error(404, f"Unknown sid {JOBS_PATH.match(path).group('sid')}")
+        if method == "DELETE":
+            job.cancelled = True
+            return self._send(200)
+        self._send(200, f'<?xml version="1.0" encoding="UTF-8"?>{self._job_entry(job, root=True)}'.encode("utf-8"))
+
+    def _handle_job_control(self, method, path, params):
+        job = self._job(path)
+        if job is None:
+            return self._error(404, "Unknown sid")
+        if params.get("action") == "finalize" and job.finalized is None:
+            job.finalized = time.time()
+        elif params.get("action") == "cancel":
+            job.cancelled = True
+        self._send(200, b'<?xml version="1.0" encoding="UTF-8"?><response><messages><msg type="INFO">ok</msg></messages></response>')
+
+    def _handle_results(self, method, path, params, preview=False):
+        job = self._job(path)
+        if job is None:
+            return self._error(404, "Unknown sid")
+
+        total = int(job.rows * job.progress()) if preview else job.result_count()
+        offset = int(params.get("offset", 0))
+        count = int(params.get("count", 100 if preview else 0))
+        started = time.time()
+        body, content_type = self.server_state.results_body(offset, count, total, params.get("output_mode", "xml"))
+        self._send(200, body, content_type)
+
+        if not preview:
+            with self.server_state._lock:
+                job.first_byte = started if job.first_byte is None else min(job.first_byte, started)
+                job.last_byte = max(job.last_byte or 0, time.time())
+                job.bytes_sent += len(body)
+
+    def _handle_results_preview(self, method, path, params):
+        self._handle_results(method, path, params, preview=True)
+
+    def _handle_export(self, method, path, params):
+        head = HEAD_COMMAND.search(params.get("search", ""))
+        total = int(head.group(1)) if head else self.server_state.rows
+        job = self.server_state.create_job(params.get("search", ""))
+        started = time.time()
+        body = self.server_state.export_body(total)
+        self._send(200, body, "application/json")
+        with self.server_state._lock:
+            job.first_byte = started
+            job.last_byte = time.time()
+            job.bytes_sent = len(body)
+
+    def _handle_lookup_file(self, method, path, params):
+        self._send(200)
+
+    def _handle_lookup_definition(self, method, path, params):
+        self._error(404, "Could not find object")
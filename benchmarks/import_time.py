@@ -0,0 +1,74 @@
+"""Guard the cost of loading the integration
+
+Each measurement runs in a fresh interpreter. The integration's own
+dependencies (IPython, integration_core, jupyter_integrations_utility) are
+imported first, so only the time and modules added by this package count:
+
+    python -m benchmarks.import_time --max-seconds 0.25 --output import_time.json
+
+The run fails (exit code 1) if importing splunk_core.splunk_full pulls in one of
+the --forbid modules, or takes longer than --max-seconds.
+"""
+
+import sys
+import json
+import argparse
+import subprocess
+
+PREREQUISITES = ["IPython", "integration_core", "jupyter_integrations_utility"]
+
+MEASURE = """
+import sys, json, time
+for name in {prerequisites!r}:
+    __import__(name)
+before = set(sys.modules)
+started = time.perf_counter()
+__import__({module!r})
+seconds = time.perf_counter() - started
+print(json.dumps({{"seconds": seconds, "modules": sorted(set(sys.modules) - before)}}))
+"""
+
+
+def measure(module):
+    """Import module in a fresh interpreter and return its import time and the modules it added"""
+    output = subprocess.run([sys.executable, "-c", MEASURE.format(prerequisites=PREREQUISITES, module=module)],
+                            check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure how long loading the splunk integration takes")
+    parser.add_argument("--repeat", type=int, default=5, help="fresh interpreters per module (the best run is reported)")
+    parser.add_argument("--max-seconds", type=float, default=None, help="fail if importing splunk_core.splunk_full takes longer than this")
+    parser.add_argument("--forbid", default="pandas,splunklib,requests,urllib3,pyarrow",
+                        help="comma separated top level modules splunk_core.splunk_full must not import")
+    parser.add_argument("--output", default="-", help="file to write the JSON results to (- for stdout)")
+    args = parser.parse_args(argv)
+
+    report = {"python": sys.version.split()[0], "modules": {}}
+    for module in ["splunk_core", "splunk_core.splunk_full"]:
+        runs = [measure(module) for _ in range(args.repeat)]
+        best = min(runs, key=lambda run: run["seconds"])
+        report["modules"][module] = {"seconds": best["seconds"],
+                                     "all_seconds": [run["seconds"] for run in runs],
+                                     "imported": sorted(set(name.split(".")[0] for name in best["modules"]))}
+
+    full = report["modules"]["splunk_core.splunk_full"]
+    forbidden = [name for name in args.forbid.split(",") if name.strip() in full["imported"]]
+    report["forbidden_imports"] = forbidden
+    report["too_slow"] = args.max_seconds is not None and full["seconds"] > args.max_seconds
+
+    if args.output == "-":
+        print(json.dumps(report, indent=2))
+    else:
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=2)
+
+    if forbidden or report["too_slow"]:
+        print(f"Import regression: forbidden imports {forbidden}, {full['seconds']:.3f}s (limit {args.max_seconds})", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,236 @@
+"""Benchmark the query, download, parse and lookup upload paths against a fake splunkd
+
+The real Splunk integration and SplunkAPI code runs against FakeSplunkd, so
+numbers move when this package changes, not when a search head is busy. The
+results are written as JSON so runs can be compared to track regressions:
+
+    python -m benchmarks.run_benchmarks --rows 200000 --latency 0.005 --output bench.json
+
+Reported per scenario and repeat:
+    seconds                 wall clock time of the scenario
+    dispatch_to_first_byte  from job creation to the first results byte (server side)
+    download_bytes          result bytes sent by the server
+    throughput_mb_s         download_bytes over the server side download time
+    parse_seconds           time spent turning a payload into a dataframe (parse scenario)
+    peak_rss_mb             the highest resident set size seen while the scenario ran
+    rest_calls              requests per endpoint, as counted by the server
+    http_requests           requests sent by the SplunkAPI request handler
+    monitor_requests        job listing requests made by the job monitor
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import threading
+import contextlib
+
+import pandas as pd
+
+from benchmarks.fake_splunkd import FakeSplunkd
+
+SCENARIOS = ["custom_query", "read_all_results", "export", "parse", "update_lookup_table"]
+
+
+class PeakRSS:
+    """Samples the resident set size of this process in a background thread"""
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    @staticmethod
+    def rss():
+        try:
+            import psutil
+            return psutil.Process().memory_info().rss
+        except ImportError:
+            pass
+        try:
+            with open("/proc/self/statm") as statm:
+                return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except (OSError, ValueError, IndexError):
+            # Not Linux: the lifetime peak is the best we can do
+            import resource
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            return peak if sys.platform == "darwin" else peak * 1024
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, self.rss())
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self.peak = self.rss()
+        self._thread = threading.Thread(target=self._run, name="peak-rss", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self.rss())
+
+
+def make_integration(fake, args):
+    """Build the Splunk integration with an instance attached to the fake splunkd
+
+    The instance's session is created directly instead of through connect(),
+    which would prompt for a password.
+    """
+    from IPython.core.interactiveshell import InteractiveShell
+    from splunk_core.splunk_full import Splunk
+    from splunk_utils.splunk_api import SplunkAPI
+
+    splunk = Splunk(InteractiveShell.instance(), debug=False)
+    splunk.opts["splunk_cache_enabled"][0] = 0
+    splunk.opts["splunk_results_page_size"][0] = args.page_size
+    splunk.opts["splunk_results_workers"][0] = args.workers
+    splunk.opts["splunk_results_parser"][0] = args.parser
+
+    session = SplunkAPI(host="127.0.0.1", port=fake.port, username="bench", app="search", password="bench", autologin=True,
+                        scheme="http", poll_intervals=(splunk.opts["splunk_job_poll_min_interval"][0], splunk.opts["splunk_job_poll_max_interval"][0]),
+                        http_options={"retries": args.retries, "backoff": 0.01}, token_cache=None)
+    splunk.instances["bench"] = {"session": session, "connected": True, "options": {}, "user": "bench", "enc_pass": None,
+                                 "host": "127.0.0.1", "port": fake.port, "conn_url": f"http://bench@127.0.0.1:{fake.port}"}
+    return splunk, session
+
+
+def scenario_custom_query(splunk, session, args):
+    dataframe, status = splunk.customQuery(f"search index=bench | head {args.rows}", "bench")
+    return {"rows": len(dataframe) if dataframe is not None else 0, "status": status}
+
+
+def scenario_read_all_results(splunk, session, args):
+    job = session.session.jobs.create(f"search index=bench | head {args.rows}", exec_mode="normal")
+    session.job_monitor.wait(session.job_monitor.watch(job))
+    dataframe = splunk._read_all_results_csv(job, "bench")
+    return {"rows": len(dataframe), "status": "Success"}
+
+
+def scenario_export(splunk, session, args):
+    splunk.cell_options = {"export": True}
+    try:
+        dataframe, status = splunk.customQuery(f"search index=bench | head {args.rows}", "bench")
+    finally:
+        splunk.cell_options = {}
+    return {"rows": len(dataframe) if dataframe is not None else 0, "status": status}
+
+
+def scenario_parse(splunk, session, args):
+    from splunk_utils.result_parsers import PARSERS, get_parser
+
+    job = session.session.jobs.create(f"search index=bench | head {args.rows}", exec_mode="normal")
+    session.job_monitor.wait(session.job_monitor.watch(job))
+
+    parse_seconds = {}
+    payloads = {}
+    for name in PARSERS.keys():
+        parser = get_parser(name)
+        if parser.output_mode not in payloads:
+            payloads[parser.output_mode] = job.results(output_mode=parser.output_mode, count=0).read()
+        started = time.perf_counter()
+        parser.parse(io.BytesIO(payloads[parser.output_mode]))
+        parse_seconds[parser.name] = time.perf_counter() - started
+    return {"rows": args.rows, "status": "Success", "parse_seconds": parse_seconds}
+
+
+def scenario_update_lookup_table(splunk, session, args):
+    dataframe = pd.DataFrame({"key": [f"key_{number}" for number in range(args.lookup_rows)],
+                              "value": [f"value_{number}" for number in range(args.lookup_rows)]})
+    message = session.update_lookup_table(table="bench_lookup.csv", df=dataframe, nocheck=True,
+                                          chunksize=args.lookup_chunksize, workers=args.workers)
+    return {"rows": len(dataframe), "status": message.strip()}
+
+
+def run_scenario(name, fake, splunk, session, args):
+    fake.reset_counters()
+    http_requests = session.http_requests
+    monitor_requests = session.job_monitor.requests
+
+    output = io.StringIO()
+    with PeakRSS() as rss, contextlib.redirect_stdout(output):
+        started = time.perf_counter()
+        try:
+            result = globals()[f"scenario_{name}"](splunk, session, args)
+        except Exception as e:
+            result = {"rows": 0, "status": f"Failure - {type(e).__name__}: {str(e)}"}
+        seconds = time.perf_counter() - started
+
+    download = fake.download_stats()
+    result.update({"scenario": name,
+                   "seconds": seconds,
+                   "dispatch_to_first_byte": download["dispatch_to_first_byte"],
+                   "download_bytes": download["download_bytes"],
+                   "throughput_mb_s": download["download_bytes"] / 1048576 / download["download_seconds"] if download["download_seconds"] > 0 else None,
+                   "peak_rss_mb": rss.peak / 1048576,
+                   "rest_calls": dict(fake.counts),
+                   "injected_failures": fake.failures,
+                   "http_requests": session.http_requests - http_requests,
+                   "monitor_requests": session.job_monitor.requests - monitor_requests})
+    return result
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark jupyter_splunk against an in-process fake splunkd")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help=f"comma separated scenarios to run ({', '.join(SCENARIOS)})")
+    parser.add_argument("--repeat", type=int, default=3, help="runs of each scenario")
+    parser.add_argument("--rows", type=int, default=100000, help="results returned by each search")
+    parser.add_argument("--columns", type=int, default=8, help="fields per result besides _time and host")
+    parser.add_argument("--value-size", type=int, default=12, help="characters per field value")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds the fake splunkd waits before every response")
+    parser.add_argument("--job-duration", type=float, default=0.5, help="seconds each fake search job runs")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="fraction of requests answered with --fail-status")
+    parser.add_argument("--fail-status", type=int, default=503, help="HTTP status of injected failures")
+    parser.add_argument("--page-size", type=int, default=50000, help="splunk_results_page_size")
+    parser.add_argument("--workers", type=int, default=4, help="splunk_results_workers and lookup upload workers")
+    parser.add_argument("--parser", default="pandas", help="splunk_results_parser")
+    parser.add_argument("--retries", type=int, default=3, help="transport retries (splunk_http_retries)")
+    parser.add_argument("--lookup-rows", type=int, default=20000, help="rows uploaded by update_lookup_table")
+    parser.add_argument("--lookup-chunksize", type=int, default=5000, help="rows per update_lookup_table chunk")
+    parser.add_argument("--output", default="-", help="file to write the JSON results to (- for stdout)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip() != ""]
+    unknown = [name for name in scenarios if name not in SCENARIOS]
+    if unknown:
+        raise SystemExit(f"Unknown scenarios: {', '.join(unknown)}")
+
+    fake = FakeSplunkd(rows=args.rows, columns=args.columns, value_size=args.value_size, latency=args.latency,
+                       job_duration=args.job_duration, failure_rate=args.failure_rate, fail_status=args.fail_status)
+    with fake:
+        with contextlib.redirect_stdout(io.StringIO()):
+            splunk, session = make_integration(fake, args)
+        runs = []
+        for name in scenarios:
+            for repeat in range(args.repeat):
+                result = run_scenario(name, fake, splunk, session, args)
+                result["repeat"] = repeat
+                runs.append(result)
+                print(f"{name} #{repeat}: {result['seconds']:.3f}s {result['status']}", file=sys.stderr)
+
+    report = {"created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+              "python": platform.python_version(),
+              "pandas": pd.__version__,
+              "platform": platform.platform(),
+              "config": vars(args),
+              "runs": runs}
+
+    if args.output == "-":
+        json.dump(report, sys.stdout, indent=2, default=str)
+        print()
+    else:
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=2, default=str)
+
+
+if __name__ == "__main__":
+    main()
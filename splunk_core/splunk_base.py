@@ -1,5 +1,6 @@
 #!/usr/bin/python
 
+import importlib
 from IPython.core.magic import (Magics, magics_class, line_magic, cell_magic, line_cell_magic)
 from splunk_core._version import __desc__
 import jupyter_integrations_utility as jiu
@@ -53,10 +54,11 @@ class Splunk(Magics):
             else:
                 if self.debug:
                     jiu.displayMD(f"**[ Dbg ]** Loading full {self.name_str} from base")
-                full_load = f"from {self.name_str}_core.{self.name_str}_full import {self.name_str.capitalize()}\n{self.name_str}_full = {self.name_str.capitalize()}(ipy, debug={str(self.debug)})\nipy.register_magics({self.name_str}_full)\n"
-                if self.debug:
-                    jiu.displayMD("**[ Dbg ]** Load Code: {full_load}")
-                self.shell.ex(full_load)
+                # Import and register the full integration directly instead of exec'ing code in the user namespace
+                full_module = importlib.import_module(f"{self.name_str}_core.{self.name_str}_full")
+                full_integration = getattr(full_module, self.name_str.capitalize())(self.shell, debug=self.debug)
+                self.shell.register_magics(full_integration)
+                self.shell.user_ns[f"{self.name_str}_full"] = full_integration
                 self.shell.user_ns['jupyter_loaded_integrations'][self.name_str] = f"{self.name_str}_full"
                 self.shell.run_cell_magic(self.name_str, line, cell)
 
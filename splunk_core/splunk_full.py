@@ -2,20 +2,35 @@
 
 import datetime
 import re
-from time import sleep
+import contextlib
+import threading
+from collections import deque
 import time
+from concurrent.futures import ThreadPoolExecutor, CancelledError, FIRST_COMPLETED, wait
 from IPython.core.magic import (magics_class, line_cell_magic)
 from IPython.display import display
-import pandas as pd
 
 from splunk_core._version import __desc__
 from integration_core import Integration
 import jupyter_integrations_utility as jiu
 
-from splunk_utils.splunk_api import SplunkAPI
-from splunk_utils.helper_functions import splunk_time, parse_times
+from splunk_utils.lazy_import import lazy_import
+from splunk_utils.helper_functions import splunk_time, parse_times, is_fixed_time, split_queries, resolve_splunk_time, slice_time_range, strip_time_modifiers, unsliceable_commands
+from splunk_utils.spl_parser import parse_spl, outer_times, lowercase_operators, FIELD_COMMANDS
+from splunk_utils.search_optimizer import optimize_search
+from splunk_utils.result_cache import ResultCache
+from splunk_utils.result_parsers import get_parser
+from splunk_utils.result_preview import ResultPreview
+from splunk_utils.frame_typing import compact_dataframe, infer_types
+from splunk_utils.spill import ResultBudget, SpillingCollector, SpilledResult, concat_results
+from splunk_utils.token_cache import TokenCache
+from splunk_utils.query_stats import QueryStats
+from splunk_utils.background_searches import BackgroundSearches
 from splunk_utils.user_input_parser import UserInputParser
 
+# pandas (and splunklib through SplunkAPI) are only imported once they're needed
+pd = lazy_import("pandas")
+
 @magics_class
 class Splunk(Integration):
     # STATIC VARIABLES
@@ -26,7 +41,18 @@ class Splunk(Integration):
     # These are the variables in the opts dict that allowed to be set by the user.
     # These are specific to this custom integration and are joined with the
     # base_allowed_set_opts from the integration base
-    custom_allowed_set_opts = ["splunk_conn_default", "splunk_status_buckets", "splunk_default_earliest_time", "splunk_default_latest_time", "splunk_parse_times", "splunk_autologin", "splunk_dispatch_ttl", "splunk_def_search_level", "splunk_verify", "splunk_surpresssslwarn"]
+    custom_allowed_set_opts = ["splunk_conn_default", "splunk_status_buckets", "splunk_default_earliest_time", "splunk_default_latest_time", "splunk_parse_times", "splunk_autologin", "splunk_dispatch_ttl", "splunk_def_search_level", "splunk_verify", "splunk_surpresssslwarn",
+                               "splunk_results_page_size", "splunk_results_workers", "splunk_cache_enabled", "splunk_cache_max_rows", "splunk_cache_max_bytes", "splunk_cache_ttl",
+                               "splunk_max_concurrent_jobs", "splunk_job_poll_min_interval", "splunk_job_poll_max_interval", "splunk_export_chunk_size",
+                               "splunk_results_parser", "splunk_arrow_dtypes", "splunk_compact_results", "splunk_category_ratio", "splunk_result_timezone", "splunk_server_timezone",
+                               "splunk_lookup_schema_ttl", "splunk_http_pool_size", "splunk_http_retries", "splunk_http_backoff", "splunk_http_connect_timeout", "splunk_http_read_timeout",
+                               "splunk_token_cache", "splunk_token_cache_ttl",
+                               "splunk_sid_history_size", "splunk_preview_rows", "splunk_preview_interval",
+                               "splunk_result_max_rows", "splunk_result_max_bytes", "splunk_spill_format", "splunk_spill_dir",
+                               "splunk_stats_history_size", "splunk_optimize", "splunk_background_workers"]
+
+    # Line magic commands handled by the integration itself rather than by SplunkAPI
+    integration_commands = ["cache", "history", "saved", "stats", "jobs", "cancel"]
 
     myopts = {}
     myopts["splunk_conn_default"] = ["default", "Default instance to connect with"]
@@ -39,6 +65,40 @@ class Splunk(Integration):
     myopts["splunk_dispatch_ttl"] = ["600", "Time to keep results around  We will default to 10 minutes (600 seconds)"]
     myopts["splunk_def_search_level"] = ["verbose", "Can be verbose or smart defaults to smart"]
     myopts["splunk_status_buckets"] = ["0", "number of buckets set to 0 for truly verbose"]
+    myopts["splunk_results_page_size"] = [50000, "Number of results fetched per page when downloading job results (0 fetches everything in one request)"]
+    myopts["splunk_results_workers"] = [4, "Number of result pages downloaded concurrently"]
+    myopts["splunk_cache_enabled"] = [1, "If this is 1, results of queries with absolute or snapped time ranges are cached in the kernel"]
+    myopts["splunk_cache_max_rows"] = [1000000, "Maximum total number of rows held in the result cache"]
+    myopts["splunk_cache_max_bytes"] = [536870912, "Maximum total memory (in bytes) held in the result cache"]
+    myopts["splunk_cache_ttl"] = [900, "Seconds a cached result stays valid"]
+    myopts["splunk_max_concurrent_jobs"] = [4, "Maximum number of search jobs a single cell keeps in flight per instance"]
+    myopts["splunk_job_poll_min_interval"] = [0.2, "Seconds between job status refreshes while jobs are new"]
+    myopts["splunk_job_poll_max_interval"] = [5.0, "Upper bound on the seconds between job status refreshes for long running jobs"]
+    myopts["splunk_export_chunk_size"] = [10000, "Number of rows collected into each dataframe chunk by --export queries"]
+    myopts["splunk_results_parser"] = ["pandas", "How downloaded results are parsed: pandas (CSV), arrow (multi-threaded PyArrow CSV, falls back to pandas if PyArrow isn't installed) or json_cols"]
+    myopts["splunk_arrow_dtypes"] = [0, "If this is 1, the arrow and json_cols parsers return Arrow-backed dataframes"]
+    myopts["splunk_compact_results"] = [0, "If this is 1, results get typed columns: _time as datetime64, numeric-looking columns as numbers and low-cardinality strings as categoricals"]
+    myopts["splunk_category_ratio"] = [0.5, "When compacting results, string columns with at most this ratio of unique values to rows become categoricals"]
+    myopts["splunk_result_timezone"] = ["UTC", "When compacting results, the timezone _time is converted to"]
+    myopts["splunk_server_timezone"] = ["", "The Splunk server's timezone (e.g. America/New_York), snapped times such as -1d@d are resolved in it for --slices and the result cache. Empty uses the kernel's timezone"]
+    myopts["splunk_lookup_schema_ttl"] = [300, "Seconds the field names of a lookup table are cached for upload checks"]
+    myopts["splunk_http_pool_size"] = [10, "Number of keep-alive HTTP connections pooled per Splunk host (shared by instances on the same host and port)"]
+    myopts["splunk_http_retries"] = [3, "Transport level retries for idempotent requests (connection errors, 429, 502, 503, 504)"]
+    myopts["splunk_http_backoff"] = [0.5, "Base seconds for the jittered exponential backoff between transport retries"]
+    myopts["splunk_http_connect_timeout"] = [10, "Seconds to wait for a connection to the Splunk server"]
+    myopts["splunk_http_read_timeout"] = [300, "Seconds to wait for the Splunk server to send data before giving up (--export streams aren't limited)"]
+    myopts["splunk_token_cache"] = [1, "If this is 1, session keys are cached encrypted on disk (memory only if the cryptography package is missing) so reconnects skip the login"]
+    myopts["splunk_token_cache_ttl"] = [3600, "Seconds a cached session key is trusted before logging in again"]
+    myopts["splunk_sid_history_size"] = [100, "Number of search job SIDs remembered by %splunk history (takes effect on load)"]
+    myopts["splunk_preview_rows"] = [100, "Maximum number of rows shown by the refreshing --preview of a running search"]
+    myopts["splunk_preview_interval"] = [5.0, "Minimum seconds between --preview refreshes"]
+    myopts["splunk_result_max_rows"] = [0, "Results with more rows than this are spilled to disk and returned as a lazy SpilledResult (0 means no row limit)"]
+    myopts["splunk_result_max_bytes"] = [2147483648, "Results using more memory (in bytes) than this are spilled to disk and returned as a lazy SpilledResult (0 means no memory limit)"]
+    myopts["splunk_spill_format"] = ["parquet", "File format of spilled results: parquet or feather (both need PyArrow)"]
+    myopts["splunk_stats_history_size"] = [500, "Number of query timing records kept for %splunk stats (takes effect on load)"]
+    myopts["splunk_optimize"] = [0, "Search optimizer: 0 is off, 1 picks fast/smart mode and status_buckets 0 per query and suggests missing | fields projections, 2 also adds those projections to the query"]
+    myopts["splunk_background_workers"] = [4, "Number of --background searches that wait and download at once, later ones queue (takes effect on load)"]
+    myopts["splunk_spill_dir"] = ["", "Directory spilled results are written under (empty uses the system temp directory). Spilled files are removed when the kernel exits"]
 
     # Class Init function - Obtain a reference to the get_ipython()
     def __init__(self, shell, debug=False, *args, **kwargs):
@@ -50,9 +110,52 @@ class Splunk(Integration):
             self.opts[k] = self.myopts[k]
 
         self.user_input_parser = UserInputParser()
+        self.token_cache = TokenCache(debug=self.debug)
+        self.result_cache = ResultCache()
+        self.cell_options = {}
+        self.sid_history = deque(maxlen=int(self.opts["splunk_sid_history_size"][0]))
+        self.query_stats = QueryStats(maxlen=self.opts["splunk_stats_history_size"][0], debug=self.debug)
+        # Each thread running a query (the kernel's and the --background workers) has its own timer,
+        # and the --background workers are quiet
+        self._query_timers = threading.local()
+        self.query_timer = None
+        self.background = BackgroundSearches(max_workers=self.opts["splunk_background_workers"][0])
         self.load_env(self.custom_evars)
         self.parse_instances()
 
+    @property
+    def query_timer(self):
+        """The timer of the query running in this thread, None outside of a query"""
+        return getattr(self._query_timers, "timer", None)
+
+    @query_timer.setter
+    def query_timer(self, timer):
+        self._query_timers.timer = timer
+
+    @property
+    def _quiet(self):
+        """True on --background worker threads, anything they display would land in whichever cell is running"""
+        return getattr(self._query_timers, "quiet", False)
+
+    @_quiet.setter
+    def _quiet(self, quiet):
+        self._query_timers.quiet = quiet
+
+    def _with_timer(self, timer, function, *args, quiet=False):
+        """Call function(*args) with timer as this (worker) thread's query timer"""
+        self.query_timer = timer
+        self._quiet = quiet
+        try:
+            return function(*args)
+        finally:
+            self.query_timer = None
+            self._quiet = False
+
+    def _notice(self, message):
+        """Display a status message, unless this is a --background worker thread"""
+        if not self._quiet:
+            jiu.displayMD(message)
+
     def customAuth(self, instance):
         result = -1
         inst = None
@@ -73,7 +176,9 @@ class Splunk(Integration):
             username = inst['user']
 
             if inst["enc_pass"] is not None:
-                mypass = self.ret_dec_pass(inst["enc_pass"])
+                # Only decrypted when a login actually happens, a cached session key skips it
+                enc_pass = inst["enc_pass"]
+                mypass = lambda: self.ret_dec_pass(enc_pass)
                 inst["connect_pass"] = ""
 
             app_name = inst['options'].get('app_name', 'search')
@@ -93,7 +198,17 @@ class Splunk(Integration):
 
 
             try:
-                inst["session"] = SplunkAPI(host=inst["host"], port=inst["port"], username=username, app=app_name, password=mypass, autologin=self.opts["splunk_autologin"][0], proxies=myproxies, verify=verify, surpressSSLWarn=surpressSSLWarn, debug=self.debug)
+                from splunk_utils.splunk_api import SplunkAPI
+                inst["session"] = SplunkAPI(host=inst["host"], port=inst["port"], username=username, app=app_name, password=mypass, autologin=self.opts["splunk_autologin"][0], proxies=myproxies, verify=verify, surpressSSLWarn=surpressSSLWarn,
+                                          poll_intervals=(self.opts["splunk_job_poll_min_interval"][0], self.opts["splunk_job_poll_max_interval"][0]),
+                                          lookup_schema_ttl=self.opts["splunk_lookup_schema_ttl"][0],
+                                          http_options={"pool_size": self.checkvar(instance, "splunk_http_pool_size"), "retries": self.checkvar(instance, "splunk_http_retries"),
+                                                        "backoff": self.checkvar(instance, "splunk_http_backoff"), "connect_timeout": self.checkvar(instance, "splunk_http_connect_timeout"),
+                                                        "read_timeout": self.checkvar(instance, "splunk_http_read_timeout")},
+                                          token_cache=self.token_cache if int(self.opts["splunk_token_cache"][0]) == 1 else None,
+                                          token_ttl=self.opts["splunk_token_cache_ttl"][0], debug=self.debug)
+                if int(self.opts["splunk_token_cache"][0]) == 1 and not self.token_cache.persistent:
+                    jiu.displayMD(f"**[ ! ]** Session keys are only cached in memory and won't survive a kernel restart: {self.token_cache.unavailable}")
                 result = 0
 
             except Exception as e:
@@ -117,29 +232,36 @@ class Splunk(Integration):
         allow_run = True
         allow_rerun = False
 
-        if self.instances[instance]["last_query"] == query:
+        # Reattaching to an existing job doesn't run the cell's query
+        if self.cell_options.get("sid") is not None:
+            return allow_run
+
+        if self.instances[instance].get("last_query") == query:
             # If the validation allows rerun, that we are here:
             allow_rerun = True
 
-        # Validation checks
+        # Validation checks, all run off a single parse of the query
+        parsed = parse_spl(query)
+        top_level = [command for command in parsed.commands if command.depth == 0]
+        earliest_value, latest_value = outer_times(query)
 
-        # The query doesn't start with the "search" command (we're using a negative lookahead, future self)
-        if re.search(r"^(?!search)", query):
+        # The query doesn't start with the "search" command (or a generating command after a pipe)
+        if len(top_level) > 0 and top_level[0].implicit:
             jiu.displayMD("**[ ! ]** This query doesn't start with the `search` command. \
                           If it fails, try prepending it to the beginning of the query.")
 
-        # The query contains the "search" command but doesn't include a "| table *" command
-        if re.search(r"^(?=search)", query) and re.search(r"\|\s{0,}table", query) == None:
+        # The query contains the "search" command but doesn't include a "| table *" command (or another command that picks the fields)
+        if len(top_level) > 0 and top_level[0].name == "search" and not top_level[0].implicit and not any(command.name in FIELD_COMMANDS for command in top_level):
             jiu.displayMD("**[ ! ]** Your query includes the `search` command but doesn't include the `| table *` command. **This is going to cause issues and is highly recommended that you add this to your query!**")
 
-        # The query contains non-capitalized "AND", "OR", and/or "NOT" operators
-        # This case also addresses weird typos like "aND" and "Not" and all their variations
-        if re.search(r"\s(and|or|not)\s", query, re.IGNORECASE) and re.search(r"\s(AND|OR|NOT)\s", query) == None:
+        # The query contains non-capitalized "AND", "OR", and/or "NOT" operators in a search
+        # This case also addresses weird typos like "aND" and "Not" and all their variations, quoted strings are left alone
+        if len(lowercase_operators(query)) > 0:
             jiu.displayMD("**[ ! ]** Your query contains `and` / `or` operators. Splunk requires these to be capitalized. \
                           Review the [query documentation](https://docs.splunk.com/Documentation/SplunkCloud/9.0.2305/Search/Booleanexpressions).")
 
-        # The query contains an open and close bracket
-        if re.search(r"[\[\]]", query):
+        # The query contains a subsearch
+        if parsed.subsearches > 0:
             jiu.displayMD("**[ ! ]** Your query contains square brackets `[ ]`. This might be executed as a \
                            subquery. Double-check your results!")
             if self.opts["splunk_parse_times"][0] == 1:
@@ -149,26 +271,28 @@ class Splunk(Integration):
                 jiu.displayMD("**[ ! ]** It doesn't appear you are having me parse query times. \
                                Thus, the earliest and latest ONLY apply to outer most part of your query. Results will be inconsistent")
 
+        if not parsed.balanced:
+            jiu.displayMD("**[ ! ]** Your query's square brackets `[ ]` don't pair up. Splunk will likely reject it.")
+
         # The query doesn't contain the "earliest" parameter
-        if re.search(r"earliest", query) == None:
+        if earliest_value is None:
             jiu.displayMD("**[ ! ]** Your query didn't contain the `earliest` parameter. Defaulting to **%s**" % (self.opts[self.name_str + "_default_earliest_time"][0]))
 
         # The query doesn't contain the "latest" parameter
-        if  re.search(r"latest", query) == None:
+        if latest_value is None:
             jiu.displayMD("**[ ! ]** Your query didn't contain the `latest` parameter. Defaulting to **%s**" % (self.opts[self.name_str + "_default_latest_time"][0]))
 
         return allow_run
 
-    def customQuery(self, query, instance, reconnect=True):
-        """Execute a user supplied Splunk query after a %%splunk cell magic
+    def _search_kwargs(self, query, instance):
+        """Build the jobs.create arguments for a query, resolving its earliest and latest times
 
         Keyword arguments:
         query -- the user supplied query
-        instance -- the instance to run the user's query against
+        instance -- the instance the query will run against
 
         Returns:
-        dataframe -- the pandas dataframe with the query results
-        status -- the final status from the Splunk query
+        kwargs -- the search job arguments
         """
 
         # Placeholder values while we attempt to determine if the user supplied "earliest" and "latest" params
@@ -225,61 +349,364 @@ class Splunk(Integration):
             jiu.displayMD(f"**[ Dbg ]** **kwargs**: {kwargs}")
             jiu.displayMD(f"**[ Dbg ]** **query:** {query}")
 
+        return kwargs
+
+    def _optimize_search(self, query, instance, kwargs):
+        """Run the search optimizer over a query if splunk_optimize is on
+
+        Keyword arguments:
+        query -- the user supplied query
+        instance -- the instance the query will run against
+        kwargs -- the search job arguments from _search_kwargs
+
+        Returns:
+        query -- the query to dispatch
+        kwargs -- the search job arguments to dispatch it with
+        """
+
+        level = int(self.checkvar(instance, "splunk_optimize"))
+        if level == 0:
+            return query, kwargs
+
+        query, kwargs, changes, suggestions = optimize_search(query, kwargs, inject_projection=level >= 2)
+        if self.debug:
+            for change in changes:
+                jiu.displayMD(f"**[ Dbg ]** Optimizer: {change}")
+            if len(changes) == 0:
+                jiu.displayMD("**[ Dbg ]** Optimizer: nothing to change")
+        for suggestion in suggestions:
+            jiu.displayMD(f"**[ ! ]** Optimizer suggestion: {suggestion}")
+        return query, kwargs
+
+    def _cached_results(self, query, instance, kwargs):
+        """Look a query up in the result cache
+
+        Keyword arguments:
+        query -- the user supplied query
+        instance -- the instance the query will run against
+        kwargs -- the search job arguments from _search_kwargs
+
+        Returns:
+        cache_key -- the key to store the results under, None if the query isn't cacheable
+        dataframe -- a copy of the cached results, None on a miss
+        """
+        earliest_value = kwargs["earliest_time"]
+        latest_value = kwargs["latest_time"]
+
+        # Only queries whose time range can't move are safe to answer from the cache
+        if int(self.opts["splunk_cache_enabled"][0]) != 1 or not is_fixed_time(earliest_value) or not is_fixed_time(latest_value):
+            return None, None
+
+        # Snapped times (-1h@h) only stay put until the next boundary, so the key holds
+        # the window they resolve to now: crossing a boundary is a cache miss
+        try:
+            timezone = self.checkvar(instance, "splunk_server_timezone")
+            earliest_epoch = resolve_splunk_time(earliest_value, timezone=timezone)
+            latest_epoch = resolve_splunk_time(latest_value, timezone=timezone)
+        except ValueError:
+            return None, None
+
+        self.result_cache.set_limits(self.opts["splunk_cache_max_rows"][0], self.opts["splunk_cache_max_bytes"][0], self.opts["splunk_cache_ttl"][0])
+        result_format = tuple(self.checkvar(instance, name) for name in ["splunk_results_parser", "splunk_arrow_dtypes", "splunk_compact_results",
+                                                                        "splunk_result_timezone", "splunk_category_ratio"])
+        cache_key = self.result_cache.make_key(instance, query, earliest_epoch, latest_epoch, kwargs.get("adhoc_search_level"), result_format)
+
+        if self.cell_options.get("nocache", False):
+            if self.debug:
+                jiu.displayMD("**[ Dbg ]** --nocache supplied, skipping the result cache lookup")
+            return cache_key, None
+
+        cached_dataframe, age = self.result_cache.get(cache_key)
+        if cached_dataframe is None:
+            return cache_key, None
+
+        jiu.displayMD(f"**[ * ]** Returning cached results from {int(age)} seconds ago. Use `--nocache` to run the search again.")
+        return cache_key, cached_dataframe.copy()
+
+    def _cache_results(self, cache_key, dataframe):
+        """Store a query's results in the result cache, if the query is cacheable"""
+        if cache_key is not None and isinstance(dataframe, pd.DataFrame):
+            if not self.result_cache.put(cache_key, dataframe.copy()) and self.debug:
+                self._notice("**[ Dbg ]** Results are larger than the result cache limits and were not cached")
+
+    def _compact_results(self, dataframe, instance):
+        """Apply the typing stage to downloaded results if splunk_compact_results is on for the instance
+
+        Keyword arguments:
+        dataframe -- the downloaded results (may be None after a failure)
+        instance -- the instance the results came from
+
+        Returns:
+        dataframe -- the (possibly) compacted results
+        """
+        if not isinstance(dataframe, pd.DataFrame) or int(self.checkvar(instance, "splunk_compact_results")) != 1:
+            return dataframe
+
+        with self._timed("compact"):
+            dataframe, before, after = compact_dataframe(dataframe, timezone=self.checkvar(instance, "splunk_result_timezone"),
+                                                         category_ratio=float(self.checkvar(instance, "splunk_category_ratio")))
+        if before > 0:
+            self._notice(f"**[ * ]** Compacted results from {before / 1048576:.1f} MB to {after / 1048576:.1f} MB ({before / max(after, 1):.1f}x smaller)")
+        return dataframe
+
+    def _result_budget(self, instance):
+        """Build a ResultBudget from the instance's result budget options"""
+        return ResultBudget(int(self.checkvar(instance, "splunk_result_max_rows")), int(self.checkvar(instance, "splunk_result_max_bytes")))
+
+    def _results_collector(self, instance, budget=None):
+        """Build the SpillingCollector that enforces the instance's result budgets
+
+        Keyword arguments:
+        instance -- the instance the results come from
+        budget -- a ResultBudget shared with the other collectors of the same query (default: a budget of its own)
+        """
+        if budget is None:
+            budget = self._result_budget(instance)
+        collector = SpillingCollector(file_format=self.checkvar(instance, "splunk_spill_format"), directory=self.checkvar(instance, "splunk_spill_dir"), budget=budget)
+        if budget.limited and not collector.enabled and self.debug:
+            self._notice("**[ Dbg ]** PyArrow isn't installed, results can't be spilled to disk and are kept in memory")
+        return collector
+
+    def _results_status(self, dataframe):
+        """Translate downloaded results into the status string returned by customQuery"""
+        if isinstance(dataframe, SpilledResult):
+            return "Success - Spilled to disk"
+        if isinstance(dataframe, pd.DataFrame) and len(dataframe) > 0:
+            return "Success"
+        elif isinstance(dataframe, pd.DataFrame) and len(dataframe) == 0:
+            return "Success - No Results"
+        return "Failure - UKNOWN"
+
+    def customQuery(self, query, instance, reconnect=True):
+        """Execute a user supplied Splunk query after a %%splunk cell magic
+
+        The query's phase timings are added to the %splunk stats history.
+
+        Keyword arguments:
+        query -- the user supplied query
+        instance -- the instance to run the user's query against
+
+        Returns:
+        dataframe -- the pandas dataframe with the query results
+        status -- the final status from the Splunk query
+        """
+        self.query_timer = self.query_stats.start(instance, query, self.instances[instance].get("session"))
+        dataframe = None
+        status = "Failure - interrupted"
+        try:
+            dataframe, status = self._run_query(query, instance, reconnect)
+        finally:
+            timer, self.query_timer = self.query_timer, None
+            self.query_stats.finish(timer, status, len(dataframe) if dataframe is not None else 0)
+        return dataframe, status
+
+    def iter_results(self, query, instance=None, chunksize=None):
+        """Run a query and yield its results as dataframe chunks while they're downloaded
+
+        For pipelines that aggregate or write out results as they arrive instead
+        of holding them all in memory. The next chunk is downloaded while the
+        caller works on the current one. Times are parsed like customQuery does,
+        a lost session or job is logged into and resubmitted once, and a lost
+        page is retried on its own. Closing the generator before the last chunk
+        (or an exception in the caller's loop) cancels the job on the server.
+
+        Keyword arguments:
+        query -- the Splunk query
+        instance -- the (connected) instance to run it against (default: splunk_conn_default)
+        chunksize -- the number of results per chunk (default: splunk_results_page_size)
+
+        Yields:
+        dataframe -- the next chunk of results, in order
+        """
+        if instance is None or instance == "":
+            instance = self.opts[self.name_str + "_conn_default"][0]
+        if instance not in self.instances.keys() or self.instances[instance].get("connected", False) != True:
+            raise ValueError(f"Instance {instance} isn't connected, connect to it with %splunk connect first")
+
+        if chunksize is None or int(chunksize) <= 0:
+            chunksize = int(self.checkvar(instance, "splunk_results_page_size")) or int(self.myopts["splunk_results_page_size"][0])
+        chunksize = int(chunksize)
+
+        query, kwargs = self._optimize_search(query, instance, self._search_kwargs(query, instance))
+        parser = get_parser(self.checkvar(instance, "splunk_results_parser"), arrow_dtypes=int(self.checkvar(instance, "splunk_arrow_dtypes")) == 1)
+        timer = self.query_stats.start(instance, query, self.instances[instance].get("session"))
+        job = None
+        rows = 0
+        status = "Cancelled"
+        try:
+            job = self._dispatch_and_wait(query, instance, kwargs, timer)
+            result_count = int(job["resultCount"])
+
+            pool = ThreadPoolExecutor(max_workers=1)
+            pending = None
+            try:
+                fetch = lambda offset: pool.submit(self._with_timer, timer, self._read_results_page, job, instance, offset, chunksize, parser)
+                offsets = deque(range(0, result_count, chunksize))
+                pending = fetch(offsets.popleft()) if offsets else None
+                while pending is not None:
+                    with timer.phase("download"):
+                        page = pending.result()
+                    pending = fetch(offsets.popleft()) if offsets else None
+                    rows += len(page)
+                    if len(page.columns) > 0:
+                        yield page
+            finally:
+                # Closing the generator mustn't block until the prefetched page has downloaded
+                if pending is not None:
+                    pending.cancel()
+                pool.shutdown(wait=False)
+
+            status = "Success" if rows > 0 else "Success - No Results"
+            job = None
+        except Exception as e:
+            status = f"Failure - {str(e)}"
+            raise
+        finally:
+            if job is not None:
+                # Closed (or failed) before the last chunk: nobody wants the rest of the results
+                try:
+                    job.cancel()
+                except Exception as e:
+                    if self.debug:
+                        print(f"Unable to cancel search job {job.sid}: {str(e)}")
+            self.query_stats.finish(timer, status, rows)
+
+    def _dispatch_and_wait(self, query, instance, kwargs, timer, reconnect=True, on_watch=None):
+        """Create a search job and wait for it without printing progress, logging in again and resubmitting once if needed
+
+        Keyword arguments:
+        on_watch -- called with the job and its monitor handle once it's watched, so another thread can cancel it
+
+        Returns:
+        job -- the finished splunklib search job
+        """
+        session = self.instances[instance]["session"]
+        try:
+            with timer.phase("create"):
+                job = session.session.jobs.create(query, **kwargs)
+        except Exception as e:
+            if reconnect and (str(e).find("Session is not logged in") >= 0 or str(e).find("401") >= 0):
+                session.refresh_login()
+                return self._dispatch_and_wait(query, instance, kwargs, timer, False, on_watch)
+            raise
+        self._record_sid(instance, job.sid, query, kwargs["dispatch.ttl"])
+        if timer is not self.query_timer:
+            # _record_sid already told this thread's timer
+            timer.job_created(job.sid)
+
+        try:
+            handle = session.job_monitor.watch(job)
+            if on_watch is not None:
+                on_watch(job, handle)
+            with timer.phase("wait"):
+                session.job_monitor.wait(handle, on_progress=timer.observe)
+        except Exception as e:
+            msg = str(e)
+            if reconnect and (msg.find("404") >= 0 or msg.lower().find("invalid sid") >= 0):
+                session.refresh_login()
+                return self._dispatch_and_wait(query, instance, kwargs, timer, False, on_watch)
+            raise
+        except BaseException:
+            # Interrupted while waiting, the job would otherwise keep running on the server
+            job.cancel()
+            raise
+        return job
+
+    def _timed(self, phase):
+        """Time a block as a phase of the running query (a no-op outside of customQuery)"""
+        if self.query_timer is None:
+            return contextlib.nullcontext()
+        return self.query_timer.phase(phase)
+
+    def _run_query(self, query, instance, reconnect=True):
+        """Run a query for customQuery
+
+        Keyword arguments:
+        query -- the user supplied query
+        instance -- the instance to run the user's query against
+        reconnect -- log in again and resubmit once if the session or job went away
+
+        Returns:
+        dataframe -- the pandas dataframe with the query results
+        status -- the final status from the Splunk query
+        """
+
+        if self.cell_options.get("sid") is not None:
+            return self._load_job_results(self.cell_options["sid"], instance)
+
+        query, kwargs = self._optimize_search(query, instance, self._search_kwargs(query, instance))
+
+        cache_key, cached_dataframe = self._cached_results(query, instance, kwargs)
+        if cached_dataframe is not None:
+            return cached_dataframe, "Success - Cached"
+
+        if self.cell_options.get("export", False):
+            dataframe, status = self._run_export_query(query, instance, kwargs)
+            dataframe = self._compact_results(dataframe, instance)
+            self._cache_results(cache_key, dataframe)
+            return dataframe, status
+
+        if self.cell_options.get("slices") is not None or self.cell_options.get("slice_by") is not None:
+            dataframe, status = self._run_sliced_query(query, instance, kwargs)
+            dataframe = self._compact_results(dataframe, instance)
+            self._cache_results(cache_key, dataframe)
+            return dataframe, status
+
         dataframe = None
         status = ""
         str_err = ""
 
         # Perform the search
 
-        query_attempts = 1
-        search_job = self.instances[instance]["session"].session.jobs.create(query, **kwargs)
+        with self._timed("create"):
+            search_job = self.instances[instance]["session"].session.jobs.create(query, **kwargs)
+        self._record_sid(instance, search_job.sid, query, kwargs["dispatch.ttl"])
         jiu.displayMD(f"**[ * ]** Search job (**{search_job.name}**) has been created")
         jiu.displayMD("**Progress**")
 
-    
-        while True:
+        # The instance's job monitor refreshes this job (and any others in flight)
+        # in the background with backoff, so we just wait on it here
+        monitor = self.instances[instance]["session"].job_monitor
+        preview = None
+        stopped_early = False
+        if self.cell_options.get("preview", False):
+            preview = ResultPreview(search_job, get_parser(self.checkvar(instance, "splunk_results_parser"), int(self.checkvar(instance, "splunk_arrow_dtypes")) == 1),
+                                    max_rows=self.checkvar(instance, "splunk_preview_rows"), min_interval=self.checkvar(instance, "splunk_preview_interval"), debug=self.debug)
+        try:
             try:
-                while not search_job.is_ready():
-                    time.sleep(0.2)
-#            search_job.refresh() Chat GPT recommended this but it caused an attribute error on the next line... 
-                stats = { "isDone": search_job["isDone"],
-                       "doneProgress": float(search_job["doneProgress"])*100,
-                       "scanCount": int(search_job["scanCount"]),
-                       "eventCount": int(search_job["eventCount"]),
-                       "resultCount": int(search_job["resultCount"])
-                    }
-
-                print(f"\r\t%(doneProgress)03.1f%%\t\t%(scanCount)d scanned\t\t%(eventCount)d matched\t\t%(resultCount)d results" % stats, end="")
-
-                if stats["isDone"] == "1":
-                    jiu.displayMD("**[ * ]** Job has completed!")
-                    break
-                sleep(1)
-            except Exception as e:
-                msg = str(e)
-                if msg.find("404") >= 0 or msg.lower().find("invalid sid") >= 0:
-                    query_attempts += 1
-                    if query_attempts < 3:
-                        print(f"Resubmitting attempt {query_attempts}")
-                        self.disconnect(instance)
-                        self.connect(instance)
-                        dataframe, status = self.customQuery(query, instance, False)
-                    else:
-                        dataframe = None
-                        status = f"Failure - 2 retries - {msg}"
-                else:
-                    dataframe = None
-                    status = f"Failure - {msg}"
-                    return dataframe, status
+                with self._timed("wait"):
+                    monitor.wait(monitor.watch(search_job), on_progress=self._print_progress if preview is None else preview.progress(self._print_progress))
+            except KeyboardInterrupt:
+                if preview is None:
+                    raise
+                # Finalizing stops the search but keeps the results it has so far
+                jiu.displayMD("**[ * ]** Stopping the search early and keeping the results found so far (interrupt again to keep only the preview)")
+                stopped_early = True
+                search_job.finalize()
+                try:
+                    monitor.wait(monitor.watch(search_job), on_progress=self._print_progress)
+                except KeyboardInterrupt:
+                    return preview.dataframe, f"{self._results_status(preview.dataframe)} - Stopped early - Preview only"
+            jiu.displayMD("**[ * ]** Job has completed!")
+        except Exception as e:
+            msg = str(e)
+            if msg.find("404") >= 0 or msg.lower().find("invalid sid") >= 0:
+                if reconnect == True:
+                    print("Resubmitting attempt 2")
+                    self.instances[instance]["session"].refresh_login()
+                    return self._run_query(query, instance, False)
+                return None, f"Failure - resubmitted once - {msg}"
+            return None, f"Failure - {msg}"
+
         try:
             if search_job.results is not None:
-                dataframe = self._read_all_results_csv(search_job, instance)
-                if isinstance(dataframe, pd.DataFrame) and len(dataframe) > 0:
-                    status = "Success"
-                elif isinstance(dataframe, pd.DataFrame) and len(dataframe) == 0:
-                    status = "Success - No Results"
+                dataframe = self._compact_results(self._read_all_results_csv(search_job, instance), instance)
+                status = self._results_status(dataframe)
+                if stopped_early:
+                    # Partial results must never answer a later run of the query
+                    status += " - Stopped early"
                 else:
-                    status = "Failure - UKNOWN"
+                    self._cache_results(cache_key, dataframe)
         except Exception as e:
             dataframe = None
             str_err = f"Error - {str(e)}"
@@ -294,9 +721,8 @@ class Splunk(Integration):
 
             # Try to rerun query
                 if reconnect == True:
-                    self.disconnect(instance)
-                    self.connect(instance)
-                    m, s = self.customQuery(query, instance, False)
+                    self.instances[instance]["session"].refresh_login()
+                    m, s = self._run_query(query, instance, False)
                     dataframe = m
                     status = s
 
@@ -308,45 +734,703 @@ class Splunk(Integration):
 
         return dataframe, status
 
-    def _rebind_job_by_sid(self, serivce, sid):
+    def _print_progress(self, stats):
+        """Print a search job's progress line"""
+        if self.query_timer is not None:
+            self.query_timer.observe(stats)
+        print(f"\r\t%(doneProgress)03.1f%%\t\t%(scanCount)d scanned\t\t%(eventCount)d matched\t\t%(resultCount)d results" % stats, end="")
+
+    def _connected(self, instance):
+        """Make sure an instance exists and is connected, connecting it if needed
+
+        Keyword arguments:
+        instance -- the instance to check
+
+        Returns:
+        connected -- True if the instance has a live session
+        """
+        if instance not in self.instances.keys():
+            jiu.displayMD(f"**[ * ]** Instance **{instance}** not found in instances")
+            return False
+
+        if self.instances[instance].get("connected", False) != True:
+            self.connect(instance)
+
+        return self.instances[instance].get("connected", False) == True
+
+    def _run_concurrently(self, instance, searches, budget=None):
+        """Dispatch several searches on one instance and download each as it finishes
+
+        At most splunk_max_concurrent_jobs jobs are in flight at once. The jobs
+        are refreshed together by the instance's job monitor.
+
+        Keyword arguments:
+        instance -- the (connected) instance to run the searches on
+        searches -- a list of (key, query, kwargs) tuples
+        budget -- a ResultBudget the downloads share (default: one budget per search)
+
+        Returns:
+        results -- a dict mapping each key to a dict with the search's sid, dataframe
+                   (None on failure), error (None on success) and seconds
+        """
+        max_jobs = max(1, int(self.checkvar(instance, "splunk_max_concurrent_jobs")))
+        service = self.instances[instance]["session"].session
+        monitor = self.instances[instance]["session"].job_monitor
+
+        results = {key: {"sid": None, "dataframe": None, "error": None, "seconds": 0.0} for key, _, _ in searches}
+        pending = list(searches)
+        running = {}
+        downloads = {}
+
+        jiu.displayMD(f"**[ * ]** Running {len(pending)} searches with up to {max_jobs} jobs in flight")
+        jiu.displayMD("**Progress**")
+
+        pool = ThreadPoolExecutor(max_workers=max_jobs)
+        try:
+            while pending or running:
+                while pending and len(running) < max_jobs:
+                    key, query, kwargs = pending.pop(0)
+                    try:
+                        with self._timed("create"):
+                            job = service.jobs.create(query, **kwargs)
+                        self._record_sid(instance, job.sid, query, kwargs["dispatch.ttl"])
+                        running[key] = (monitor.watch(job), time.time())
+                        results[key]["sid"] = job.sid
+                    except Exception as e:
+                        results[key]["error"] = f"Failure - {str(e)}"
+
+                # All of the jobs are refreshed together by the monitor, we just wake up when one finishes
+                wait([handle.future for handle, _ in running.values()], timeout=1, return_when=FIRST_COMPLETED)
+
+                for key, (handle, started) in list(running.items()):
+                    if not handle.future.done():
+                        continue
+                    del running[key]
+                    try:
+                        handle.future.result()
+                        downloads[key] = (pool.submit(self._with_timer, self.query_timer, self._read_all_results_csv, handle.job, instance, 3, budget), started)
+                    except Exception as e:
+                        results[key].update(error=f"Failure - {str(e)}", seconds=round(time.time() - started, 1))
+
+                print(f"\r\t{len(downloads)} finished\t\t{len(running)} running\t\t{len(pending)} queued", end="")
+
+            for key, (future, started) in downloads.items():
+                try:
+                    results[key]["dataframe"] = future.result()
+                except Exception as e:
+                    results[key]["error"] = f"Failure - query_error: Error - {str(e)}"
+                results[key]["seconds"] = round(time.time() - started, 1)
+        except BaseException:
+            # Interrupted: don't leave the dispatched jobs running on the server or watched by the monitor
+            for handle, _ in running.values():
+                monitor.unwatch(handle)
+                try:
+                    handle.job.cancel()
+                except Exception as e:
+                    if self.debug:
+                        print(f"Unable to cancel search job {handle.sid}: {str(e)}")
+            raise
+        finally:
+            # The downloads have been collected unless we were interrupted, in which case they're abandoned
+            pool.shutdown(wait=False, cancel_futures=True)
+
+        jiu.displayMD("**[ * ]** All searches have completed!")
+        return results
+
+    def run_multi_query(self, cell, instance):
+        """Run every query of a --multi cell concurrently
+
+        Queries are dispatched together (at most splunk_max_concurrent_jobs in
+        flight), polled together and downloaded as they finish. Each result is
+        bound to the name in its "# name" header, or prev_splunk_<instance>_<n>.
+
+        Keyword arguments:
+        cell -- the contents of the %%splunk cell
+        instance -- the instance to run the queries against
+        """
+        if instance == "":
+            instance = self.opts[self.name_str + "_conn_default"][0]
+
+        names = [name for name, _ in split_queries(cell, self.cell_options.get("delimiter", "---")) if name is not None]
+        duplicates = sorted({name for name in names if names.count(name) > 1})
+        if duplicates:
+            # The later query would silently overwrite the earlier one's results
+            jiu.displayMD(f"**[ * ]** Each query needs its own name, these are used more than once: {', '.join(duplicates)}")
+            return
+
+        if not self._connected(instance):
+            return
+
+        self.query_timer = self.query_stats.start(instance, cell, self.instances[instance].get("session"))
+        summary = {}
+        try:
+            summary = self._run_multi_query(cell, instance)
+        finally:
+            timer, self.query_timer = self.query_timer, None
+            failed = [row for row in summary.values() if row["status"].startswith("Failure")]
+            if len(summary) == 0:
+                status = "Failure - interrupted"
+            elif len(failed) > 0:
+                status = f"Failure - {len(failed)} of {len(summary)} queries failed"
+            else:
+                status = "Success"
+            self.query_stats.finish(timer, status, sum(row["rows"] for row in summary.values()))
+        display(pd.DataFrame(list(summary.values())))
+
+    def _run_multi_query(self, cell, instance):
+        """Run the queries of a --multi cell and bind their results
+
+        Returns:
+        summary -- a {name: summary row} dict of every query
+        """
+        summary = {}
+        searches = []
+        cache_keys = {}
+        for position, (name, query) in enumerate(split_queries(cell, self.cell_options.get("delimiter", "---"))):
+            if name is None:
+                name = f"prev_{self.name_str}_{instance}_{position}"
+            summary[name] = {"name": name, "sid": None, "status": "Queued", "rows": 0, "seconds": 0.0}
+
+            query, kwargs = self._optimize_search(query, instance, self._search_kwargs(query, instance))
+            cache_keys[name], cached_dataframe = self._cached_results(query, instance, kwargs)
+            if cached_dataframe is not None:
+                self.ipy.user_ns[name] = cached_dataframe
+                summary[name].update(status="Success - Cached", rows=len(cached_dataframe))
+            else:
+                searches.append((name, query, kwargs))
+
+        for name, result in self._run_concurrently(instance, searches).items():
+            summary[name].update(sid=result["sid"], seconds=result["seconds"])
+            if result["error"] is not None:
+                summary[name]["status"] = result["error"]
+            else:
+                dataframe = self._compact_results(result["dataframe"], instance)
+                self.ipy.user_ns[name] = dataframe
+                self._cache_results(cache_keys[name], dataframe)
+                summary[name].update(status=self._results_status(dataframe), rows=len(dataframe))
+
+        return summary
+
+    def run_federated_query(self, query, instances):
+        """Run one query against several instances at once (%%splunk inst1,inst2 or --all)
+
+        Every instance is dispatched, waited on and downloaded on its own
+        thread with its own session, so a slow or failing instance only holds
+        up its own row of the summary. The results are concatenated with an
+        instance column (splunk_instance if the results have their own instance
+        field) and bound to the --name variable (default: prev_splunk_federated),
+        the per-instance summary is bound to <variable>_status.
+
+        Keyword arguments:
+        query -- the user supplied query
+        instances -- the names of the instances to run the query against
+        """
+        query = query.strip()
+        bind = self.cell_options.get("bind") or f"prev_{self.name_str}_federated"
+        summary = {instance: {"instance": instance, "sid": None, "status": "Queued", "rows": 0, "seconds": 0.0} for instance in instances}
+
+        # Connecting may prompt for a password, so it's done up front in the kernel's thread
+        searches = []
+        for instance in instances:
+            if not self._connected(instance):
+                summary[instance]["status"] = "Failure - not connected"
+                continue
+            kwargs = self._search_kwargs(query, instance)
+            instance_query, kwargs = self._optimize_search(query, instance, kwargs)
+            cache_key, cached_dataframe = self._cached_results(instance_query, instance, kwargs)
+            if cached_dataframe is not None:
+                summary[instance].update(status="Success - Cached", rows=len(cached_dataframe), dataframe=cached_dataframe)
+            else:
+                searches.append((instance, instance_query, kwargs, cache_key))
+
+        connected = [instance for instance in instances if instance in self.instances and self.instances[instance].get("connected", False) == True]
+        if len(connected) > 0:
+            self.validateQuery(query, connected[0])
+
+        if len(searches) > 0:
+            jiu.displayMD(f"**[ * ]** Running the query on {len(searches)} instances: {', '.join(search[0] for search in searches)}. Interrupt to stop waiting and keep the finished ones.")
+            # The job and monitor handle of every instance, so an interrupt can cancel the ones still running
+            watched = {}
+            pool = ThreadPoolExecutor(max_workers=len(searches))
+            futures = {pool.submit(self._run_federated_search, *search, watched): search[0] for search in searches}
+            pending = set(futures.keys())
+            try:
+                while pending:
+                    done, pending = wait(pending, timeout=1, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        summary[futures[future]].update(future.result())
+                    print(f"\r\t{len(futures) - len(pending)} of {len(futures)} instances finished", end="")
+            except KeyboardInterrupt:
+                for future in pending:
+                    instance = futures[future]
+                    summary[instance]["status"] = "Cancelled - interrupted"
+                    if instance in watched:
+                        job, handle = watched[instance]
+                        summary[instance]["sid"] = job.sid
+                        self.instances[instance]["session"].job_monitor.unwatch(handle)
+                        try:
+                            job.cancel()
+                        except Exception as e:
+                            if self.debug:
+                                print(f"Unable to cancel search job {job.sid}: {str(e)}")
+            finally:
+                # Downloads already running finish on their own, nobody waits for them
+                pool.shutdown(wait=False, cancel_futures=True)
+            print()
+
+        pages = []
+        for instance, row in summary.items():
+            dataframe = row.pop("dataframe", None)
+            if isinstance(dataframe, SpilledResult):
+                # A spilled result stays on disk under its own name instead of being read back to be concatenated
+                self.ipy.user_ns[f"prev_{self.name_str}_{instance}"] = dataframe
+                row["status"] += f" (bound to prev_{self.name_str}_{instance})"
+            elif dataframe is not None and len(dataframe.columns) > 0:
+                dataframe = dataframe.copy()
+                dataframe.insert(0, "instance" if "instance" not in dataframe.columns else "splunk_instance", instance)
+                pages.append(dataframe)
+
+        dataframe = infer_types(concat_results(pages))
+        status = pd.DataFrame(list(summary.values()))
+        self.ipy.user_ns[bind] = dataframe
+        self.ipy.user_ns[f"{bind}_status"] = status
+        failed = [row for row in summary.values() if not row["status"].startswith("Success")]
+        jiu.displayMD(f"**[ * ]** {len(dataframe)} results from {len(summary) - len(failed)} of {len(summary)} instances bound to `{bind}`, the per-instance status to `{bind}_status`")
+        display(status)
+
+    def _run_federated_search(self, instance, query, kwargs, cache_key, watched):
+        """Run one instance's part of a federated query on a worker thread
+
+        Keyword arguments:
+        watched -- the dict the instance's (job, monitor handle) is put in while it runs
+
+        Returns:
+        row -- the instance's summary row, with its dataframe (None on failure)
+        """
+        started = time.time()
+        row = {"sid": None, "status": "Failure - interrupted", "rows": 0, "dataframe": None}
+        self.query_timer = self.query_stats.start(instance, query, self.instances[instance].get("session"))
+        try:
+            job = self._dispatch_and_wait(query, instance, kwargs, self.query_timer, on_watch=lambda job, handle: watched.__setitem__(instance, (job, handle)))
+            row["sid"] = job.sid
+            dataframe = self._compact_results(self._read_all_results_csv(job, instance), instance)
+            self._cache_results(cache_key, dataframe)
+            row.update(status=self._results_status(dataframe), rows=len(dataframe), dataframe=dataframe)
+        except Exception as e:
+            row["status"] = f"Failure - {str(e)}"
+        finally:
+            timer, self.query_timer = self.query_timer, None
+            self.query_stats.finish(timer, row["status"], row["rows"])
+        row["seconds"] = round(time.time() - started, 1)
+        return row
+
+    def run_background_query(self, query, instance):
+        """Start a --background cell's query on a worker thread and return right away
+
+        The job is dispatched, waited on and downloaded by a worker, so other
+        cells can run in the meantime. When it finishes the results are bound
+        to the --name variable (or prev_splunk_<instance>_bg<id>) and the cell's
+        notification is updated.
+
+        Keyword arguments:
+        query -- the user supplied query
+        instance -- the instance to run the query against
+
+        Returns:
+        search -- the BackgroundSearch, whose future resolves to (dataframe, status)
+        """
+        if instance == "":
+            instance = self.opts[self.name_str + "_conn_default"][0]
+
+        if not self._connected(instance):
+            return None
+
+        query = query.strip()
+        self.validateQuery(query, instance)
+        query, kwargs = self._optimize_search(query, instance, self._search_kwargs(query, instance))
+        cache_key, cached_dataframe = self._cached_results(query, instance, kwargs)
+
+        search = self.background.create(instance, query, self.cell_options.get("bind"), self.name_str)
+        if cached_dataframe is not None:
+            self.ipy.user_ns[search.bind] = cached_dataframe
+            search.status, search.rows, search.finished = "Success - Cached", len(cached_dataframe), time.time()
+            search.notify(f"{search.rows} cached results bound to `{search.bind}`")
+            return search
+
+        search.notify(f"queued, the results will be bound to `{search.bind}` (`%splunk jobs` shows its progress, `%splunk cancel {search.id}` stops it)")
+        self.background.submit(search, self._run_background_query, search, query, instance, kwargs, cache_key)
+        return search
+
+    def _run_background_query(self, search, query, instance, kwargs, cache_key):
+        """Run a background search on its worker thread, then bind and announce the results"""
+        self._quiet = True
+        self.query_timer = self.query_stats.start(instance, query, self.instances[instance].get("session"))
+        dataframe = None
+        status = "Failure - interrupted"
+        try:
+            dataframe, status = self._background_search(search, query, instance, kwargs, cache_key)
+        except Exception as e:
+            status = f"Failure - {str(e)}"
+        finally:
+            timer, self.query_timer = self.query_timer, None
+            self._quiet = False
+            self.query_stats.finish(timer, status, len(dataframe) if dataframe is not None else 0)
+
+        search.status = status
+        search.rows = len(dataframe) if dataframe is not None else 0
+        search.finished = time.time()
+        if search.cancelled:
+            search.status = "Cancelled"
+            search.notify("cancelled")
+            return None, search.status
+
+        if dataframe is not None:
+            self.ipy.user_ns[search.bind] = dataframe
+            message = f"{status}, {search.rows} results bound to `{search.bind}` after {search.finished - search.started:.1f}s"
+            if isinstance(dataframe, SpilledResult):
+                message += ". They exceeded the result budget and were spilled to disk, use `.head()`, `.select(columns)`, `.iter_chunks(columns, where)` or `.to_pandas()` on them"
+            search.notify(message)
+        else:
+            search.notify(status)
+        return dataframe, status
+
+    def _background_search(self, search, query, instance, kwargs, cache_key, reconnect=True):
+        """Dispatch, wait on and download a background search, logging in again once if the session or job went away
+
+        Returns:
+        dataframe -- the pandas dataframe with the query results
+        status -- the final status
+        """
+        session = self.instances[instance]["session"]
+        try:
+            with self._timed("create"):
+                job = session.session.jobs.create(query, **kwargs)
+            search.job = job
+            self._record_sid(instance, job.sid, query, kwargs["dispatch.ttl"])
+            if search.cancelled:
+                job.cancel()
+                return None, "Cancelled"
+
+            search.status = "Running"
+            search.notify(f"running search job **{job.sid}**, the results will be bound to `{search.bind}`")
+            search.monitor = session.job_monitor
+            search.handle = session.job_monitor.watch(job)
+            with self._timed("wait"):
+                session.job_monitor.wait(search.handle, on_progress=self.query_timer.observe)
+        except CancelledError:
+            return None, "Cancelled"
+        except Exception as e:
+            if search.cancelled:
+                return None, "Cancelled"
+            msg = str(e)
+            if reconnect and (msg.find("404") >= 0 or msg.lower().find("invalid sid") >= 0 or msg.find("Session is not logged in") >= 0):
+                session.refresh_login()
+                return self._background_search(search, query, instance, kwargs, cache_key, False)
+            return None, f"Failure - {msg}"
+
+        search.status = "Downloading"
+        try:
+            dataframe = self._compact_results(self._read_all_results_csv(job, instance), instance)
+        except Exception as e:
+            msg = str(e)
+            if reconnect and msg.find("Session is not logged in") >= 0:
+                session.refresh_login()
+                return self._background_search(search, query, instance, kwargs, cache_key, False)
+            return None, f"Failure - query_error: Error - {msg}"
+
+        self._cache_results(cache_key, dataframe)
+        return dataframe, self._results_status(dataframe)
+
+    def _run_export_query(self, query, instance, kwargs):
+        """Stream a query's results from the export endpoint instead of waiting for a job
+
+        Rows are collected into dataframe chunks while the search is still running,
+        which is much faster for plain event retrieval. Transforming searches
+        only produce their final rows at the end, so they gain little from this.
+
+        Keyword arguments:
+        query -- the user supplied query
+        instance -- the instance to run the query against
+        kwargs -- the search job arguments from _search_kwargs
+
+        Returns:
+        dataframe -- the pandas dataframe with the query results
+        status -- the final status from the Splunk query
+        """
+        chunk_size = max(1, int(self.checkvar(instance, "splunk_export_chunk_size")))
+        export_kwargs = {"earliest_time": kwargs["earliest_time"], "latest_time": kwargs["latest_time"]}
+
+        jiu.displayMD("**[ * ]** Streaming results from the export endpoint")
+        jiu.displayMD("**Progress**")
+
+        collector = self._results_collector(instance)
+        total = 0
+        started = time.time()
+        try:
+            for rows in self.instances[instance]["session"]._export_chunks(query, chunk_size=chunk_size, **export_kwargs):
+                collector.add(pd.DataFrame(rows))
+                total += len(rows)
+                print(f"\r\t{total} rows received\t\t{time.time() - started:.1f} seconds", end="")
+        except Exception as e:
+            msg = str(e)
+            if total > 0:
+                jiu.displayMD(f"**[ ! ]** The export stream failed after {total} rows: {msg}")
+            return None, f"Failure - query_error: Error - {msg}"
+
+        jiu.displayMD("**[ * ]** Export has completed!")
+        if total == 0:
+            return pd.DataFrame(), "Success - No Results"
+
+        dataframe = self._spill_notice(collector.result())
+        return dataframe, self._results_status(dataframe)
+
+    def _run_sliced_query(self, query, instance, kwargs):
+        """Split a query's time range into slices and run one job per slice concurrently
+
+        Keyword arguments:
+        query -- the user supplied query
+        instance -- the instance to run the query against
+        kwargs -- the search job arguments from _search_kwargs
+
+        Returns:
+        dataframe -- the results of every slice, newest slice first like an unsliced search
+        status -- the final status of the sliced query
+        """
+        blockers = unsliceable_commands(query)
+        if len(blockers) > 0:
+            return None, f"Failure - refusing to slice a query that uses {', '.join(blockers)}: splitting it by time would change its results"
+
+        if parse_spl(query).subsearches > 0:
+            return None, "Failure - refusing to slice a query with subsearches: they would only see their own slice's time range"
+
+        # The inline modifiers are stripped from the slices, so they decide the range even when
+        # splunk_parse_times is off and kwargs only hold the defaults
+        inline_earliest, inline_latest = parse_times(query)
+        earliest_value = splunk_time(inline_earliest) if inline_earliest is not None else kwargs["earliest_time"]
+        latest_value = splunk_time(inline_latest) if inline_latest is not None else kwargs["latest_time"]
+
+        try:
+            # Snaps must land where Splunk would put them, which is in the server's timezone
+            timezone = self.checkvar(instance, "splunk_server_timezone")
+            earliest = resolve_splunk_time(earliest_value, timezone=timezone)
+            latest = resolve_splunk_time(latest_value, timezone=timezone)
+            slices = slice_time_range(earliest, latest, count=self.cell_options.get("slices"), span=self.cell_options.get("slice_by"))
+        except ValueError as e:
+            return None, f"Failure - unable to slice the query: {str(e)}"
+
+        # The slice's bounds replace any inline time modifiers, which would otherwise win over earliest_time/latest_time
+        sliced_query = strip_time_modifiers(query)
+        searches = []
+        for position, (slice_earliest, slice_latest) in enumerate(slices):
+            slice_kwargs = dict(kwargs, earliest_time=str(slice_earliest), latest_time=str(slice_latest))
+            searches.append((position, sliced_query, slice_kwargs))
+
+        if self.debug:
+            jiu.displayMD(f"**[ Dbg ]** Slices: {[(s[2]['earliest_time'], s[2]['latest_time']) for s in searches]}")
+
+        # The slices share one result budget, so together they spill like a single search would
+        budget = self._result_budget(instance)
+        results = self._run_concurrently(instance, searches, budget)
+        errors = [result["error"] for result in results.values() if result["error"] is not None]
+        if len(errors) > 0:
+            return None, f"Failure - {len(errors)} of {len(slices)} slices failed: {errors[0]}"
+
+        pages = [results[position]["dataframe"] for position in sorted(results.keys(), reverse=True)]
+        pages = [page for page in pages if len(page.columns) > 0]
+        if len(pages) == 0:
+            return pd.DataFrame(), "Success - No Results"
+
+        # Slices that were spilled stay on disk, the rest join them there
+        dataframe = concat_results(pages, self.checkvar(instance, "splunk_spill_format"), self.checkvar(instance, "splunk_spill_dir"), budget)
+        if isinstance(dataframe, pd.DataFrame):
+            infer_types(dataframe)
+        return dataframe, self._results_status(dataframe)
+
+    def _record_sid(self, instance, sid, query, ttl):
+        """Remember a job this kernel dispatched, so %splunk history can offer it for --sid
+
+        Keyword arguments:
+        instance -- the instance the job runs on
+        sid -- the job's search ID
+        query -- the job's query
+        ttl -- the job's dispatch.ttl in seconds
+        """
+        if self.query_timer is not None:
+            self.query_timer.job_created(sid)
+        created = datetime.datetime.now()
+        try:
+            expires = created + datetime.timedelta(seconds=int(ttl))
+        except (TypeError, ValueError):
+            # dispatch.ttl can also be given in scheduler periods (e.g. 2p)
+            expires = None
+        self.sid_history.append({"sid": sid, "instance": instance, "query": " ".join(query.split())[:120], "created": created, "expires": expires})
+
+    def _rebind_job_by_sid(self, service, sid):
+        """Look an existing job up by its SID
+
+        Keyword arguments:
+        service -- the instance's SplunkAPI session
+        sid -- the job's search ID
+
+        Returns:
+        job -- the splunklib search job (raises KeyError if the job doesn't exist)
+        """
         if self.debug:
             print("in rebind")
-        return service.jobs[sid]
+        return service.session.jobs[sid]
+
+    def _load_job_results(self, sid, instance):
+        """Download the results of an existing job instead of running a new search
+
+        Keyword arguments:
+        sid -- the job's search ID
+        instance -- the instance the job ran on
+
+        Returns:
+        dataframe -- the pandas dataframe with the job's results
+        status -- the final status
+        """
+        session = self.instances[instance]["session"]
+        try:
+            job = self._rebind_job_by_sid(session, sid)
+        except KeyError:
+            return None, f"Failure - there is no job {sid} on {instance}, it may have expired"
+
+        try:
+            if job["isDone"] != "1":
+                jiu.displayMD(f"**[ * ]** Search job (**{sid}**) is still running, waiting for it to complete")
+                jiu.displayMD("**Progress**")
+                session.job_monitor.wait(session.job_monitor.watch(job), on_progress=self._print_progress)
+
+            jiu.displayMD(f"**[ * ]** Loading the results of search job (**{sid}**)")
+            dataframe = self._compact_results(self._read_all_results_csv(job, instance), instance)
+        except Exception as e:
+            return None, f"Failure - query_error: Error - {str(e)}"
+
+        return dataframe, self._results_status(dataframe)
+
+    def _read_all_results_csv(self, job, instance, max_retries=3, budget=None):
+        """Download all of a finished job's results as a single dataframe
 
-    def _read_all_results_csv(self, job, instance, max_retries=3):
+        The job's resultCount is split into offset/count pages which are fetched
+        concurrently and stitched back together in their original order, so a
+        failed page is retried on its own instead of restarting the download.
+
+        Keyword arguments:
+        job -- the finished splunklib search job
+        instance -- the instance the job was dispatched on
+        max_retries -- how many times a single page may reconnect and retry
+        budget -- a ResultBudget shared with other downloads of the same query
+
+        Returns:
+        dataframe -- the pandas dataframe with every result of the job
+        """
+        with self._timed("download"):
+            parser = get_parser(self.checkvar(instance, "splunk_results_parser"), arrow_dtypes=int(self.checkvar(instance, "splunk_arrow_dtypes")) == 1)
+            page_size = int(self.checkvar(instance, "splunk_results_page_size"))
+            workers = max(1, int(self.checkvar(instance, "splunk_results_workers")))
+            result_count = int(job["resultCount"])
+            collector = self._results_collector(instance, budget)
+
+            # Results that may need spilling are paged even if paging is off, so they never arrive as one huge response
+            if page_size <= 0 and collector.enabled:
+                page_size = int(self.myopts["splunk_results_page_size"][0])
+
+            # count=0 => all results in a single response (the old behavior)
+            if page_size <= 0 or result_count <= page_size:
+                collector.add(self._read_results_page(job, instance, 0, 0, parser, max_retries))
+                return self._spill_notice(collector.result())
+
+            offsets = list(range(0, result_count, page_size))
+            if self.debug:
+                self._notice(f"**[ Dbg ]** Fetching {result_count} results in {len(offsets)} pages of {page_size} with {workers} workers")
+
+            # Only a window of pages is in flight at once, and pages are handed to the collector
+            # in order, so over budget results go to disk instead of piling up in memory.
+            # Pages are parsed as text and typed once they're combined, so a column
+            # can't be numeric in one page and text in the next
+            workers = min(workers, len(offsets))
+            timer = self.query_timer
+            quiet = self._quiet
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                fetch = lambda offset: self._with_timer(timer, self._read_results_page, job, instance, offset, page_size, parser, max_retries, True, quiet=quiet)
+                pending = deque(pool.submit(fetch, offset) for offset in offsets[:workers])
+                remaining = deque(offsets[workers:])
+                while pending:
+                    page = pending.popleft().result()
+                    if remaining:
+                        pending.append(pool.submit(fetch, remaining.popleft()))
+                    if len(page.columns) > 0:
+                        collector.add(page)
+
+            dataframe = collector.result()
+            if isinstance(dataframe, pd.DataFrame):
+                infer_types(dataframe)
+            return self._spill_notice(dataframe)
+
+    def _spill_notice(self, dataframe):
+        """Tell the user how to work with results that were spilled to disk"""
+        if isinstance(dataframe, SpilledResult):
+            self._notice(f"**[ * ]** {len(dataframe)} results exceeded the result budget and were spilled to disk. "
+                          "Use `.head()`, `.select(columns)`, `.iter_chunks(columns, where)` or `.to_pandas()` on the result.")
+        return dataframe
+
+    def _read_results_page(self, job, instance, offset, count, parser, max_retries=3, as_text=False):
+        """Fetch one offset/count page of a job's results, reconnecting if needed
+
+        Keyword arguments:
+        job -- the finished splunklib search job
+        instance -- the instance the job was dispatched on
+        offset -- the index of the first result to fetch
+        count -- the number of results to fetch (0 => all results)
+        parser -- the results parser from get_parser
+        max_retries -- how many times to reconnect and retry this page
+        as_text -- leave every column as strings
+
+        Returns:
+        dataframe -- the pandas dataframe with this page of results
+        """
         attempts = 0
         service = self.instances[instance]['session']
         while True:
             try:
-                # count=0 => all results (your preference)
-                stream = job.results(output_mode="csv", count=0)
+                stream = job.results(output_mode=parser.output_mode, offset=offset, count=count)
+                started = time.time()
                 try:
-                    df = pd.read_csv(stream)
-                except pd.errors.EmptyDataError:
-                    return pd.DataFrame()  # Success - No Results
-
-                return df
+                    return parser.parse(stream, as_text)
+                finally:
+                    if self.query_timer is not None:
+                        # The body is streamed while it's parsed, so the socket wait is taken out of the parse time
+                        network_seconds = getattr(getattr(stream, "raw", None), "read_seconds", 0.0)
+                        self.query_timer.add("parse_seconds", time.time() - started - network_seconds)
+                    stream.close()
 
             except Exception as e:
                 attempts += 1
                 msg = str(e)
-                print(f"Initial error on attempt {attempts} is {msg}")
+                if not self._quiet:
+                    print(f"Initial error on attempt {attempts} (offset {offset}) is {msg}")
                 # Common Splunk Cloud hiccups:
                 needs_rebind = (("unknown sid" in msg.lower()) or ("invalid sid" in msg.lower()) or ("404" in msg))
                 needs_login  = ("Session is not logged in" in msg) or ("401" in msg)
 
                 if (needs_rebind or needs_login) and attempts <= max_retries:
-                    print("Trying reconnect and rebind")
-                # reconnect service, then rebind job by SID
-                    self.reconnect(instance)
+                    if not self._quiet:
+                        print("Trying reconnect and rebind")
+                    if self.query_timer is not None:
+                        self.query_timer.add("retries", 1)
+                    # log in again, then rebind job by SID. Pages are fetched concurrently,
+                    # but they all share the single login done by the first of them.
+                    if needs_login:
+                        self.instances[instance]['session'].refresh_login()
                     service = self.instances[instance]['session']
 
                     job = self._rebind_job_by_sid(service, job.sid)
                     time.sleep(0.5)  # tiny backoff
                     continue
 
-            # Give up: propagate original error
-            raise
+                # Give up: propagate original error
+                raise
 
     def retQueryHelp(self, q_examples=None):
         # Our current customHelp function doesn't support a table for line magics
@@ -364,6 +1448,14 @@ class Splunk(Integration):
         cell_magic_table = ("| Cell Magic | Description |\n"
                             "| ---------- | ----------- |\n"
                             "| \%\%splunk 'instance'<br>'splunk query' | Run a SPL (Splunk) query against myinstance |\n"
+                            "| \%\%splunk 'instance' --nocache<br>'splunk query' | Run the query even if its results are in the result cache |\n"
+                            "| \%\%splunk 'instance' --export<br>'splunk query' | Stream results from the export endpoint while the search runs (best for non-transforming searches) |\n"
+                            "| \%\%splunk 'instance' --slices N<br>'splunk query' | Split the time range into N slices and run them concurrently (`--slice-by 1d` slices by span instead) |\n"
+                            "| \%\%splunk 'instance' --preview | Show a refreshing preview of the results while the search runs. Interrupt the kernel to stop early and keep the results so far. |\n"
+                            "| \%\%splunk 'instance' --sid 'sid' | Load the results of an existing search job instead of running a new search |\n"
+                            "| \%\%splunk 'instance' --background [--name 'variable']<br>'splunk query' | Run the query on a worker thread so other cells can run, binding the results to the variable when it finishes |\n"
+                            "| \%\%splunk 'instance1,instance2' (or --all) [--name 'variable']<br>'splunk query' | Run the query on several instances concurrently. The results get an `instance` column, the per-instance status is bound to `variable_status` |\n"
+                            "| \%\%splunk 'instance' --multi<br># name1<br>'splunk query'<br>---<br># name2<br>'splunk query' | Run several queries concurrently, binding each result dataframe to its `# name` |\n"
                             )
 
         line_magic_helper_text = (f"\n## Running {magic_name} line magics\n"
@@ -374,7 +1466,15 @@ class Splunk(Integration):
 
         line_magic_table = ("| Line Magic | Description |\n"
                             "| ---------- | ----------- |\n"
-                            "| \%splunk update_lookup_table 'options' | Update a lookup table with a dataframe. Type `%splunk update_lookup_table -h` for command syntax. |\n")
+                            "| \%splunk update_lookup_table 'options' | Update a lookup table with a dataframe. Type `%splunk update_lookup_table -h` for command syntax. |\n"
+                            "| \%splunk lookup_schema -i 'instance' -t 'table' [--refresh] | Show the (cached) field names of a lookup table. |\n"
+                            "| \%splunk pool_stats -i 'instance' | Show HTTP connection pool reuse for an instance. |\n"
+                            "| \%splunk history [-i 'instance'] | Show the search jobs dispatched from this notebook and when they expire. |\n"
+                            "| \%splunk saved 'name' [-i 'instance'] [-n 'variable'] | Load the latest scheduled artifact of a saved search without running it. |\n"
+                            "| \%splunk cache [-i 'instance'] [--clear] | Show or clear the cached query results. Only queries with absolute or snapped (`@`) times are cached. |\n"
+                            "| \%splunk jobs [-i 'instance'] | Show the --background searches and their status. |\n"
+                            "| \%splunk cancel 'id' | Cancel a running --background search. |\n"
+                            "| \%splunk stats [-i 'instance'] [--clear] [--hook 'callable'] [--unhook] | Show the phase timings (login, create, queue, run, download, parse, retries) of recent queries, or pass every new record to a callable. |\n")
 
         help_out = cell_magic_helper_text + cell_magic_table + line_magic_helper_text + line_magic_table
 
@@ -389,6 +1489,160 @@ class Splunk(Integration):
 
         return out
 
+    def _line_handler(self, command, **kwargs):
+        """Brokers the line magic commands handled by the integration itself
+
+        Args:
+            command (string): the line_{command} function within this class to run
+            **kwargs (dict): the parsed arguments of the line magic
+        """
+        return getattr(self, f"line_{command}")(**kwargs)
+
+    def line_history(self, instance=None, **kwargs):
+        """Show the search jobs dispatched from this kernel (%splunk history)
+
+        Args:
+            instance (string, optional): only show the jobs of this instance
+        """
+        entries = [dict(entry) for entry in self.sid_history if instance is None or entry["instance"] == instance]
+        if len(entries) == 0:
+            jiu.displayMD("**[ * ]** No search jobs have been dispatched yet")
+            return
+
+        now = datetime.datetime.now()
+        for entry in entries:
+            entry["expired"] = entry["expires"] is not None and entry["expires"] < now
+        jiu.displayMD("**[ * ]** Reload the results of a job that hasn't expired with `%%splunk 'instance' --sid 'sid'`")
+        display(pd.DataFrame(entries))
+
+    def line_saved(self, name, instance=None, bind=None, **kwargs):
+        """Load the latest finished artifact of a saved search instead of dispatching it (%splunk saved)
+
+        Args:
+            name (string): the saved search's name
+            instance (string, optional): the instance the saved search lives on
+            bind (string, optional): the variable to bind the results to (defaults to prev_splunk_<instance>)
+        """
+        if instance is None:
+            instance = self.opts[self.name_str + "_conn_default"][0]
+
+        if not self._connected(instance):
+            return
+
+        session = self.instances[instance]["session"]
+        try:
+            saved_search = session.session.saved_searches[name]
+        except KeyError:
+            jiu.displayMD(f"**[ * ]** There is no saved search **{name}** on {instance}")
+            return
+
+        # Scheduled SIDs carry their dispatch time (..._at_<epoch>_...), newest first saves refreshing them all
+        def dispatch_time(job):
+            dispatched = re.search(r"_at_(\d+)_", job.sid)
+            return int(dispatched.group(1)) if dispatched else 0
+
+        latest_job = None
+        for job in sorted(saved_search.history(), key=dispatch_time, reverse=True):
+            try:
+                if job["isDone"] == "1":
+                    latest_job = job
+                    break
+            except Exception:
+                # The artifact expired between listing and reading it
+                continue
+
+        if latest_job is None:
+            jiu.displayMD(f"**[ * ]** Saved search **{name}** has no finished artifacts on {instance}. Run it with `%%splunk` instead.")
+            return
+
+        jiu.displayMD(f"**[ * ]** Loading the latest artifact of **{name}** (**{latest_job.sid}**)")
+        self._record_sid(instance, latest_job.sid, f"savedsearch {name}", latest_job.content.get("ttl"))
+        dataframe = self._compact_results(self._read_all_results_csv(latest_job, instance), instance)
+
+        bind = bind or f"prev_{self.name_str}_{instance}"
+        self.ipy.user_ns[bind] = dataframe
+        jiu.displayMD(f"**[ * ]** {len(dataframe)} results bound to `{bind}`")
+        display(dataframe)
+
+    def line_cache(self, instance=None, clear=False, **kwargs):
+        """Show or clear the result cache (%splunk cache)
+
+        Args:
+            instance (string, optional): only show or clear entries of this instance
+            clear (bool, optional): clear the entries instead of showing them
+        """
+        if clear:
+            removed = self.result_cache.clear(instance)
+            jiu.displayMD(f"**[ * ]** Removed {removed} cached result(s)")
+        else:
+            entries = [entry for entry in self.result_cache.entries() if instance is None or entry["instance"] == instance]
+            if len(entries) == 0:
+                jiu.displayMD("**[ * ]** The result cache is empty")
+            else:
+                display(pd.DataFrame(entries))
+
+    def line_stats(self, instance=None, clear=False, hook=None, unhook=False, **kwargs):
+        """Show the phase timings of recent queries (%splunk stats)
+
+        Args:
+            instance (string, optional): only show the queries of this instance
+            clear (bool, optional): forget the recorded timings
+            hook (string, optional): the name of a callable in the notebook to call with every new record
+            unhook (bool, optional): stop calling the hook
+        """
+        if hook is not None:
+            callback = self.ipy.user_ns.get(hook)
+            if not callable(callback):
+                jiu.displayMD(f"**[ * ]** `{hook}` isn't a callable in the notebook's namespace")
+                return
+            self.query_stats.hook = callback
+            jiu.displayMD(f"**[ * ]** Every new query timing record will be passed to `{hook}`")
+            return
+
+        if unhook:
+            self.query_stats.hook = None
+            jiu.displayMD("**[ * ]** Query timing records are no longer passed to a hook")
+            return
+
+        if clear:
+            self.query_stats.clear()
+            jiu.displayMD("**[ * ]** Removed the recorded query timings")
+            return
+
+        stats = self.query_stats.dataframe(instance)
+        if len(stats) == 0:
+            jiu.displayMD("**[ * ]** No queries have been timed yet")
+            return
+        self.ipy.user_ns[f"prev_{self.name_str}_stats"] = stats
+        display(stats)
+
+    def line_jobs(self, instance=None, **kwargs):
+        """Show the --background searches of this kernel (%splunk jobs)
+
+        Args:
+            instance (string, optional): only show the searches of this instance
+        """
+        searches = self.background.list(instance)
+        if len(searches) == 0:
+            jiu.displayMD("**[ * ]** No background searches have been started")
+            return
+        display(pd.DataFrame([search.summary() for search in searches]))
+
+    def line_cancel(self, id, **kwargs):
+        """Cancel a --background search (%splunk cancel)
+
+        Args:
+            id (int): the background search's id from %splunk jobs
+        """
+        search = self.background.get(id)
+        if search is None:
+            jiu.displayMD(f"**[ * ]** There is no background search **{id}**, see `%splunk jobs`")
+        elif search.done():
+            jiu.displayMD(f"**[ * ]** Background search **{id}** already finished: {search.status}")
+        else:
+            search.cancel()
+            jiu.displayMD(f"**[ * ]** Cancelled background search **{id}**")
+
     # This is the magic name.
     @line_cell_magic
     def splunk(self, line, cell=None):
@@ -426,18 +1680,21 @@ class Splunk(Integration):
                     if parsed_input["error"] == True:
                         jiu.displayMD(f"**[ ! ]** {parsed_input['message']}")
 
+                    elif parsed_input["input"]["command"] in self.integration_commands:
+                        self._line_handler(**parsed_input["input"])
+
                     else:
                         instance = parsed_input["input"]["instance"]
-                        dataframe = parsed_input["input"]["dataframe"]
+                        dataframe = parsed_input["input"].get("dataframe")
 
                         if instance not in self.instances.keys():
                             jiu.displayMD(f"**[ * ]** Instance **{instance}** not found in instances")
 
-                        elif dataframe not in self.ipy.user_ns.keys():
+                        elif dataframe is not None and dataframe not in self.ipy.user_ns.keys():
                             jiu.displayMD(f"**[ * ]** You supplied a dataframe **{dataframe}** that doesn't seem to exist.")
 
                         else:
-                            user_dataframe = self.ipy.user_ns[dataframe]
+                            user_dataframe = self.ipy.user_ns[dataframe] if dataframe is not None else None
                             response = self.instances[instance]["session"]._handler(**parsed_input["input"], df=user_dataframe)
                             jiu.displayMD(f"**[ * ]** {response}")
 
@@ -445,5 +1702,40 @@ class Splunk(Integration):
                     jiu.displayMD(f"**[ ! ]** There was an error in your line magic: `{e}`")
 
         else: # This is run is the cell is not none, thus it's a cell to process  - For us, that means a query
-            self.handleCell(cell, line)
+            parsed_cell = self.user_input_parser.parse_cell_input(line.replace("\r", ""))
+
+            if self.debug:
+                jiu.displayMD(f"**[ Dbg ]** Parsed Cell Options: `{parsed_cell}`")
+
+            if parsed_cell["error"] == True:
+                jiu.displayMD(f"**[ ! ]** {parsed_cell['message']}")
+            else:
+                self.cell_options = parsed_cell["input"]
+                try:
+                    if self.cell_options["sid"] is not None and cell.strip() == "":
+                        # Give the cell a query that means the same thing
+                        cell = f"| loadjob {self.cell_options['sid']}"
+
+                    federated = self.cell_options["all"] or "," in self.cell_options["instance"]
+                    if federated:
+                        unsupported = [f"--{option.replace('_', '-')}" for option in ["multi", "background", "preview", "sid", "export", "slices", "slice_by"] if self.cell_options[option] not in (None, False)]
+                        if len(unsupported) > 0:
+                            jiu.displayMD(f"**[ ! ]** Running a query on several instances can't be combined with {', '.join(unsupported)}")
+                        elif self.cell_options["all"]:
+                            self.run_federated_query(cell, list(self.instances.keys()))
+                        else:
+                            instances = list(dict.fromkeys(instance.strip() for instance in self.cell_options["instance"].split(",") if instance.strip() != ""))
+                            self.run_federated_query(cell, instances)
+                    elif self.cell_options["background"]:
+                        unsupported = [f"--{option.replace('_', '-')}" for option in ["multi", "preview", "sid", "export", "slices", "slice_by"] if self.cell_options[option] not in (None, False)]
+                        if len(unsupported) > 0:
+                            jiu.displayMD(f"**[ ! ]** --background can't be combined with {', '.join(unsupported)}")
+                        else:
+                            return self.run_background_query(cell, self.cell_options["instance"])
+                    elif self.cell_options["multi"]:
+                        self.run_multi_query(cell, self.cell_options["instance"])
+                    else:
+                        self.handleCell(cell, self.cell_options["instance"])
+                finally:
+                    self.cell_options = {}
 
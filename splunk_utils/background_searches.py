@@ -0,0 +1,122 @@
+import time
+import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from IPython.display import display, Markdown
+
+
+class BackgroundSearch:
+    """A %%splunk --background search: its job, its result future and its notification
+
+    Attributes:
+        id (int): the number %splunk jobs and %splunk cancel know the search by
+        future (Future): resolves to the (dataframe, status) of the search
+        handle (JobHandle): the job monitor's handle, once the job is dispatched
+    """
+
+    def __init__(self, id, instance, query, bind):
+        self.id = id
+        self.instance = instance
+        self.query = " ".join(query.split())
+        self.bind = bind
+        self.job = None
+        self.handle = None
+        self.monitor = None
+        self.future = None
+        self.status = "Dispatching"
+        self.rows = 0
+        self.cancelled = False
+        self.started = time.time()
+        self.finished = None
+        self._display = None
+
+    def __repr__(self):
+        return f"<BackgroundSearch {self.id} on {self.instance}: {self.status}, binds {self.bind}>"
+
+    @property
+    def sid(self):
+        return self.job.sid if self.job is not None else None
+
+    def done(self):
+        return self.future is not None and self.future.done()
+
+    def result(self, timeout=None):
+        """Block until the search is done and return its dataframe (None if it failed)"""
+        return self.future.result(timeout)[0]
+
+    def notify(self, message):
+        """Show (or replace) the search's notification in the cell that started it"""
+        text = f"**[ * ]** Background search **{self.id}** ({self.instance}): {message}"
+        if self._display is None:
+            self._display = display(Markdown(text), display_id=True)
+        else:
+            self._display.update(Markdown(text))
+
+    def cancel(self):
+        """Cancel the search: the job is cancelled on the server and its results are never bound"""
+        self.cancelled = True
+        if self.future is not None and self.future.cancel():
+            # It never reached a worker
+            self.status = "Cancelled"
+            self.finished = time.time()
+        if self.handle is not None:
+            # Wakes the worker up now instead of when the monitor notices the job is gone
+            self.monitor.unwatch(self.handle)
+        if self.job is not None:
+            self.job.cancel()
+
+    def summary(self):
+        finished = self.finished if self.finished is not None else time.time()
+        return {"id": self.id,
+                "instance": self.instance,
+                "sid": self.sid,
+                "bind": self.bind,
+                "status": self.status,
+                "rows": self.rows,
+                "started": datetime.datetime.fromtimestamp(self.started),
+                "seconds": round(finished - self.started, 1),
+                "query": self.query[:120]}
+
+
+class BackgroundSearches:
+    """The background searches of a kernel and the worker threads running them
+
+    Args:
+        max_workers (int, optional): how many background searches wait and download at once
+    """
+
+    def __init__(self, max_workers=4):
+        self.max_workers = int(max_workers)
+        self.searches = {}
+        self._next_id = 1
+        self._lock = threading.Lock()
+        self._pool = None
+
+    def create(self, instance, query, bind=None, name_str="splunk"):
+        """Register a new search, binding to prev_<name_str>_<instance>_bg<id> unless bind is given"""
+        with self._lock:
+            search_id = self._next_id
+            self._next_id += 1
+            search = BackgroundSearch(search_id, instance, query, bind or f"prev_{name_str}_{instance}_bg{search_id}")
+            self.searches[search_id] = search
+        return search
+
+    def submit(self, search, function, *args):
+        """Run function(*args) on a worker thread as the search's future"""
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="splunk-background")
+            search.future = self._pool.submit(function, *args)
+        return search.future
+
+    def get(self, search_id):
+        with self._lock:
+            return self.searches.get(int(search_id))
+
+    def list(self, instance=None):
+        with self._lock:
+            searches = list(self.searches.values())
+        return [search for search in searches if instance is None or search.instance == instance]
+
+    def running(self):
+        return [search for search in self.list() if not search.done()]
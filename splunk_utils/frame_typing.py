@@ -0,0 +1,130 @@
+import numbers
+from splunk_utils.lazy_import import lazy_import
+
+pd = lazy_import("pandas")
+
+
+def is_text_dtype(dtype):
+    """True for columns holding strings: object, StringDtype ("str" in pandas 3) and Arrow strings"""
+    return pd.api.types.is_object_dtype(dtype) or pd.api.types.is_string_dtype(dtype)
+
+
+def infer_types(dataframe):
+    """Give every text column of a combined results dataframe a single type
+
+    Pages and time slices are parsed one by one, so a column can come back
+    numeric in one and text in another. Columns whose values are all numbers
+    become numeric, the others hold only strings (missing values stay NaN).
+
+    Args:
+        dataframe (DataFrame): the combined results, modified in place
+
+    Returns:
+        dataframe (DataFrame): the dataframe with one type per column
+    """
+    for column in dataframe.columns:
+        series = dataframe[column]
+        if not is_text_dtype(series.dtype):
+            continue
+        try:
+            dataframe[column] = pd.to_numeric(series)
+        except (TypeError, ValueError):
+            if pd.api.types.is_object_dtype(series.dtype):
+                # Numbers parsed from the other pages go back to text, multivalue lists are left alone
+                dataframe[column] = series.map(lambda value: str(value) if isinstance(value, numbers.Number) and not pd.isna(value) else value)
+    return dataframe
+
+
+def _memory(dataframe):
+    return int(dataframe.memory_usage(deep=True).sum())
+
+
+def _to_datetime(series, timezone):
+    try:
+        converted = pd.to_datetime(series, utc=True, errors="coerce", format="ISO8601")
+    except (TypeError, ValueError):
+        # Older pandas doesn't know the ISO8601 format shortcut
+        converted = pd.to_datetime(series, utc=True, errors="coerce")
+
+    # Leave the column alone if any value didn't parse
+    if converted.notna().sum() != series.notna().sum():
+        return series
+    return converted.dt.tz_convert(timezone)
+
+
+def _is_exact_numeric(series):
+    """False if converting the strings to numbers would change them: leading zeros or too many digits"""
+    strings = series.dropna().astype(str).str.strip()
+
+    # Zip codes, ports and IDs such as 007 would lose their zeros
+    if strings.str.match(r"^[+-]?0\d").any():
+        return False
+
+    # Integers are exact in int64, but only up to 2**53 once NaNs (or floats) make the column float64
+    integers = strings[strings.str.fullmatch(r"[+-]?\d+")]
+    limit = 2 ** 63 if len(integers) == len(series) else 2 ** 53
+    long_integers = integers[integers.str.lstrip("+-").str.len() >= 16]
+    return not any(abs(int(value)) >= limit for value in long_integers)
+
+
+def _to_numeric(series):
+    converted = pd.to_numeric(series, errors="coerce")
+    if converted.notna().sum() == series.notna().sum() and converted.notna().sum() > 0 and not _is_exact_numeric(series):
+        return series
+    if converted.notna().sum() != series.notna().sum() or converted.notna().sum() == 0:
+        return series
+    if converted.notna().all() and (converted % 1 == 0).all():
+        return pd.to_numeric(converted, downcast="integer")
+    return converted
+
+
+def compact_dataframe(dataframe, time_column="_time", timezone="UTC", category_ratio=0.5):
+    """Shrink the memory footprint of a results dataframe
+
+    Splunk results arrive as string (object or StringDtype) columns. This converts the time
+    column to timezone-aware datetime64 in one vectorized pass, turns
+    numeric-looking columns into (downcast) numbers and low-cardinality string
+    columns (host, source, sourcetype, index, ...) into categoricals.
+
+    Args:
+        dataframe (DataFrame): the results to compact, modified in place
+        time_column (string, optional): the column holding event times
+        timezone (string, optional): the timezone to convert event times to
+        category_ratio (float, optional): string columns with at most this ratio of
+            unique values to rows become categoricals (0 disables categoricals)
+
+    Returns:
+        dataframe (DataFrame): the compacted dataframe
+        before (int): the memory used before compacting, in bytes
+        after (int): the memory used after compacting, in bytes
+    """
+    before = _memory(dataframe)
+    rows = len(dataframe)
+    if rows == 0:
+        return dataframe, before, before
+
+    for column in dataframe.columns:
+        series = dataframe[column]
+
+        if column == time_column and is_text_dtype(series.dtype):
+            dataframe[column] = _to_datetime(series, timezone)
+            continue
+
+        if pd.api.types.is_integer_dtype(series.dtype) and not isinstance(series.dtype, getattr(pd, "ArrowDtype", ())):
+            dataframe[column] = pd.to_numeric(series, downcast="integer")
+            continue
+
+        if not is_text_dtype(series.dtype):
+            continue
+
+        try:
+            series = _to_numeric(series)
+            if is_text_dtype(series.dtype) and category_ratio > 0 and series.nunique() <= rows * category_ratio:
+                series = series.astype("category")
+        except TypeError:
+            # Multivalue fields hold lists, which can't be hashed or converted
+            continue
+
+        dataframe[column] = series
+
+    return dataframe, before, _memory(dataframe)
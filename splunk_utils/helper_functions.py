@@ -1,9 +1,14 @@
 import re
 import datetime
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from splunk_utils.spl_parser import parse_spl, outer_times, remove_time_modifiers
 
 def parse_times(query):
     """Find the "earliest" and "latest" parameter's values from the user's query, if they supplied them
 
+    Only the outer search's modifiers count, the ones inside subsearches and
+    quoted strings (or used as eval fields) are left alone.
+
     Keyword arguments:
     query -- the Splunk query supplied by the user
 
@@ -12,18 +17,7 @@ def parse_times(query):
     latest_value -- the value of the "latest" parameter
     """
 
-    earliest_value = None
-    latest_value = None
-    
-    earliest_pattern = re.search(r"earliest ?= ?[\"\']?([^\s\'\"]+)[\s\"\']", query)
-    if earliest_pattern:
-        earliest_value = earliest_pattern.group(1)
-    
-    latest_pattern = re.search(r"latest ?= ?[\"\']?([^\s\'\"]+)[\s\"\']", query)
-    if latest_pattern:
-        latest_value = latest_pattern.group(1)
-    
-    return earliest_value, latest_value
+    return outer_times(query)
 
 def splunk_time(intime):
     """ Converts Splunk time to the required time format for the Splunk API
@@ -42,4 +36,243 @@ def splunk_time(intime):
         outtime = tmp_dt.strftime("%Y-%m-%dT%H:%M:%S")
     else:
         outtime = intime
-    return outtime
\ No newline at end of file
+    return outtime
+
+def is_fixed_time(intime):
+    """Decide if a time value always resolves to the same point in time
+
+    Keyword arguments:
+    intime -- an earliest/latest value as sent to the Splunk API
+
+    Returns:
+    fixed -- True for absolute times (ISO dates, epoch seconds) and snapped
+             relative times (e.g. -1d@d), False for "now" and plain relative times
+    """
+
+    intime = str(intime).strip()
+
+    if re.match(r"^\d{4}-\d{2}-\d{2}", intime) or re.match(r"^\d+(\.\d+)?$", intime):
+        return True
+
+    return "@" in intime
+
+def split_queries(cell, delimiter="---"):
+    """Split a multi-query cell into named queries
+
+    Queries are separated by lines that only contain the delimiter. A query
+    can be given a name by starting its block with a "# name" line.
+
+    Keyword arguments:
+    cell -- the contents of the %%splunk cell
+    delimiter -- the line separating two queries
+
+    Returns:
+    queries -- a list of (name, query) tuples, name is None when the block isn't named
+    """
+
+    queries = []
+    for block in re.split(rf"^\s*{re.escape(delimiter)}\s*$", cell, flags=re.MULTILINE):
+        lines = block.strip().split("\n")
+        name = None
+
+        name_pattern = re.match(r"^#\s*([A-Za-z_]\w*)\s*$", lines[0].strip())
+        if name_pattern:
+            name = name_pattern.group(1)
+            lines = lines[1:]
+
+        query = "\n".join(lines).strip()
+        if query != "":
+            queries.append((name, query))
+
+    return queries
+
+# Seconds in each fixed-length Splunk time unit
+TIME_UNITS = {"s": 1, "sec": 1, "secs": 1, "second": 1, "seconds": 1,
+              "m": 60, "min": 60, "mins": 60, "minute": 60, "minutes": 60,
+              "h": 3600, "hr": 3600, "hrs": 3600, "hour": 3600, "hours": 3600,
+              "d": 86400, "day": 86400, "days": 86400,
+              "w": 604800, "week": 604800, "weeks": 604800}
+MONTH_UNITS = {"mon": 1, "month": 1, "months": 1, "q": 3, "qtr": 3, "qtrs": 3, "quarter": 3, "quarters": 3,
+               "y": 12, "yr": 12, "yrs": 12, "year": 12, "years": 12}
+
+# Commands whose results depend on seeing every event at once, so a query that
+# uses them can't be split into time slices and concatenated
+UNSLICEABLE_COMMANDS = ["stats", "eventstats", "streamstats", "chart", "timechart", "top", "rare", "dedup",
+                        "head", "tail", "sort", "transaction", "uniq", "join", "append", "appendcols",
+                        "tstats", "mstats", "geostats", "sistats", "sichart", "sitimechart", "sitop",
+                        "inputlookup", "makeresults", "rest", "datamodel", "pivot", "eventcount",
+                        "metadata", "bin", "bucket", "accum", "delta", "autoregress", "reverse"]
+
+
+def _add_months(moment, months):
+    month = moment.month - 1 + months
+    year = moment.year + month // 12
+    month = month % 12 + 1
+    day = min(moment.day, [31, 29 if year % 4 == 0 and (year % 100 != 0 or year % 400 == 0) else 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31][month - 1])
+    return moment.replace(year=year, month=month, day=day)
+
+
+def _snap(moment, unit):
+    if unit in TIME_UNITS and TIME_UNITS[unit] == 1:
+        return moment.replace(microsecond=0)
+    if unit in TIME_UNITS and TIME_UNITS[unit] == 60:
+        return moment.replace(second=0, microsecond=0)
+    if unit in TIME_UNITS and TIME_UNITS[unit] == 3600:
+        return moment.replace(minute=0, second=0, microsecond=0)
+    if unit in TIME_UNITS and TIME_UNITS[unit] == 86400:
+        return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+    week_day = re.match(r"^w(eek)?([0-6])?$", unit)
+    if week_day:
+        day = moment.replace(hour=0, minute=0, second=0, microsecond=0)
+        # Splunk weeks start on Sunday (w0) unless another day is given
+        target = int(week_day.group(2) or 0)
+        return day - datetime.timedelta(days=((day.weekday() + 1) % 7 - target) % 7)
+
+    if unit in MONTH_UNITS:
+        month = moment.month - (moment.month - 1) % MONTH_UNITS[unit]
+        return moment.replace(month=month, day=1, hour=0, minute=0, second=0, microsecond=0)
+
+    raise ValueError(f"Unknown time unit to snap to: {unit}")
+
+
+def resolve_splunk_time(intime, now=None, timezone=None):
+    """Resolve an earliest/latest value to epoch seconds in the kernel's clock
+
+    Splunk resolves relative times in the search head's timezone, so a snap
+    such as @d only lands on the same boundary when timezone matches it.
+
+    Keyword arguments:
+    intime -- an earliest/latest value as sent to the Splunk API: "now", epoch
+              seconds, an ISO time (see splunk_time) or a relative time such as
+              -30d, -1d@d or @w1
+    now -- the datetime relative times are resolved against (defaults to now)
+    timezone -- the timezone name (e.g. America/New_York) snaps and ISO times are
+                resolved in (defaults to the kernel's timezone)
+
+    Returns:
+    epoch -- the resolved time in epoch seconds
+
+    Raises:
+    ValueError -- when the value isn't a time we know how to resolve
+    """
+
+    intime = str(intime).strip()
+    tzinfo = None
+    if timezone:
+        try:
+            tzinfo = ZoneInfo(str(timezone))
+        except (ZoneInfoNotFoundError, ValueError):
+            raise ValueError(f"Unknown timezone {timezone}")
+
+    if now is None:
+        now = datetime.datetime.now(tzinfo)
+
+    if intime in ("", "now"):
+        return int(now.timestamp())
+
+    if re.match(r"^\d+(\.\d+)?$", intime):
+        return int(float(intime))
+
+    if re.match(r"^\d{4}-\d{2}-\d{2}", intime):
+        moment = datetime.datetime.fromisoformat(intime)
+        if tzinfo is not None and moment.tzinfo is None:
+            moment = moment.replace(tzinfo=tzinfo)
+        return int(moment.timestamp())
+
+    relative = re.match(r"^(?:([+-])(\d*)([a-z]+))?(?:@([a-z]+\d?))?$", intime)
+    if not relative:
+        raise ValueError(f"Unable to resolve the time {intime}")
+
+    moment = now
+    sign, amount, unit, snap_unit = relative.groups()
+    if unit is not None:
+        amount = int(amount or 1) * (-1 if sign == "-" else 1)
+        if unit in TIME_UNITS:
+            moment = moment + datetime.timedelta(seconds=amount * TIME_UNITS[unit])
+        elif unit in MONTH_UNITS:
+            moment = _add_months(moment, amount * MONTH_UNITS[unit])
+        else:
+            raise ValueError(f"Unknown time unit in {intime}")
+
+    if snap_unit is not None:
+        moment = _snap(moment, snap_unit)
+
+    return int(moment.timestamp())
+
+
+def slice_time_range(earliest, latest, count=None, span=None):
+    """Split a time range into consecutive slices
+
+    Keyword arguments:
+    earliest -- the start of the range in epoch seconds
+    latest -- the end of the range in epoch seconds
+    count -- the number of equal slices to make
+    span -- the length of each slice as a Splunk span (e.g. 6h, 1d, 1w)
+
+    Returns:
+    slices -- a list of (earliest, latest) epoch tuples, oldest first. Splunk's
+              earliest is inclusive and latest exclusive, so they don't overlap
+    """
+
+    if latest <= earliest:
+        raise ValueError(f"The time range {earliest} - {latest} is empty")
+
+    if span is not None:
+        span_pattern = re.match(r"^(\d+)([a-z]+)$", str(span).strip())
+        if not span_pattern or span_pattern.group(2) not in TIME_UNITS:
+            raise ValueError(f"Unknown slice span {span}")
+        step = int(span_pattern.group(1)) * TIME_UNITS[span_pattern.group(2)]
+    elif count is not None and int(count) > 0:
+        step = -(-(latest - earliest) // int(count))
+    else:
+        raise ValueError("Either a slice count or span is needed")
+
+    if step <= 0:
+        raise ValueError(f"Slice span {span} is too small")
+
+    slices = []
+    start = earliest
+    while start < latest:
+        slices.append((start, min(start + step, latest)))
+        start += step
+    return slices
+
+
+def strip_time_modifiers(query):
+    """Remove inline earliest/latest modifiers from a query
+
+    Keyword arguments:
+    query -- the Splunk query supplied by the user
+
+    Returns:
+    query -- the query without its earliest=/latest= terms
+    """
+
+    return remove_time_modifiers(query)
+
+
+def unsliceable_commands(query):
+    """Find the commands in a query that give wrong answers when run over time slices
+
+    Keyword arguments:
+    query -- the Splunk query supplied by the user
+
+    Returns:
+    commands -- the unsliceable commands used by the query
+    """
+
+    return sorted(set(command.name for command in parse_spl(query).commands if command.name in UNSLICEABLE_COMMANDS))
+
+
+def spl_quote(value):
+    """Escape a value so it can be placed inside a double quoted SPL string
+
+    Keyword arguments:
+    value -- the raw string (e.g. a CSV document for makeresults format=csv)
+
+    Returns:
+    escaped -- the string with backslashes and double quotes escaped
+    """
+
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"")
@@ -0,0 +1,205 @@
+import time
+import threading
+from concurrent.futures import Future, InvalidStateError, wait
+
+
+class JobHandle:
+    """A search job being watched by a JobMonitor
+
+    Attributes:
+        job: the splunklib search job
+        sid (string): the job's search ID
+        future (Future): resolves to the job's final stats, or raises if the job failed
+        stats (dict): the most recent stats seen for the job (None until the first refresh)
+    """
+
+    def __init__(self, job, on_progress=None):
+        self.job = job
+        self.sid = job.sid
+        self.future = Future()
+        self.stats = None
+        self.on_progress = on_progress
+        self.created = time.time()
+        self.misses = 0
+
+
+class JobMonitor:
+    """Tracks every outstanding search job of a Splunk session
+
+    A single background thread refreshes all watched jobs with one
+    /search/jobs listing request per tick, filtered to the watched SIDs (in
+    batches of sids_per_request). Ticks are fast while the youngest job is
+    new and back off towards max_interval as jobs run longer. Progress is
+    delivered through callbacks and completion through futures.
+    """
+
+    # How many ticks a watched job may be missing from the listing before it's failed
+    max_misses = 5
+
+    # How many watched SIDs are filtered for in a single listing request
+    sids_per_request = 50
+
+    def __init__(self, service, min_interval=0.2, max_interval=5.0, backoff=0.1, debug=False):
+        self.service = service
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.debug = debug
+        self.requests = 0
+        self._handles = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def watch(self, job, on_progress=None):
+        """Start tracking a search job
+
+        Args:
+            job: the splunklib search job returned by jobs.create
+            on_progress (callable, optional): called from the monitor thread with
+                the job's stats dict every time they're refreshed
+
+        Returns:
+            handle (JobHandle): the handle whose future resolves when the job is done
+        """
+        handle = JobHandle(job, on_progress=on_progress)
+        with self._lock:
+            self._handles[handle.sid] = handle
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="splunk-job-monitor", daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+        return handle
+
+    def unwatch(self, handle):
+        """Stop tracking a job, cancelling its future if it hasn't resolved yet"""
+        with self._lock:
+            self._handles.pop(handle.sid, None)
+            if not handle.future.done() and handle.future.cancel():
+                # wait() only sees cancelled futures as done once their waiters are notified
+                handle.future.set_running_or_notify_cancel()
+
+    def outstanding(self):
+        """Return the SIDs of every job that is still being tracked"""
+        with self._lock:
+            return list(self._handles.keys())
+
+    def wait(self, handle, on_progress=None, interval=0.25):
+        """Block the calling thread until a watched job is done
+
+        Unlike the on_progress callback given to watch(), on_progress here is
+        called from the waiting thread, so it's safe to print or display from it.
+
+        Args:
+            handle (JobHandle): the handle returned by watch()
+            on_progress (callable, optional): called with the job's stats whenever they change
+            interval (float, optional): how often to check for new stats
+
+        Returns:
+            stats (dict): the job's final stats
+        """
+        last_stats = None
+        try:
+            while True:
+                done, _ = wait([handle.future], timeout=interval)
+                if on_progress is not None and handle.stats is not None and handle.stats is not last_stats:
+                    last_stats = handle.stats
+                    on_progress(last_stats)
+                if done:
+                    return handle.future.result()
+        except BaseException:
+            self.unwatch(handle)
+            raise
+
+    def _interval(self):
+        with self._lock:
+            if not self._handles:
+                return self.max_interval
+            youngest = min(time.time() - handle.created for handle in self._handles.values())
+        return min(self.max_interval, max(self.min_interval, youngest * self.backoff))
+
+    def _run(self):
+        failures = 0
+        while True:
+            with self._lock:
+                if not self._handles:
+                    self._thread = None
+                    return
+
+            self._wakeup.clear()
+            try:
+                self._tick()
+                failures = 0
+            except Exception as e:
+                failures += 1
+                if self.debug:
+                    print(f"Job monitor refresh failed ({failures}): {str(e)}")
+                if failures >= self.max_misses:
+                    self._fail_all(e)
+
+            self._wakeup.wait(self._interval())
+
+    def _tick(self):
+        with self._lock:
+            handles = list(self._handles.values())
+
+        # Only the watched jobs are listed, not every job the user can see on the search head
+        listing = {}
+        for start in range(0, len(handles), self.sids_per_request):
+            batch = handles[start:start + self.sids_per_request]
+            self.requests += 1
+            for entity in self.service.jobs.list(count=len(batch), search=" OR ".join(f"sid={handle.sid}" for handle in batch)):
+                listing[entity.content.get("sid")] = entity
+
+        for handle in handles:
+            entity = listing.get(handle.sid)
+            if entity is None:
+                handle.misses += 1
+                if handle.misses >= self.max_misses:
+                    self._finish(handle, exception=Exception(f"HTTP 404 Not Found -- Invalid sid {handle.sid}: the job no longer exists"))
+                continue
+
+            handle.misses = 0
+            content = entity.content
+            stats = {"isDone": content.get("isDone", "0"),
+                     "dispatchState": content.get("dispatchState", ""),
+                     "doneProgress": float(content.get("doneProgress", 0)) * 100,
+                     "scanCount": int(float(content.get("scanCount", 0))),
+                     "eventCount": int(float(content.get("eventCount", 0))),
+                     "resultCount": int(float(content.get("resultCount", 0))),
+                     "resultPreviewCount": int(float(content.get("resultPreviewCount", 0))),
+                     "runDuration": float(content.get("runDuration", 0))}
+            handle.stats = stats
+
+            if handle.on_progress is not None:
+                try:
+                    handle.on_progress(stats)
+                except Exception as e:
+                    if self.debug:
+                        print(f"Progress callback for {handle.sid} failed: {str(e)}")
+
+            if content.get("isFailed", "0") == "1" or stats["dispatchState"] == "FAILED":
+                messages = content.get("messages", {})
+                self._finish(handle, exception=Exception(f"Search job {handle.sid} failed: {messages}"))
+            elif stats["isDone"] == "1":
+                # Hand the listing's state to the job so reading it doesn't cost another request
+                handle.job.refresh(state=entity.state)
+                self._finish(handle, result=stats)
+
+    def _finish(self, handle, result=None, exception=None):
+        with self._lock:
+            self._handles.pop(handle.sid, None)
+        try:
+            if exception is not None:
+                handle.future.set_exception(exception)
+            else:
+                handle.future.set_result(result)
+        except InvalidStateError:
+            # The waiter gave up on (cancelled) the job in the meantime
+            pass
+
+    def _fail_all(self, exception):
+        with self._lock:
+            handles = list(self._handles.values())
+        for handle in handles:
+            self._finish(handle, exception=exception)
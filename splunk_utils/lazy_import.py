@@ -0,0 +1,34 @@
+import importlib
+import threading
+
+
+class LazyModule:
+    """A stand-in for a module that imports it on first attribute access
+
+    Heavy dependencies (pandas, splunklib, ...) are only needed once a query
+    runs, so deferring them keeps loading the magic cheap.
+    """
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attribute):
+        return getattr(self._load(), attribute)
+
+    def __repr__(self):
+        state = "loaded" if self._module is not None else "not loaded"
+        return f"<lazy module '{self._name}' ({state})>"
+
+
+def lazy_import(name):
+    """Return a LazyModule for name, e.g. pd = lazy_import("pandas")"""
+    return LazyModule(name)
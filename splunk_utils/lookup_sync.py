@@ -0,0 +1,120 @@
+import io
+import csv
+import hashlib
+
+# Names of the helper fields used while syncing. They don't start with "_" so
+# "table" and "outputlookup" treat them like any other field.
+KEY_HASH_FIELD = "jupyter_key_hash"
+ROW_HASH_FIELD = "jupyter_row_hash"
+STAGED_FIELD = "jupyter_staged"
+DELETED_FIELD = "jupyter_deleted"
+
+
+def csv_values(dataframe):
+    """Render every value of a dataframe exactly as it's staged and stored in a CSV lookup
+
+    The rows are uploaded with DataFrame.to_csv, and the lookup keeps that text
+    (1.0 stays "1.0", missing values become ""), so the values are read back
+    from the same rendering instead of being formatted a second time.
+
+    Args:
+        dataframe (DataFrame): the rows to render
+
+    Returns:
+        rows (list): a list of string values per row
+    """
+    if len(dataframe) == 0:
+        return []
+    return list(csv.reader(io.StringIO(dataframe.to_csv(index=False, header=False))))
+
+
+def hash_rows(dataframe, columns):
+    """Hash the given columns of every row, matching hash_expression() in SPL
+
+    Args:
+        dataframe (DataFrame): the rows to hash
+        columns (list): the columns to hash, in order
+
+    Returns:
+        hashes (list): the md5 hex digest of each row
+    """
+    return [hashlib.md5("|".join(row).encode("utf-8")).hexdigest() for row in csv_values(dataframe[columns])]
+
+
+def hash_expression(columns):
+    """Build the SPL eval expression that hashes fields like hash_rows() does locally
+
+    Args:
+        columns (list): the fields to hash, in order
+
+    Returns:
+        expression (string): an eval expression such as md5(coalesce(tostring('a'),"")."|"...)
+    """
+    fields = ".\"|\".".join(f"coalesce(tostring('{column}'),\"\")" for column in columns)
+    return f"md5({fields})"
+
+
+def existing_hashes_query(table, keys, columns):
+    """Build the query that fetches only the key and row hashes of a lookup table"""
+    return (f"| inputlookup {table}"
+            f"| eval {KEY_HASH_FIELD}={hash_expression(keys)}, {ROW_HASH_FIELD}={hash_expression(columns)}"
+            f"| table {KEY_HASH_FIELD} {ROW_HASH_FIELD}")
+
+
+def plan_changes(key_hashes, row_hashes, existing, mode):
+    """Decide which rows of the user's dataframe need to be sent
+
+    Args:
+        key_hashes (list): the key hash of each dataframe row
+        row_hashes (list): the row hash of each dataframe row
+        existing (dict): the lookup table's rows as {key hash: row hash}
+        mode (string): append, upsert or delete
+
+    Returns:
+        inserts (list): positions of rows whose key isn't in the lookup table
+        changes (list): positions of rows whose key exists with different values (upsert only)
+        deletes (list): positions of rows whose key exists in the lookup table (delete only)
+    """
+    inserts, changes, deletes = [], [], []
+    for position, (key_hash, row_hash) in enumerate(zip(key_hashes, row_hashes)):
+        if mode == "delete":
+            if key_hash in existing:
+                deletes.append(position)
+        elif key_hash not in existing:
+            inserts.append(position)
+        elif mode == "upsert" and existing[key_hash] != row_hash:
+            changes.append(position)
+    return inserts, changes, deletes
+
+
+def upsert_query(table, staging_tables, keys):
+    """Build the query that replaces rows of a lookup table with the staged rows sharing their keys
+
+    The staged rows are read first, so dedup keeps them over the table's old rows.
+    """
+    staged = "".join(f"| inputlookup {'append=true ' if position > 0 else ''}{staging_table}" for position, staging_table in enumerate(staging_tables))
+    return (f"{staged}"
+            f"| inputlookup append=true {table}"
+            f"| eval {KEY_HASH_FIELD}={hash_expression(keys)}"
+            f"| dedup {KEY_HASH_FIELD}"
+            f"| fields - {KEY_HASH_FIELD}"
+            f"| outputlookup {table}")
+
+
+def delete_query(table, staging_tables, keys):
+    """Build the query that removes the rows of a lookup table whose keys were staged"""
+    staged = "".join(f"| inputlookup {'append=true ' if position > 0 else ''}{staging_table}" for position, staging_table in enumerate(staging_tables))
+    return (f"{staged}"
+            f"| eval {STAGED_FIELD}=1"
+            f"| inputlookup append=true {table}"
+            f"| eval {KEY_HASH_FIELD}={hash_expression(keys)}"
+            f"| eventstats max({STAGED_FIELD}) as {DELETED_FIELD} by {KEY_HASH_FIELD}"
+            f"| where isnull({DELETED_FIELD})"
+            f"| fields - {KEY_HASH_FIELD} {STAGED_FIELD} {DELETED_FIELD}"
+            f"| outputlookup {table}")
+
+
+def append_query(table, staging_tables):
+    """Build the query that appends the staged rows to a lookup table without rewriting it"""
+    staged = "".join(f"| inputlookup {'append=true ' if position > 0 else ''}{staging_table}" for position, staging_table in enumerate(staging_tables))
+    return f"{staged}| outputlookup append=true {table}"
@@ -0,0 +1,121 @@
+import time
+import datetime
+import threading
+from collections import deque
+from contextlib import contextmanager
+from splunk_utils.lazy_import import lazy_import
+
+pd = lazy_import("pandas")
+
+# SplunkAPI counters that are turned into per query deltas
+SESSION_COUNTERS = ["logins", "login_seconds", "http_requests", "bytes_received", "transport_retries"]
+
+# Dispatch states of a job that hasn't started running yet
+QUEUED_STATES = ["", "QUEUED", "PARSING"]
+
+
+class QueryTimer:
+    """The phase timings of a single query
+
+    Phases can be timed with phase(), added to from any thread with add(),
+    and the instance session's counters are snapshotted so the logins, bytes
+    and retries of this query can be told apart from earlier ones.
+    """
+
+    def __init__(self, instance, query, session=None):
+        self.instance = instance
+        self.query = " ".join(query.split())
+        self.session = session
+        self.started = time.time()
+        self.dispatched = None
+        self.values = {}
+        self.sids = []
+        self._lock = threading.Lock()
+        self._counters = self._session_counters()
+
+    def _session_counters(self):
+        if self.session is None:
+            return {}
+        return {name: getattr(self.session, name, 0) for name in SESSION_COUNTERS}
+
+    def add(self, name, value):
+        """Add to a timing or counter (thread-safe)"""
+        with self._lock:
+            self.values[name] = self.values.get(name, 0) + value
+
+    def maximum(self, name, value):
+        with self._lock:
+            self.values[name] = max(self.values.get(name, value), value)
+
+    @contextmanager
+    def phase(self, name):
+        """Time a block and add it to the <name>_seconds timing"""
+        started = time.time()
+        try:
+            yield
+        finally:
+            self.add(f"{name}_seconds", time.time() - started)
+
+    def job_created(self, sid):
+        if self.dispatched is None:
+            self.dispatched = time.time()
+        self.sids.append(sid)
+
+    def observe(self, stats):
+        """Take the queue wait and server run time from a job's stats"""
+        if self.dispatched is not None and "queue_seconds" not in self.values and stats.get("dispatchState", "") not in QUEUED_STATES:
+            self.add("queue_seconds", time.time() - self.dispatched)
+        self.maximum("run_seconds", stats.get("runDuration", 0.0))
+
+    def record(self, status, rows):
+        """Build the history record of the finished query"""
+        record = {"time": datetime.datetime.fromtimestamp(self.started),
+                  "instance": self.instance,
+                  "query": self.query[:200],
+                  "sids": ",".join(self.sids),
+                  "status": status,
+                  "rows": rows,
+                  "total_seconds": time.time() - self.started}
+        for name in ["create_seconds", "queue_seconds", "run_seconds", "wait_seconds", "download_seconds", "parse_seconds", "compact_seconds", "retries"]:
+            record[name] = self.values.get(name, 0)
+
+        counters = self._session_counters()
+        for name in SESSION_COUNTERS:
+            record[name] = counters.get(name, 0) - self._counters.get(name, 0)
+        return record
+
+
+class QueryStats:
+    """A bounded history of query timing records, with an optional hook
+
+    Args:
+        maxlen (int, optional): the number of records kept
+    """
+
+    def __init__(self, maxlen=500, debug=False):
+        self.records = deque(maxlen=int(maxlen))
+        self.hook = None
+        self.debug = debug
+
+    def start(self, instance, query, session=None):
+        return QueryTimer(instance, query, session)
+
+    def finish(self, timer, status, rows):
+        """Store the record of a finished query and hand it to the hook"""
+        record = timer.record(status, rows)
+        self.records.append(record)
+        if self.hook is not None:
+            try:
+                self.hook(dict(record))
+            except Exception as e:
+                # A broken hook mustn't break queries
+                if self.debug:
+                    print(f"The stats hook failed: {str(e)}")
+        return record
+
+    def clear(self):
+        self.records.clear()
+
+    def dataframe(self, instance=None):
+        """Return the history as a dataframe, optionally for a single instance"""
+        return pd.DataFrame([record for record in self.records if instance is None or record["instance"] == instance])
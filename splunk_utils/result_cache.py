@@ -0,0 +1,109 @@
+import time
+import threading
+from collections import OrderedDict
+from splunk_utils.spill import estimate_memory
+
+
+class ResultCache:
+    """A per-kernel LRU cache of query results
+
+    Entries are keyed by instance, normalized query text, the resolved
+    earliest/latest times and the settings that shape the returned dataframe. The cache is bounded by a total number of rows and
+    bytes, and entries older than the TTL are treated as misses.
+    """
+
+    def __init__(self, max_rows=1000000, max_bytes=512 * 1024 * 1024, ttl=900):
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(instance, query, earliest_time, latest_time, search_level=None, result_format=None):
+        """Build the cache key for a query
+
+        Args:
+            instance (string): the instance the query runs against
+            query (string): the user's query
+            earliest_time (int): the resolved earliest time in epoch seconds
+            latest_time (int): the resolved latest time in epoch seconds
+            search_level (string, optional): the adhoc_search_level, fast mode returns fewer fields
+            result_format (tuple, optional): the parser and compaction settings the results were built with
+
+        Returns:
+            key (tuple): the cache key, with whitespace in the query collapsed
+        """
+        return (instance, " ".join(query.split()), int(earliest_time), int(latest_time), str(search_level), repr(result_format))
+
+    def set_limits(self, max_rows, max_bytes, ttl):
+        """Update the size limits and TTL, evicting entries if they shrank"""
+        with self._lock:
+            self.max_rows = int(max_rows)
+            self.max_bytes = int(max_bytes)
+            self.ttl = float(ttl)
+            self._evict()
+
+    def get(self, key):
+        """Return the cached dataframe and its age in seconds, or (None, None) on a miss"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None, None
+
+            age = time.time() - entry["created"]
+            if age > self.ttl:
+                del self._entries[key]
+                return None, None
+
+            entry["hits"] += 1
+            self._entries.move_to_end(key)
+            return entry["dataframe"], age
+
+    def put(self, key, dataframe):
+        """Cache a dataframe, evicting the least recently used entries to make room
+
+        Returns:
+            cached (bool): False if the dataframe alone is bigger than the cache limits
+        """
+        rows = len(dataframe)
+        # Measuring every string of a big result would cost about as much as copying it
+        size = estimate_memory(dataframe)
+        if rows > self.max_rows or size > self.max_bytes:
+            return False
+
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = {"dataframe": dataframe, "rows": rows, "bytes": size, "created": time.time(), "hits": 0}
+            self._evict()
+        return True
+
+    def clear(self, instance=None):
+        """Remove every entry (or only the entries of one instance)
+
+        Returns:
+            removed (int): the number of entries removed
+        """
+        with self._lock:
+            keys = [key for key in self._entries if instance is None or key[0] == instance]
+            for key in keys:
+                del self._entries[key]
+        return len(keys)
+
+    def entries(self):
+        """List the cache entries from least to most recently used"""
+        now = time.time()
+        with self._lock:
+            return [{"instance": key[0], "query": key[1], "earliest_time": key[2], "latest_time": key[3], "search_level": key[4],
+                     "rows": entry["rows"], "bytes": entry["bytes"], "hits": entry["hits"],
+                     "age_seconds": round(now - entry["created"], 1)}
+                    for key, entry in self._entries.items()]
+
+    def _evict(self):
+        now = time.time()
+        for key in [key for key, entry in self._entries.items() if now - entry["created"] > self.ttl]:
+            del self._entries[key]
+
+        while self._entries and (sum(e["rows"] for e in self._entries.values()) > self.max_rows
+                                 or sum(e["bytes"] for e in self._entries.values()) > self.max_bytes):
+            self._entries.popitem(last=False)
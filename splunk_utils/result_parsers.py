@@ -0,0 +1,126 @@
+import json
+from splunk_utils.lazy_import import lazy_import
+import jupyter_integrations_utility as jiu
+
+pd = lazy_import("pandas")
+
+
+def _import_pyarrow():
+    """Return the pyarrow module (with its csv reader loaded), or None if it isn't installed"""
+    try:
+        import pyarrow
+        import pyarrow.csv
+    except ImportError:
+        return None
+    return pyarrow
+
+
+class PandasCSVParser:
+    """Parses CSV results on a single core with pd.read_csv (the original behavior)"""
+
+    name = "pandas"
+    output_mode = "csv"
+
+    def __init__(self, arrow_dtypes=False):
+        self.arrow_dtypes = arrow_dtypes
+
+    def parse(self, stream, as_text=False):
+        try:
+            return pd.read_csv(stream, dtype=str if as_text else None)
+        except pd.errors.EmptyDataError:
+            return pd.DataFrame()  # Success - No Results
+
+
+class ArrowCSVParser:
+    """Parses CSV results with PyArrow's multi-threaded CSV reader
+
+    With arrow_dtypes the dataframe keeps Arrow-backed columns instead of
+    converting them to numpy/object columns.
+    """
+
+    name = "arrow"
+    output_mode = "csv"
+
+    def __init__(self, arrow_dtypes=False):
+        self.arrow_dtypes = arrow_dtypes
+        self.pyarrow = _import_pyarrow()
+
+    def parse(self, stream, as_text=False):
+        csv = self.pyarrow.csv
+        try:
+            # Multivalue fields come back as newline separated values inside quotes
+            table = csv.read_csv(stream,
+                                 read_options=csv.ReadOptions(use_threads=True),
+                                 parse_options=csv.ParseOptions(newlines_in_values=True))
+        except self.pyarrow.ArrowInvalid as e:
+            if "Empty CSV file" in str(e):
+                return pd.DataFrame()  # Success - No Results
+            raise
+
+        if as_text:
+            table = table.cast(self.pyarrow.schema([(field.name, self.pyarrow.string()) for field in table.schema]))
+        if self.arrow_dtypes:
+            return table.to_pandas(types_mapper=pd.ArrowDtype)
+        return table.to_pandas()
+
+
+class JSONColsParser:
+    """Parses Splunk's json_cols output, which already arrives column by column
+
+    No row to column pivot is needed: each column list becomes a dataframe
+    column as is (or an Arrow array when arrow_dtypes is set and PyArrow is installed).
+    """
+
+    name = "json_cols"
+    output_mode = "json_cols"
+
+    def __init__(self, arrow_dtypes=False):
+        self.pyarrow = _import_pyarrow() if arrow_dtypes else None
+
+    def parse(self, stream, as_text=False):
+        # json_cols values already arrive as text
+        body = stream.read()
+        if len(body.strip()) == 0:
+            return pd.DataFrame()  # Success - No Results
+
+        payload = json.loads(body)
+        # Newer Splunk versions describe fields as {"name": ...} dicts
+        fields = [field["name"] if isinstance(field, dict) else field for field in payload.get("fields", [])]
+        columns = payload.get("columns", [])
+        if len(fields) == 0:
+            return pd.DataFrame()  # Success - No Results
+
+        if self.pyarrow is not None:
+            return self.pyarrow.table(dict(zip(fields, columns))).to_pandas(types_mapper=pd.ArrowDtype)
+        return pd.DataFrame(dict(zip(fields, columns)))
+
+
+PARSERS = {parser.name: parser for parser in [PandasCSVParser, ArrowCSVParser, JSONColsParser]}
+
+# Parsers we already warned about falling back from, so the warning shows once per kernel
+_fallbacks_reported = set()
+
+
+def get_parser(name, arrow_dtypes=False):
+    """Build the results parser selected by the splunk_results_parser option
+
+    The arrow parser falls back to pandas when PyArrow isn't installed.
+
+    Args:
+        name (string): one of the names in PARSERS
+        arrow_dtypes (bool, optional): return Arrow-backed dataframes where possible
+
+    Returns:
+        parser: an object with an output_mode for job.results() and a parse(stream, as_text=False) method,
+                as_text leaves every column as strings (for pages that are typed once they're combined)
+    """
+    if name not in PARSERS:
+        raise ValueError(f"Unknown results parser {name}, expected one of {', '.join(PARSERS.keys())}")
+
+    if name == ArrowCSVParser.name and _import_pyarrow() is None:
+        if name not in _fallbacks_reported:
+            _fallbacks_reported.add(name)
+            jiu.displayMD("**[ ! ]** PyArrow isn't installed, falling back to the pandas results parser")
+        name = PandasCSVParser.name
+
+    return PARSERS[name](arrow_dtypes=arrow_dtypes)
@@ -0,0 +1,70 @@
+import time
+from splunk_utils.lazy_import import lazy_import
+from IPython.display import display
+
+pd = lazy_import("pandas")
+
+
+class ResultPreview:
+    """Renders a refreshing preview of a running search job's results
+
+    The preview is driven by the stats the job monitor already collects: a new
+    results_preview page is only fetched when resultPreviewCount changed and at
+    most once per min_interval seconds, so previewing adds no job state requests.
+    """
+
+    def __init__(self, job, parser, max_rows=100, min_interval=5.0, debug=False):
+        self.job = job
+        self.parser = parser
+        self.max_rows = int(max_rows)
+        self.min_interval = float(min_interval)
+        self.debug = debug
+        self.dataframe = pd.DataFrame()
+        self.requests = 0
+        self._preview_count = 0
+        self._last_fetch = 0.0
+        self._display = None
+
+    def progress(self, on_progress=None):
+        """Build a progress callback for JobMonitor.wait() that also refreshes the preview
+
+        Args:
+            on_progress (callable, optional): another progress callback to call first
+
+        Returns:
+            callback (callable): the callback to pass to JobMonitor.wait()
+        """
+        def callback(stats):
+            if on_progress is not None:
+                on_progress(stats)
+            self.update(stats)
+        return callback
+
+    def update(self, stats):
+        """Fetch and render a new preview if the job has new preview results"""
+        preview_count = stats.get("resultPreviewCount", 0)
+        if stats.get("isDone") == "1" or preview_count == 0 or preview_count == self._preview_count:
+            return
+        if time.time() - self._last_fetch < self.min_interval:
+            return
+
+        self._last_fetch = time.time()
+        self.requests += 1
+        try:
+            stream = self.job.preview(output_mode=self.parser.output_mode, count=self.max_rows)
+            try:
+                dataframe = self.parser.parse(stream)
+            finally:
+                stream.close()
+        except Exception as e:
+            # A failed preview never fails the search, the next change tries again
+            if self.debug:
+                print(f"Unable to fetch the results preview: {str(e)}")
+            return
+
+        self._preview_count = preview_count
+        self.dataframe = dataframe
+        if self._display is None:
+            self._display = display(dataframe, display_id=True)
+        else:
+            self._display.update(dataframe)
@@ -0,0 +1,83 @@
+from splunk_utils.spl_parser import parse_spl
+
+# Commands that turn events into a results table: the events themselves (and
+# the fields discovered on them) are never returned, so fast mode loses nothing
+TRANSFORMING_COMMANDS = ["stats", "chart", "timechart", "top", "rare", "tstats", "mstats", "contingency",
+                         "xyseries", "geostats", "sistats", "sichart", "sitimechart", "sitop", "datamodel", "pivot"]
+
+# Search levels from the most to the least work
+SEARCH_LEVELS = ["verbose", "smart", "fast"]
+
+
+def _table_fields(command):
+    """Return the field names of a table command, None if it uses wildcards or anything but plain names"""
+    fields = []
+    for token in command.tokens:
+        if token.kind not in ("word", "string"):
+            return None
+        fields.extend(field for field in token.value.split(",") if field != "")
+    if len(fields) == 0 or any("*" in field for field in fields):
+        return None
+    return fields
+
+
+def optimize_search(query, kwargs, inject_projection=False):
+    """Pick a cheaper search mode for a query and find the projection it's missing
+
+    The integration only reads a job's results (never its timeline, event
+    summary or discovered fields), so:
+        - transforming searches and searches that end in a table of named
+          fields run in fast mode, other searches run in smart mode at most
+        - status_buckets is 0, so no timeline is built
+        - a search that ends in "| table a b c" gets a "| fields a b c" in
+          front of the table (only when inject_projection is set), so the
+          indexers drop the other fields instead of sending them over
+
+    Args:
+        query (string): the SPL query
+        kwargs (dict): the jobs.create arguments from _search_kwargs
+        inject_projection (bool, optional): add the fields projection to the query instead of only suggesting it
+
+    Returns:
+        query (string): the query to run
+        kwargs (dict): a copy of kwargs with the optimized arguments
+        changes (list): what was changed and why
+        suggestions (list): changes left to the user
+    """
+    kwargs = dict(kwargs)
+    changes = []
+    suggestions = []
+
+    parsed = parse_spl(query)
+    top_level = [command for command in parsed.commands if command.depth == 0]
+    names = [command.name for command in top_level]
+    transforming = [name for name in names if name in TRANSFORMING_COMMANDS]
+    last = top_level[-1] if len(top_level) > 0 else None
+    table_fields = _table_fields(last) if last is not None and last.name == "table" else None
+
+    level = kwargs.get("adhoc_search_level", "verbose")
+    if len(transforming) > 0 or table_fields is not None:
+        wanted = "fast"
+        reason = f"transforming command `{transforming[0]}`" if len(transforming) > 0 else "it ends in a table of named fields"
+    else:
+        wanted = "smart"
+        reason = "the search returns events, smart mode still discovers their fields"
+    if level in SEARCH_LEVELS and SEARCH_LEVELS.index(wanted) > SEARCH_LEVELS.index(level):
+        kwargs["adhoc_search_level"] = wanted
+        changes.append(f"adhoc_search_level {level} -> {wanted} ({reason})")
+
+    if str(kwargs.get("status_buckets", "0")) != "0":
+        changes.append(f"status_buckets {kwargs['status_buckets']} -> 0 (results are read without a timeline)")
+        kwargs["status_buckets"] = "0"
+
+    # A projection only helps before the table if nothing has cut the fields down already
+    if table_fields is not None and len(transforming) == 0 and not (len(names) > 1 and names[-2] == "fields"):
+        pipe = query.rfind("|", 0, last.tokens[0].start)
+        projection = f"| fields {' '.join(table_fields)} "
+        if inject_projection and pipe >= 0:
+            query = query[:pipe] + projection + query[pipe:]
+            changes.append(f"added `{projection.strip()}` before the final table, so indexers only send those fields")
+        else:
+            suggestions.append(f"add `{projection.strip()}` before the final `| table`, so indexers only send those fields")
+
+    return query, kwargs, changes, suggestions
@@ -0,0 +1,316 @@
+import os
+import atexit
+import shutil
+import tempfile
+import threading
+from splunk_utils.lazy_import import lazy_import
+from splunk_utils.frame_typing import is_text_dtype
+
+pd = lazy_import("pandas")
+
+# Scratch directories created by this kernel, removed when it exits
+_scratch_directories = set()
+_scratch_lock = threading.Lock()
+
+SPILL_FORMATS = ["parquet", "feather"]
+
+
+def _remove_scratch_directories():
+    with _scratch_lock:
+        directories = list(_scratch_directories)
+        _scratch_directories.clear()
+    for directory in directories:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+atexit.register(_remove_scratch_directories)
+
+
+def spill_available():
+    """Return True if results can be spilled (both formats need PyArrow)"""
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _arrow_safe(chunk):
+    """Turn mixed-type object columns (e.g. multivalue lists next to strings) into strings"""
+    chunk = chunk.copy()
+    for column in chunk.columns:
+        if is_text_dtype(chunk[column].dtype):
+            chunk[column] = chunk[column].where(chunk[column].isna(), chunk[column].astype(str))
+    return chunk
+
+
+class SpillWriter:
+    """Writes result chunks to numbered Parquet or Feather files in a fresh scratch directory"""
+
+    def __init__(self, file_format="parquet", directory=None):
+        if file_format not in SPILL_FORMATS:
+            raise ValueError(f"Unknown spill format {file_format}, expected one of {', '.join(SPILL_FORMATS)}")
+        self.file_format = file_format
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.directory = tempfile.mkdtemp(prefix="jupyter_splunk_", dir=directory or None)
+        with _scratch_lock:
+            _scratch_directories.add(self.directory)
+        self.files = []
+        self.rows = 0
+        self.bytes = 0
+
+    def write(self, chunk):
+        """Write one chunk of results to its own file"""
+        if len(chunk) == 0:
+            return
+        path = os.path.join(self.directory, f"chunk_{len(self.files):06d}.{self.file_format}")
+        chunk = chunk.reset_index(drop=True)
+        try:
+            self._write(chunk, path)
+        except Exception:
+            self._write(_arrow_safe(chunk), path)
+        self.files.append((path, list(chunk.columns), len(chunk)))
+        self.rows += len(chunk)
+        self.bytes += os.path.getsize(path)
+
+    def _write(self, chunk, path):
+        if self.file_format == "parquet":
+            chunk.to_parquet(path, index=False)
+        else:
+            chunk.to_feather(path)
+
+    def result(self):
+        """Return the lazy handle over everything written"""
+        return SpilledResult([self.directory], self.files, self.file_format)
+
+
+# Pages with more rows than this have their deep memory use estimated from a sample
+ESTIMATE_SAMPLE_ROWS = 1000
+
+
+def estimate_memory(chunk):
+    """Estimate the bytes a dataframe uses without measuring every string of a big chunk"""
+    if len(chunk) <= ESTIMATE_SAMPLE_ROWS:
+        return int(chunk.memory_usage(deep=True).sum())
+    sample = chunk.iloc[::max(1, len(chunk) // ESTIMATE_SAMPLE_ROWS)]
+    return int(sample.memory_usage(deep=True).sum() * len(chunk) / max(len(sample), 1))
+
+
+class ResultBudget:
+    """A row and byte budget shared by every collector of one query (e.g. its time slices)
+
+    Args:
+        max_rows (int, optional): rows held in memory before spilling (0 means no limit)
+        max_bytes (int, optional): bytes held in memory before spilling (0 means no limit)
+    """
+
+    def __init__(self, max_rows=0, max_bytes=0):
+        self.max_rows = int(max_rows)
+        self.max_bytes = int(max_bytes)
+        self.rows = 0
+        self.bytes = 0
+        self._lock = threading.Lock()
+
+    @property
+    def limited(self):
+        return self.max_rows > 0 or self.max_bytes > 0
+
+    def charge(self, rows, size):
+        """Count a chunk against the budget (thread-safe)
+
+        Returns:
+            exceeded (bool): True if the budget is now exceeded
+        """
+        with self._lock:
+            self.rows += rows
+            self.bytes += size
+        return self.exceeded()
+
+    def exceeded(self):
+        return (self.max_rows > 0 and self.rows > self.max_rows) or (self.max_bytes > 0 and self.bytes > self.max_bytes)
+
+
+class SpillingCollector:
+    """Collects result chunks in memory until a row or byte budget is exceeded, then on disk
+
+    Once the budget is exceeded, the chunks collected so far and every later
+    chunk are written to a SpillWriter, so at most one chunk (plus the budget)
+    is held in memory at a time. Collectors that share a ResultBudget spill
+    as soon as their combined results exceed it.
+    """
+
+    def __init__(self, max_rows=0, max_bytes=0, file_format="parquet", directory=None, budget=None):
+        self.budget = budget if budget is not None else ResultBudget(max_rows, max_bytes)
+        self.file_format = file_format
+        self.directory = directory
+        self.enabled = self.budget.limited and spill_available()
+        self.writer = None
+        self.chunks = []
+
+    @property
+    def spilled(self):
+        return self.writer is not None
+
+    def add(self, chunk):
+        """Add the next chunk of results, in order
+
+        Returns:
+            spilled (bool): True if this chunk made the results spill to disk
+        """
+        if self.writer is not None:
+            self.writer.write(chunk)
+            return False
+
+        self.chunks.append(chunk)
+        if not self.enabled:
+            return False
+
+        if self.budget.charge(len(chunk), estimate_memory(chunk)):
+            self._spill()
+            return True
+        return False
+
+    def _spill(self):
+        self.writer = SpillWriter(self.file_format, self.directory)
+        for collected in self.chunks:
+            self.writer.write(collected)
+        self.chunks = []
+
+    def result(self):
+        """Return the collected results as a dataframe, or a SpilledResult if they were spilled"""
+        if self.writer is None and self.enabled and self.budget.exceeded():
+            # Another collector sharing the budget went over it
+            self._spill()
+        if self.writer is not None:
+            return self.writer.result()
+        chunks = [chunk for chunk in self.chunks if len(chunk.columns) > 0]
+        if len(chunks) == 0:
+            return pd.DataFrame()  # Success - No Results
+        if len(chunks) == 1:
+            return chunks[0]
+        return pd.concat(chunks, ignore_index=True)
+
+
+def concat_results(results, file_format="parquet", directory=None, budget=None):
+    """Concatenate dataframes and SpilledResults in order
+
+    Returns a dataframe if nothing was spilled (and the results shared budget
+    wasn't exceeded), otherwise one SpilledResult over every spilled chunk
+    (in-memory results are spilled alongside them).
+    """
+    results = [result for result in results if len(result.columns) > 0]
+    over_budget = budget is not None and budget.exceeded() and spill_available()
+    if not over_budget and not any(isinstance(result, SpilledResult) for result in results):
+        if len(results) == 0:
+            return pd.DataFrame()  # Success - No Results
+        return pd.concat(results, ignore_index=True)
+
+    writer = None
+    directories = []
+    files = []
+    for result in results:
+        if isinstance(result, SpilledResult):
+            directories.extend(result.directories)
+            files.extend(result.files)
+            continue
+        if writer is None:
+            writer = SpillWriter(file_format, directory)
+            directories.append(writer.directory)
+        start = len(writer.files)
+        writer.write(result)
+        files.extend(writer.files[start:])
+    return SpilledResult(directories, files, file_format)
+
+
+class SpilledResult:
+    """A lazy handle on query results that were spilled to disk
+
+    Nothing is loaded until asked for: head() reads only the first chunk,
+    select() projects columns, iter_chunks() streams (optionally filtered)
+    chunks, and to_pandas() loads everything into one dataframe.
+    """
+
+    def __init__(self, directories, files, file_format, columns=None):
+        self.directories = list(directories)
+        self.files = files
+        self.file_format = file_format
+        if columns is None:
+            columns = []
+            for _, file_columns, _ in files:
+                columns.extend(column for column in file_columns if column not in columns)
+        self.columns = list(columns)
+
+    def __len__(self):
+        return sum(rows for _, _, rows in self.files)
+
+    def __repr__(self):
+        return (f"<SpilledResult: {len(self)} rows x {len(self.columns)} columns in {len(self.files)} "
+                f"{self.file_format} chunks in {', '.join(self.directories)}>")
+
+    def _read(self, path, file_columns):
+        present = [column for column in self.columns if column in file_columns]
+        if self.file_format == "parquet":
+            chunk = pd.read_parquet(path, columns=present)
+        else:
+            chunk = pd.read_feather(path, columns=present)
+        # Columns a chunk never saw come back empty, like pd.concat would do
+        return chunk.reindex(columns=self.columns)
+
+    def select(self, columns):
+        """Return a handle that only reads the given columns"""
+        if isinstance(columns, str):
+            columns = [columns]
+        missing = [column for column in columns if column not in self.columns]
+        if missing:
+            raise KeyError(f"Columns not in the results: {', '.join(missing)}")
+        return SpilledResult(self.directories, self.files, self.file_format, columns=columns)
+
+    def __getitem__(self, columns):
+        return self.select(columns)
+
+    def iter_chunks(self, columns=None, where=None):
+        """Yield the results chunk by chunk
+
+        Args:
+            columns (list, optional): only read these columns
+            where (callable, optional): called with each chunk, returns a boolean mask
+                (or a query string for DataFrame.query) selecting the rows to keep
+
+        Yields:
+            chunk (DataFrame): the (filtered) rows of one spilled chunk
+        """
+        handle = self if columns is None else self.select(columns)
+        for path, file_columns, _ in handle.files:
+            chunk = handle._read(path, file_columns)
+            if where is not None:
+                chunk = chunk.query(where) if isinstance(where, str) else chunk[where(chunk)]
+            yield chunk
+
+    def head(self, n=5):
+        """Return the first n rows, reading only as many chunks as needed"""
+        chunks = []
+        remaining = n
+        for chunk in self.iter_chunks():
+            chunks.append(chunk.head(remaining))
+            remaining -= len(chunks[-1])
+            if remaining <= 0:
+                break
+        if not chunks:
+            return pd.DataFrame(columns=self.columns)
+        return pd.concat(chunks, ignore_index=True)
+
+    def to_pandas(self, columns=None, where=None):
+        """Load the (projected, filtered) results into a single dataframe"""
+        chunks = list(self.iter_chunks(columns=columns, where=where))
+        if not chunks:
+            return pd.DataFrame(columns=self.columns if columns is None else columns)
+        return pd.concat(chunks, ignore_index=True)
+
+    def cleanup(self):
+        """Remove the spilled files now instead of when the kernel exits"""
+        for directory in self.directories:
+            shutil.rmtree(directory, ignore_errors=True)
+            with _scratch_lock:
+                _scratch_directories.discard(directory)
+        self.files = []
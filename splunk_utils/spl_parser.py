@@ -0,0 +1,173 @@
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+# One alternation scanned left to right: every character of the query is looked at once
+_TOKEN = re.compile(r"""\s+
+                        |(?P<pipe>\|)
+                        |(?P<open>\[)
+                        |(?P<close>\])
+                        |(?P<equals>=)
+                        |(?P<string>"(?:\\.|[^"\\])*"?)
+                        |(?P<word>[^\s|\[\]="]+)""", re.VERBOSE)
+
+# Commands whose earliest=/latest= terms are time modifiers rather than field names or assignments
+TIME_MODIFIER_COMMANDS = ["search", "tstats", "mstats", "from", "datamodel", "metasearch", "metadata", "eventcount"]
+
+# Commands that settle which fields a search returns, so it doesn't need a "| table *"
+FIELD_COMMANDS = ["table", "fields", "stats", "chart", "timechart", "top", "rare", "tstats", "mstats", "eventstats",
+                  "transaction", "inputlookup", "outputlookup", "makeresults", "rest", "datamodel", "pivot"]
+
+BOOLEAN_OPERATORS = ["and", "or", "not"]
+
+Token = namedtuple("Token", ["kind", "value", "start", "end"])
+
+# name -- the command's name, lowercased ("search" for an implicit leading search)
+# implicit -- True for the leading search of a query that doesn't start with a pipe or "search"
+# depth -- 0 for the outer query, 1 for its subsearches and so on
+# tokens -- the command's tokens, without its name (subsearches are not included)
+SPLCommand = namedtuple("SPLCommand", ["name", "implicit", "depth", "tokens"])
+
+# name -- earliest or latest
+# value -- the modifier's value without quotes
+# depth -- the depth of the (sub)search it belongs to
+# start, end -- the span of the whole term in the query text
+TimeModifier = namedtuple("TimeModifier", ["name", "value", "depth", "start", "end"])
+
+# commands -- every command of the query and its subsearches (a subsearch's commands come before the command holding it)
+# pipes -- the number of pipes
+# subsearches -- the number of subsearches
+# max_depth -- the deepest subsearch nesting
+# time_modifiers -- every earliest=/latest= modifier
+# balanced -- False if the square brackets don't pair up
+SPLQuery = namedtuple("SPLQuery", ["commands", "pipes", "subsearches", "max_depth", "time_modifiers", "balanced"])
+
+
+def tokenize(query):
+    """Split a query into pipe, bracket, equals, string and word tokens in one pass"""
+    tokens = []
+    for match in _TOKEN.finditer(query):
+        if match.lastgroup is not None:
+            tokens.append(Token(match.lastgroup, match.group(), match.start(), match.end()))
+    return tokens
+
+
+def _unquote(value):
+    if len(value) >= 2 and value[0] == value[-1] and value[0] in "\"'":
+        return value[1:-1]
+    return value
+
+
+def _time_modifiers(command):
+    """Find the earliest=/latest= terms among a command's tokens"""
+    modifiers = []
+    tokens = command.tokens
+    for position in range(len(tokens) - 2):
+        name, equals, value = tokens[position:position + 3]
+        if name.kind == "word" and name.value.lower() in ("earliest", "latest") and equals.kind == "equals" and value.kind in ("word", "string"):
+            modifiers.append(TimeModifier(name.value.lower(), _unquote(value.value), command.depth, name.start, value.end))
+    return modifiers
+
+
+@lru_cache(maxsize=256)
+def parse_spl(query):
+    """Parse a query into its commands, subsearches and time modifiers
+
+    The result is memoized per query, so validating, time parsing and slicing
+    the same query only tokenize it once.
+
+    Args:
+        query (string): the SPL query
+
+    Returns:
+        parsed (SPLQuery): the structure of the query
+    """
+    commands = []
+    pipes = 0
+    subsearches = 0
+    max_depth = 0
+    balanced = True
+
+    # One frame per open (sub)search: the tokens of its current command and whether it has seen a command yet
+    frames = [{"tokens": [], "piped": False, "started": False}]
+
+    def finish_command(frame, depth):
+        tokens = frame["tokens"]
+        frame["tokens"] = []
+        if not tokens and not frame["piped"]:
+            return
+        first_command = not frame["started"]
+        frame["started"] = True
+        explicit = frame["piped"] or not first_command
+        frame["piped"] = False
+
+        if tokens and tokens[0].kind == "word" and (explicit or tokens[0].value.lower() == "search"):
+            commands.append(SPLCommand(tokens[0].value.lower(), False, depth, tuple(tokens[1:])))
+        elif tokens:
+            commands.append(SPLCommand("search", True, depth, tuple(tokens)))
+
+    for token in tokenize(query):
+        frame = frames[-1]
+        depth = len(frames) - 1
+        if token.kind == "pipe":
+            finish_command(frame, depth)
+            frame["piped"] = True
+            pipes += 1
+        elif token.kind == "open":
+            subsearches += 1
+            frames.append({"tokens": [], "piped": False, "started": False})
+            max_depth = max(max_depth, len(frames) - 1)
+        elif token.kind == "close":
+            if depth == 0:
+                balanced = False
+                continue
+            finish_command(frame, depth)
+            frames.pop()
+        else:
+            frame["tokens"].append(token)
+
+    while len(frames) > 1:
+        balanced = False
+        finish_command(frames[-1], len(frames) - 1)
+        frames.pop()
+    finish_command(frames[0], 0)
+
+    time_modifiers = []
+    for command in commands:
+        if command.name in TIME_MODIFIER_COMMANDS:
+            time_modifiers.extend(_time_modifiers(command))
+
+    return SPLQuery(tuple(commands), pipes, subsearches, max_depth, tuple(time_modifiers), balanced)
+
+
+def outer_commands(query):
+    """Return the commands of the outer query, without its subsearches"""
+    return [command for command in parse_spl(query).commands if command.depth == 0]
+
+
+def outer_times(query):
+    """Return the outer query's earliest and latest values (the last of each wins), None when missing"""
+    times = {"earliest": None, "latest": None}
+    for modifier in parse_spl(query).time_modifiers:
+        if modifier.depth == 0:
+            times[modifier.name] = modifier.value
+    return times["earliest"], times["latest"]
+
+
+def lowercase_operators(query):
+    """Return the lowercased and/or/not words used as bare search terms (outside of quoted strings)"""
+    operators = []
+    for command in parse_spl(query).commands:
+        if command.name != "search":
+            continue
+        for token in command.tokens:
+            if token.kind == "word" and token.value.lower() in BOOLEAN_OPERATORS and token.value != token.value.upper():
+                operators.append(token.value)
+    return operators
+
+
+def remove_time_modifiers(query):
+    """Remove every earliest=/latest= modifier (at any depth) from a query"""
+    for modifier in sorted(parse_spl(query).time_modifiers, key=lambda modifier: modifier.start, reverse=True):
+        query = query[:modifier.start] + query[modifier.end:]
+    return query
@@ -1,51 +1,262 @@
 from splunklib import client as splclient
 import splunklib.results as results
-from time import sleep
 import jupyter_integrations_utility as jiu
-from splunk_utils.helper_functions import parse_times, splunk_time
+from splunk_utils.helper_functions import spl_quote
+from splunk_utils.job_monitor import JobMonitor
+from splunk_utils import lookup_sync
 import io
+import csv
+import json
+import time
+import uuid
+import threading
+from http.cookiejar import DefaultCookiePolicy
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import requests
+from requests.adapters import HTTPAdapter
 import urllib3
-
+from urllib3.util.retry import Retry
+
+
+# requests sessions shared by every SplunkAPI pointing at the same host and port
+# (with the same proxies, verify and pool/retry settings), so their connection pools are too
+_shared_sessions = {}
+_shared_sessions_lock = threading.Lock()
+
+# One lock per host, port and user, so concurrent reconnects share a single login
+_login_locks = {}
+_login_locks_lock = threading.Lock()
+
+# Transport settings used when an instance doesn't supply its own
+DEFAULT_HTTP_OPTIONS = {"pool_size": 10, "retries": 3, "backoff": 0.5, "connect_timeout": 10, "read_timeout": 300}
+
+# Lookup rows are sent inline in the SPL of makeresults, so a chunk is cut short
+# once its (quoted) CSV would make the search string longer than this
+MAX_INLINE_CSV_CHARS = 100000
+
+
+class StreamingResponseBody(io.RawIOBase):
+    """A file-like view over a streamed requests response
+
+    Bytes are read straight from the live socket as the consumer asks for them
+    (pd.read_csv, JSONResultsReader, ...), so the body is never held in memory
+    in full. Closing the body releases the connection back to the pool.
+
+    Time spent waiting on the socket is kept in read_seconds, so consumers can
+    tell network time apart from their own, and on_read is called with the
+    size of every read.
+    """
+
+    def __init__(self, response, on_read=None):
+        self._response = response
+        self._raw = response.raw
+        self._pending = b""
+        self._on_read = on_read
+        self.read_seconds = 0.0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        # Decompressing may hand back more bytes than were asked for, so any
+        # overflow is kept for the next read.
+        data = self._pending
+        if not data:
+            started = time.time()
+            data = self._raw.read(len(buffer), decode_content=True)
+            self.read_seconds += time.time() - started
+            if data and self._on_read is not None:
+                self._on_read(len(data))
+        if not data:
+            return 0
+        size = min(len(buffer), len(data))
+        buffer[:size] = data[:size]
+        self._pending = data[size:]
+        return size
+
+    def close(self):
+        if not self.closed:
+            self._response.close()
+        super().close()
 
 
 class SplunkAPI:
 
-    def __init__(self, host, port, username, app, password, autologin, proxies=None, verify=True, surpressSSLWarn=False, debug=False):
+    # Size of the reads made against the socket when streaming response bodies
+    stream_chunk_size = 1024 * 1024
+
+    def __init__(self, host, port, username, app, password, autologin, proxies=None, verify=True, surpressSSLWarn=False, poll_intervals=(0.2, 5.0), lookup_schema_ttl=300, http_options=None, token_cache=None, token_ttl=3600, scheme="https", debug=False):
 
         self.debug = debug
+        self.host = host
+        self.port = port
+        self.username = username
+        self.token_cache = token_cache
+        self.token_ttl = token_ttl
+
+        # Running totals that per query stats are computed from
+        self.logins = 0
+        self.login_seconds = 0.0
+        self.bytes_received = 0
+        self.transport_retries = 0
+        self._counter_lock = threading.Lock()
+
+        # The password can be a callable, so it's only decrypted when a login actually happens
+        self._password = password if callable(password) else (lambda: password)
+
+        with _login_locks_lock:
+            self._login_lock = _login_locks.setdefault((host, str(port), username), threading.Lock())
+
+        # Key and row hashes of lookup tables as of our last diff sync, keyed by (table, keys, columns)
+        self._lookup_hashes = {}
 
-        this_handler = self.make_requests_proxy_handler(proxies=proxies, verify=verify, surpressSSLWarn=surpressSSLWarn)
+        # Field names of lookup tables as {table: (fetched at, source, fields)}
+        self._lookup_schemas = {}
+        self.lookup_schema_ttl = float(lookup_schema_ttl)
+
+        self.base_url = f"{scheme}://{host}:{port}"
+        self.http_requests = 0
+        this_handler = self.make_requests_proxy_handler(proxies=proxies, verify=verify, surpressSSLWarn=surpressSSLWarn, http_options=http_options)
 
         if username.lower() != "api_auth":
             self.session = splclient.Service(
                 host=host,
                 port=port,
+                scheme=scheme,
                 app=app,
                 username=username,
-                password=password,
                 handler=this_handler,
                 autologin=autologin
             )
+            # splunklib calls login() itself when a request gets a 401, route that through the cache too
+            self._service_login = self.session.login
+            self.session.login = self.refresh_login
+
+            cached_key = self.token_cache.get(host, port, username) if self.token_cache is not None else None
+            if cached_key is not None:
+                # Validated lazily: only a real 401 makes us log in again
+                if self.debug:
+                    print("Reusing a cached session key")
+                self.session.token = f"Splunk {cached_key}"
+            else:
+                self.refresh_login()
         else:
             self.session = splclient.Service(
                 host=host,
                 port=port,
+                scheme=scheme,
                 app=app,
-                splunkToken=password,
+                splunkToken=self._password(),
                 handler=this_handler,
                 autologin=autologin
             )
-        self.session.login()
+            self.session.login()
 
+        # Every job dispatched through this session is polled by the one monitor
+        self.job_monitor = JobMonitor(self.session, min_interval=float(poll_intervals[0]), max_interval=float(poll_intervals[1]), debug=self.debug)
 
-    def make_requests_proxy_handler(self, proxies=None, verify=True, surpressSSLWarn=False):
 
-        spl_session = requests.Session()
-        if proxies is not None:
-            if self.debug:
-                print(f"Updating proxies")
-            spl_session.proxies.update(proxies)
+    def refresh_login(self):
+        """Log in again, unless another session already replaced the stale session key
+
+        Concurrent reconnects for the same host, port and user wait on one lock.
+        Whoever gets it first logs in and caches the new key; the others find a
+        different key in the cache and adopt it instead of logging in again.
+
+        Returns:
+            the splunklib Service, like splunklib's own login()
+        """
+        stale_token = self.session.token
+        with self._login_lock:
+            if self.session.token != stale_token:
+                # Another thread of this session logged in while we waited
+                return self.session
+
+            cached_key = self.token_cache.get(self.host, self.port, self.username) if self.token_cache is not None else None
+            if cached_key is not None and f"Splunk {cached_key}" != stale_token:
+                if self.debug:
+                    print("Adopting a session key refreshed by another session")
+                self.session.token = f"Splunk {cached_key}"
+                # Stale splunkd cookies would win over the token
+                self.session.get_cookies().clear()
+                return self.session
+
+            if self.token_cache is not None:
+                self.token_cache.invalidate(self.host, self.port, self.username)
+
+            self.session.password = self._password()
+            started = time.time()
+            try:
+                self._service_login()
+            finally:
+                self.session.password = None
+                self.login_seconds += time.time() - started
+            self.logins += 1
+
+            if self.token_cache is not None:
+                self.token_cache.put(self.host, self.port, self.username, self.session.token.replace("Splunk ", "", 1), self.token_ttl)
+            return self.session
+
+    def _count(self, name, value):
+        """Add to one of the running totals (they're updated from many threads)"""
+        with self._counter_lock:
+            setattr(self, name, getattr(self, name) + value)
+
+    def _make_retry(self, retries, backoff):
+        """Build the transport retry policy: idempotent requests only, jittered exponential backoff"""
+        retry_kwargs = {"total": retries,
+                        "connect": retries,
+                        "read": retries,
+                        "status": retries,
+                        "backoff_factor": backoff,
+                        "status_forcelist": [429, 502, 503, 504],
+                        "allowed_methods": frozenset(["GET", "HEAD", "OPTIONS", "DELETE"]),
+                        "respect_retry_after_header": True,
+                        # Hand the final error response to splunklib instead of raising here
+                        "raise_on_status": False}
+        try:
+            return Retry(backoff_jitter=backoff, **retry_kwargs)
+        except TypeError:
+            # urllib3 < 2 doesn't support jitter
+            return Retry(**retry_kwargs)
+
+    def _shared_session(self, proxies, verify, http_options):
+        """Return the requests session shared by every instance on this host, port, proxies, verify and pool/retry settings"""
+        # The timeouts are applied per request, only the settings baked into the adapter split the sessions
+        key = (self.base_url, repr(sorted((proxies or {}).items())), repr(verify),
+               int(http_options["pool_size"]), int(http_options["retries"]), float(http_options["backoff"]))
+        with _shared_sessions_lock:
+            spl_session = _shared_sessions.get(key)
+            if spl_session is not None:
+                if self.debug:
+                    print(f"Reusing the HTTP session for {self.base_url}")
+                return spl_session
+
+            spl_session = requests.Session()
+            if proxies is not None:
+                if self.debug:
+                    print(f"Updating proxies")
+                spl_session.proxies.update(proxies)
+
+            spl_session.verify = verify
+
+            # splunklib tracks the splunkd cookies itself, and since the session is
+            # shared between users it mustn't replay one user's cookies for another
+            spl_session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+            spl_session.headers.update({"Connection": "keep-alive"})
+
+            pool_size = int(http_options["pool_size"])
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size,
+                                  max_retries=self._make_retry(int(http_options["retries"]), float(http_options["backoff"])))
+            spl_session.mount("https://", adapter)
+            spl_session.mount("http://", adapter)
+
+            _shared_sessions[key] = spl_session
+            return spl_session
+
+    def make_requests_proxy_handler(self, proxies=None, verify=True, surpressSSLWarn=False, http_options=None):
+
+        http_options = dict(DEFAULT_HTTP_OPTIONS, **(http_options or {}))
 
         if self.debug:
             print(f"Setting verify to {verify}")
@@ -54,8 +265,13 @@ class SplunkAPI:
         if verify == "True":
             verify = True
 
+        spl_session = self._shared_session(proxies, verify, http_options)
+        self._http_session = spl_session
+        default_timeout = (float(http_options["connect_timeout"]), float(http_options["read_timeout"]))
+        # The export endpoint streams results as the search finds them and can go quiet for as long as
+        # the search runs, so only the connection is timed out for it
+        export_timeout = (float(http_options["connect_timeout"]), None)
 
-        spl_session.verify = verify
         if surpressSSLWarn or surpressSSLWarn == "True":
             if self.debug:
                 print("Disabling Warning")
@@ -68,7 +284,8 @@ class SplunkAPI:
             headers = dict(message.get("headers") or [])
             method = message.get("method", "GET")
             body = message.get("body", b"")
-            timeout = kwargs.get("timeout", None)
+            timeout = kwargs.get("timeout", None) or (export_timeout if "/jobs/export" in str(url) else default_timeout)
+            self._count("http_requests", 1)
 
             if self.debug:
                 print(f"Headers: {headers}")
@@ -83,14 +300,60 @@ class SplunkAPI:
                 stream=True,
             )
 
+            retries = getattr(resp.raw, "retries", None)
+            if retries is not None and len(retries.history) > 0:
+                self._count("transport_retries", len(retries.history))
+
             return {
                 "status": resp.status_code,
                 "reason": resp.reason,
                 "headers": list(resp.headers.items()),
-                "body": io.BytesIO(resp.content),
+                "body": io.BufferedReader(StreamingResponseBody(resp, on_read=lambda size: self._count("bytes_received", size)), buffer_size=self.stream_chunk_size),
             }
         return handler
 
+    def pool_stats(self, **kwargs):
+        """Report how well HTTP connections to this instance are being reused
+
+        Every new connection means a TCP (and TLS) handshake, so a low reuse
+        rate under parallel workloads points at a pool that's too small.
+
+        Returns:
+            (string): the request, connection and reuse counts of the shared pools
+        """
+        stats = self.http_pool_stats()
+        return (f"{stats['pools']} pools for {self.base_url}: {stats['requests']} requests over "
+                f"{stats['connections']} new connections (handshakes), {stats['reuse_rate'] * 100:.1f}% reuse. "
+                f"This session sent {self.http_requests} requests.")
+
+    def http_pool_stats(self):
+        """Collect the urllib3 pool counters of the shared HTTP session
+
+        Returns:
+            stats (dict): pools, requests, connections (handshakes) and reuse_rate
+        """
+        managers = []
+        for adapter in set(self._http_session.adapters.values()):
+            managers.append(adapter.poolmanager)
+            managers.extend(adapter.proxy_manager.values())
+
+        requests_made = 0
+        connections = 0
+        pools = 0
+        for manager in managers:
+            for key in list(manager.pools.keys()):
+                pool = manager.pools.get(key)
+                if pool is None:
+                    continue
+                pools += 1
+                requests_made += pool.num_requests
+                connections += pool.num_connections
+
+        return {"pools": pools,
+                "requests": requests_made,
+                "connections": connections,
+                "reuse_rate": 1 - connections / requests_made if requests_made > 0 else 0.0}
+
     def _handler(self, command, **kwargs):
         """Brokers Splunk API commands on behalf of the calling function
 
@@ -104,26 +367,107 @@ class SplunkAPI:
         """
         return getattr(self, command)(**kwargs)
     
-    def get_lookup_table_field_names(self, lookup_table_name):
+    def _export_chunks(self, query, chunk_size=10000, **kwargs):
+        """Stream a query's results from the export endpoint while the search runs
+
+        Args:
+            query (string): the query to run
+            chunk_size (int, optional): the number of rows per yielded chunk
+            **kwargs (dict): additional arguments for jobs.export (earliest_time, latest_time, ...)
+
+        Yields:
+            rows (list): lists of up to chunk_size result dicts, in the order they arrived
+        """
+        kwargs.update({"search_mode": "normal", "output_mode": "json"})
+        stream = self.session.jobs.export(query, **kwargs)
+        try:
+            reader = results.JSONResultsReader(stream)
+            rows = []
+            for each in reader:
+                # Messages are diagnostics, and preview rows are superseded by final results
+                if not isinstance(each, dict) or reader.is_preview:
+                    if self.debug and isinstance(each, results.Message):
+                        print(f"{each.type}: {each.message}")
+                    continue
+
+                rows.append(each)
+                if len(rows) >= chunk_size:
+                    yield rows
+                    rows = []
+
+            if len(rows) > 0:
+                yield rows
+        finally:
+            stream.close()
+
+    def get_lookup_table_field_names(self, lookup_table_name, refresh=False):
         """Retrieve the field names of a lookup table in Splunk
 
+        The names come from the lookup definition's fields_list when there is
+        one, otherwise from the first few rows of the table (never a full scan).
+        They are cached for lookup_schema_ttl seconds.
+
         Args:
             lookup_table_name (string): the name of the lookup table in Splunk
+            refresh (bool, optional): ignore the cached field names
 
         Returns:
             cols: a list of field names from the lookup table in Splunk
         """
-        kwargs = { "earliest_time": "-1m",
-                  "latest_time": "now",
-                  "search_mode": "normal",
-                  "output_mode": "json"}
-        
-        query = f"| inputlookup {lookup_table_name} | stats dc(*) as * | transpose | table column"
-        
-        job = self.session.jobs.export(query, **kwargs)
-        cols = [each["column"] for each in results.JSONResultsReader(job) if isinstance(each, dict)]
-        return cols
-    
+        return self._lookup_schema(lookup_table_name, refresh=refresh)[2]
+
+    def lookup_schema(self, **kwargs):
+        """Show the (cached) field names of a lookup table
+
+        Returns:
+            (string): the field names and where they came from
+        """
+        table = kwargs.get("table")
+        fetched, source, cols = self._lookup_schema(table, refresh=kwargs.get("refresh", False))
+        fields = ", ".join(f"`{col}`" for col in cols)
+        return f"{table} has {len(cols)} fields (from the {source}, fetched {int(time.time() - fetched)} seconds ago): {fields}"
+
+    def _lookup_schema(self, lookup_table_name, refresh=False):
+        cached = self._lookup_schemas.get(lookup_table_name)
+        if cached is not None and not refresh and time.time() - cached[0] < self.lookup_schema_ttl:
+            return cached
+
+        source = "lookup definition"
+        cols = self._lookup_definition_fields(lookup_table_name)
+        if cols is None:
+            source = "header of the table"
+            kwargs = { "earliest_time": "-1m",
+                      "latest_time": "now",
+                      "search_mode": "normal",
+                      "output_mode": "csv"}
+
+            # The CSV header lists every column of the lookup, even the ones that are empty in the row read
+            query = f"| inputlookup max=1 {lookup_table_name}"
+
+            job = self.session.jobs.export(query, **kwargs)
+            try:
+                header = next(csv.reader(io.StringIO(job.read().decode("utf-8"))), [])
+            finally:
+                job.close()
+            cols = [column for column in header if column != ""]
+
+        self._lookup_schemas[lookup_table_name] = (time.time(), source, cols)
+        return self._lookup_schemas[lookup_table_name]
+
+    def _lookup_definition_fields(self, lookup_table_name):
+        """Read the fields_list of a lookup definition over REST, None if there's no such definition"""
+        try:
+            response = self.session.get(f"data/transforms/lookups/{lookup_table_name}", output_mode="json")
+            entries = json.loads(response.body.read()).get("entry", [])
+        except Exception as e:
+            if self.debug:
+                print(f"No lookup definition for {lookup_table_name}: {str(e)}")
+            return None
+
+        if len(entries) == 0 or not entries[0].get("content", {}).get("fields_list"):
+            return None
+        return [field.strip() for field in entries[0]["content"]["fields_list"].split(",") if field.strip() != ""]
+
     def update_lookup_table(self, **kwargs):
         """Update a lookup table with a dataframe from Jupyter
 
@@ -153,43 +497,216 @@ class SplunkAPI:
                 raise
         
         # Run the lookup table update command    
+        self._lookup_schemas.pop(table, None)
         try:
-            user_dataframe_as_csv = user_dataframe.to_csv(index=False)
-            
-            kwargs_normal = { 
-                "earliest_time": "-1m", 
-                "latest_time": "now", 
-                "exec_mode": "normal"
-            }
-            
-            lookup_table_append_query = (f"| inputlookup {table}"
-                     f"| append [makeresults format=csv data=\"{user_dataframe_as_csv}\"]"
-                     "| uniq"
-                     f"| outputlookup {table}"
-            )
-            
-            job = self.session.jobs.create(lookup_table_append_query, **kwargs_normal)
-            jiu.displayMD(f"**[ * ]** Search job (**{job.name}**) has been created")
-            jiu.displayMD("**Progress**")
-            
-            while True:
-                while not job.is_ready():
-                    pass
+            chunksize = self._inline_chunksize(user_dataframe, max(1, int(kwargs.get("chunksize") or 5000)))
+            workers = max(1, int(kwargs.get("workers") or 4))
+
+            mode = kwargs.get("mode") or "full"
+            if mode != "full":
+                return self._sync_lookup_table(table, user_dataframe, mode, kwargs.get("keys"), chunksize, workers, refresh=kwargs.get("refresh", False))
 
-                stats = { 
-                         "isDone": job["isDone"],
-                         "doneProgress": float(job["doneProgress"])*100
-                }
+            self._forget_lookup_hashes(table)
 
-                print(f"\r\t%(doneProgress)03.1f" % stats, end="")
+            # Small tables fit in a single bounded job
+            if len(user_dataframe) <= chunksize:
+                lookup_table_append_query = (f"| inputlookup {table}"
+                         f"| append [| makeresults format=csv data=\"{spl_quote(user_dataframe.to_csv(index=False))}\"]"
+                         "| uniq"
+                         f"| outputlookup {table}"
+                )
 
-                if stats["isDone"] == "1":
-                    break
+                self._run_job(lookup_table_append_query, on_progress=lambda stats: print(f"\r\t%(doneProgress)03.1f" % stats, end=""))
+                return "**[ * ]** Job has completed!"
 
-                sleep(1)
-            
-            return "**[ * ]** Job has completed!"
+            # Bigger tables are staged chunk by chunk, then merged by one job that
+            # streams the staged lookups with inputlookup append=true (no subsearch limits)
+            staging_tables = self._stage_lookup_chunks(user_dataframe, chunksize, workers)
+            try:
+                lookup_table_merge_query = (f"| inputlookup {table}"
+                         + "".join(f"| inputlookup append=true {staging_table}" for staging_table in staging_tables)
+                         + "| uniq"
+                         + f"| outputlookup {table}"
+                )
+
+                jiu.displayMD(f"**[ * ]** Merging {len(staging_tables)} staged chunks into {table}")
+                self._run_job(lookup_table_merge_query, on_progress=lambda stats: print(f"\r\t%(doneProgress)03.1f" % stats, end=""))
+            finally:
+                self._delete_lookup_files(staging_tables)
+
+            return f"**[ * ]** Job has completed! Uploaded {len(user_dataframe)} rows in {len(staging_tables)} chunks."
         
         except Exception:
             raise
-            
+
+    def _sync_lookup_table(self, table, user_dataframe, mode, keys, chunksize, workers, refresh=False):
+        """Send only the rows that differ from the lookup table, based on hashes of a key set
+
+        Args:
+            table (string): the lookup table to update
+            user_dataframe (DataFrame): the rows to sync
+            mode (string): append (new keys only), upsert (new and changed rows) or delete (rows with these keys)
+            keys (string): comma separated columns identifying a row
+            chunksize (int): the number of rows per staging job
+            workers (int): the number of staging jobs run concurrently
+            refresh (bool, optional): fetch the table's hashes even if they're cached from the last sync
+
+        Returns:
+            (string): a simple string containing a success or error message
+        """
+        keys = [key.strip() for key in (keys or "").split(",") if key.strip() != ""]
+        if len(keys) == 0:
+            return f"The {mode} mode needs the key columns that identify a row. Pass them with --keys, e.g. --keys ip,port"
+
+        missing = [key for key in keys if key not in user_dataframe.columns]
+        if len(missing) > 0:
+            return f"The key column(s) {', '.join(missing)} aren't in your dataframe"
+
+        columns = user_dataframe.columns.values.tolist()
+        cache_key = (table, tuple(keys), tuple(columns))
+
+        existing = self._lookup_hashes.get(cache_key)
+        if existing is None or refresh:
+            jiu.displayMD(f"**[ * ]** Fetching the key hashes of {table}")
+            stream = self.session.jobs.export(lookup_sync.existing_hashes_query(table, keys, columns), earliest_time="-1m", latest_time="now", search_mode="normal", output_mode="json")
+            try:
+                existing = {each[lookup_sync.KEY_HASH_FIELD]: each[lookup_sync.ROW_HASH_FIELD]
+                            for each in results.JSONResultsReader(stream) if isinstance(each, dict)}
+            finally:
+                stream.close()
+
+        key_hashes = lookup_sync.hash_rows(user_dataframe, keys)
+        row_hashes = lookup_sync.hash_rows(user_dataframe, columns)
+        inserts, changes, deletes = lookup_sync.plan_changes(key_hashes, row_hashes, existing, mode)
+        jiu.displayMD(f"**[ * ]** {len(inserts)} new, {len(changes)} changed and {len(deletes)} deleted rows out of {len(user_dataframe)} (the table has {len(existing)} rows)")
+
+        if len(inserts) + len(changes) + len(deletes) == 0:
+            self._lookup_hashes[cache_key] = existing
+            return f"**[ * ]** {table} is already up to date, nothing was sent."
+
+        # Whatever was known about the table under other key or column sets is about to go stale
+        self._forget_lookup_hashes(table)
+
+        positions = sorted(inserts + changes + deletes)
+        staging_tables = self._stage_lookup_chunks(user_dataframe.iloc[positions], chunksize, workers)
+        try:
+            if mode == "delete":
+                query = lookup_sync.delete_query(table, staging_tables, keys)
+            elif len(changes) > 0:
+                query = lookup_sync.upsert_query(table, staging_tables, keys)
+            else:
+                # Only new keys, so the table doesn't need to be rewritten
+                query = lookup_sync.append_query(table, staging_tables)
+
+            self._run_job(query, on_progress=lambda stats: print(f"\r\t%(doneProgress)03.1f" % stats, end=""))
+        finally:
+            self._delete_lookup_files(staging_tables)
+
+        # Keep the hashes in step with what we just wrote, so the next sync doesn't need to fetch them
+        existing = dict(existing)
+        for position in positions:
+            if mode == "delete":
+                existing.pop(key_hashes[position], None)
+            else:
+                existing[key_hashes[position]] = row_hashes[position]
+        self._lookup_hashes[cache_key] = existing
+
+        return f"**[ * ]** Job has completed! Sent {len(positions)} of {len(user_dataframe)} rows to {table}."
+
+    def _forget_lookup_hashes(self, table):
+        """Drop the cached hashes of a lookup table (under every key and column set) before it's written"""
+        for cache_key in [cache_key for cache_key in self._lookup_hashes if cache_key[0] == table]:
+            del self._lookup_hashes[cache_key]
+
+    def _run_job(self, query, on_progress=None):
+        """Run a search job to completion, waiting on the job monitor
+
+        Args:
+            query (string): the query to run
+            on_progress (callable, optional): called with the job's stats whenever they change
+
+        Returns:
+            job: the finished splunklib search job
+        """
+        kwargs_normal = { 
+            "earliest_time": "-1m", 
+            "latest_time": "now", 
+            "exec_mode": "normal"
+        }
+
+        job = self.session.jobs.create(query, **kwargs_normal)
+        if on_progress is not None:
+            jiu.displayMD(f"**[ * ]** Search job (**{job.name}**) has been created")
+            jiu.displayMD("**Progress**")
+
+        self.job_monitor.wait(self.job_monitor.watch(job), on_progress=on_progress)
+        return job
+
+    def _inline_chunksize(self, user_dataframe, chunksize):
+        """Cap the rows per chunk so that a chunk's inline CSV stays under MAX_INLINE_CSV_CHARS
+
+        Args:
+            user_dataframe (DataFrame): the rows to upload
+            chunksize (int): the number of rows per chunk the user asked for
+
+        Returns:
+            chunksize (int): the (possibly) smaller number of rows per chunk
+        """
+        if len(user_dataframe) == 0:
+            return chunksize
+
+        # The row width is estimated from rows spread over the whole dataframe
+        sample = user_dataframe.iloc[::max(1, len(user_dataframe) // 1000)]
+        row_chars = len(spl_quote(sample.to_csv(index=False, header=False))) / len(sample)
+        return max(1, min(chunksize, int(MAX_INLINE_CSV_CHARS // max(row_chars, 1))))
+
+    def _stage_lookup_chunks(self, user_dataframe, chunksize, workers):
+        """Write a dataframe to temporary lookup files, one bounded job per chunk
+
+        Args:
+            user_dataframe (DataFrame): the rows to stage
+            chunksize (int): the number of rows in each chunk (and job)
+            workers (int): the number of chunk jobs run concurrently
+
+        Returns:
+            staging_tables (list): the names of the staged lookup files, in row order
+        """
+        prefix = f"jupyter_staging_{uuid.uuid4().hex[:12]}"
+        chunks = [(f"{prefix}_{number}.csv", user_dataframe.iloc[start:start + chunksize])
+                  for number, start in enumerate(range(0, len(user_dataframe), chunksize))]
+
+        def stage(staging_table, chunk):
+            self._run_job(f"| makeresults format=csv data=\"{spl_quote(chunk.to_csv(index=False))}\" | outputlookup {staging_table}")
+            return len(chunk)
+
+        jiu.displayMD(f"**[ * ]** Uploading {len(user_dataframe)} rows in {len(chunks)} chunks with {workers} workers")
+        jiu.displayMD("**Progress**")
+
+        staged = 0
+        uploaded = 0
+        pool = ThreadPoolExecutor(max_workers=workers)
+        try:
+            futures = [pool.submit(stage, staging_table, chunk) for staging_table, chunk in chunks]
+            for future in as_completed(futures):
+                uploaded += future.result()
+                staged += 1
+                print(f"\r\t{staged}/{len(chunks)} chunks\t\t{uploaded} rows", end="")
+        except BaseException:
+            # Stop at the first failure: queued chunks are dropped, and running ones are waited
+            # for so that none of them writes its staging file after the clean up
+            pool.shutdown(wait=True, cancel_futures=True)
+            self._delete_lookup_files([staging_table for staging_table, _ in chunks])
+            raise
+        finally:
+            pool.shutdown()
+
+        return [staging_table for staging_table, _ in chunks]
+
+    def _delete_lookup_files(self, lookup_files):
+        """Remove temporary lookup files through the lookup-table-files REST endpoint"""
+        for lookup_file in lookup_files:
+            try:
+                self.session.delete(f"data/lookup-table-files/{lookup_file}")
+            except Exception as e:
+                if self.debug:
+                    print(f"Unable to delete staging lookup {lookup_file}: {str(e)}")
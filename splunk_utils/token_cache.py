@@ -0,0 +1,122 @@
+import os
+import json
+import time
+import threading
+
+
+class TokenCache:
+    """An encrypted on-disk store of splunkd session keys
+
+    Session keys are kept per host, port and user with an expiry time, so a
+    restarted kernel can reuse a still valid session instead of logging in
+    again. The store is encrypted with Fernet from the optional cryptography
+    package, using a key file only the current user can read. Without
+    cryptography (or a readable key file) the keys are only cached in memory,
+    persistent is False and unavailable says why.
+    """
+
+    def __init__(self, directory=None, debug=False):
+        self.directory = directory or os.path.join(os.path.expanduser("~"), ".jupyter_splunk")
+        self.path = os.path.join(self.directory, "session_keys")
+        self.key_path = os.path.join(self.directory, "session_keys.key")
+        self.debug = debug
+        self._memory = {}
+        self._lock = threading.Lock()
+        self._fernet = None
+        self._fernet_loaded = False
+        self.unavailable = None
+
+    @property
+    def persistent(self):
+        """True if session keys are kept on disk and survive a kernel restart"""
+        return self._cipher() is not None
+
+    @staticmethod
+    def _entry_key(host, port, user):
+        return f"{user}@{host}:{port}"
+
+    def _cipher(self):
+        """Load (or create) the encryption key, None if cryptography isn't installed"""
+        if self._fernet_loaded:
+            return self._fernet
+        self._fernet_loaded = True
+
+        try:
+            from cryptography.fernet import Fernet
+        except ImportError:
+            self.unavailable = "the cryptography package isn't installed"
+            if self.debug:
+                print("cryptography isn't installed, session keys are only cached in memory")
+            return None
+
+        try:
+            os.makedirs(self.directory, mode=0o700, exist_ok=True)
+            if not os.path.exists(self.key_path):
+                descriptor = os.open(self.key_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+                with os.fdopen(descriptor, "wb") as key_file:
+                    key_file.write(Fernet.generate_key())
+            with open(self.key_path, "rb") as key_file:
+                self._fernet = Fernet(key_file.read())
+        except Exception as e:
+            self.unavailable = f"the key file {self.key_path} couldn't be loaded ({str(e)})"
+            if self.debug:
+                print(f"Unable to load the session key cache key: {str(e)}")
+        return self._fernet
+
+    def _read(self):
+        cipher = self._cipher()
+        if cipher is None or not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, "rb") as store:
+                return json.loads(cipher.decrypt(store.read()))
+        except Exception as e:
+            # A corrupt store or a rotated key just means logging in again
+            if self.debug:
+                print(f"Unable to read the session key cache: {str(e)}")
+            return {}
+
+    def _write(self, entries):
+        cipher = self._cipher()
+        if cipher is None:
+            return
+        temporary = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            descriptor = os.open(temporary, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(descriptor, "wb") as store:
+                store.write(cipher.encrypt(json.dumps(entries).encode("utf-8")))
+            os.replace(temporary, self.path)
+        except Exception as e:
+            if self.debug:
+                print(f"Unable to write the session key cache: {str(e)}")
+
+    def get(self, host, port, user):
+        """Return the cached session key for host, port and user, or None if there is no unexpired one"""
+        entry_key = self._entry_key(host, port, user)
+        with self._lock:
+            entry = self._memory.get(entry_key)
+            if entry is None:
+                entry = self._read().get(entry_key)
+            if entry is None or entry["expires"] <= time.time():
+                return None
+            self._memory[entry_key] = entry
+            return entry["session_key"]
+
+    def put(self, host, port, user, session_key, ttl):
+        """Cache a session key for ttl seconds"""
+        entry_key = self._entry_key(host, port, user)
+        entry = {"session_key": session_key, "expires": time.time() + float(ttl)}
+        with self._lock:
+            self._memory[entry_key] = entry
+            entries = {key: value for key, value in self._read().items() if value["expires"] > time.time()}
+            entries[entry_key] = entry
+            self._write(entries)
+
+    def invalidate(self, host, port, user):
+        """Forget the session key of host, port and user"""
+        entry_key = self._entry_key(host, port, user)
+        with self._lock:
+            self._memory.pop(entry_key, None)
+            entries = self._read()
+            if entries.pop(entry_key, None) is not None:
+                self._write(entries)
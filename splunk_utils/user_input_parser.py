@@ -1,12 +1,23 @@
 from argparse import ArgumentParser, BooleanOptionalAction
-from splunk_utils.splunk_api import SplunkAPI
 
 class UserInputParser(ArgumentParser):
     """A class to parse a user's line magic from Jupyter
     """
     
     def __init__(self, *args, **kwargs):
-        self.valid_commands = list(filter(lambda func : not func.startswith('_') and hasattr(getattr(SplunkAPI,func),'__call__') , dir(SplunkAPI)))
+        # The argparse trees are built when the first magic is parsed, not when the integration loads
+        self._built = False
+
+    @property
+    def valid_commands(self):
+        from splunk_utils.splunk_api import SplunkAPI
+        return list(filter(lambda func : not func.startswith('_') and hasattr(getattr(SplunkAPI,func),'__call__') , dir(SplunkAPI)))
+
+    def _build(self):
+        """Build the line magic and cell magic parsers"""
+        if self._built:
+            return
+
         self.parser = ArgumentParser(prog=r"%splunk")
         
         self.subparsers = self.parser.add_subparsers(dest="command")
@@ -17,10 +28,75 @@ class UserInputParser(ArgumentParser):
         self.parser_update_lookup_table.add_argument("-t", "--table", required=True, help="the lookup table to append to")
         self.parser_update_lookup_table.add_argument("-d", "--dataframe", required=True, help="the dataframe to append to the lookup table")
         self.parser_update_lookup_table.add_argument("--nocheck", default=False, action=BooleanOptionalAction, required=False, help="use this flag if you don't care about checking that your column headers match the field names in the Splunk lookup table (NOT RECOMMENDED!)")
-        
+        self.parser_update_lookup_table.add_argument("--chunksize", type=int, default=5000, required=False, help="the number of rows uploaded per search job (default: 5000, fewer if their CSV would make the search string too long)")
+        self.parser_update_lookup_table.add_argument("--workers", type=int, default=4, required=False, help="the number of chunks uploaded concurrently (default: 4)")
+        self.parser_update_lookup_table.add_argument("--mode", default="full", choices=["full", "append", "upsert", "delete"], required=False, help="full rewrites the table with every row (default). append sends only rows with new keys, upsert also replaces changed rows and delete removes the rows with these keys")
+        self.parser_update_lookup_table.add_argument("--keys", default=None, required=False, help="comma separated columns identifying a row, required by the append, upsert and delete modes")
+        self.parser_update_lookup_table.add_argument("--refresh", default=False, action="store_true", required=False, help="fetch the table's key hashes even if they're cached from the last sync")
+
+        # Subparser for "lookup_schema" command
+        self.parser_lookup_schema = self.subparsers.add_parser("lookup_schema", help="Show the field names of a lookup table in Splunk")
+        self.parser_lookup_schema.add_argument("-i", "--instance", required=True, help="the instance to run the command against")
+        self.parser_lookup_schema.add_argument("-t", "--table", required=True, help="the lookup table to describe")
+        self.parser_lookup_schema.add_argument("--refresh", default=False, action="store_true", required=False, help="fetch the field names again instead of using the cached ones")
+
+        # Subparser for "pool_stats" command
+        self.parser_pool_stats = self.subparsers.add_parser("pool_stats", help="Show HTTP connection pool reuse for an instance")
+        self.parser_pool_stats.add_argument("-i", "--instance", required=True, help="the instance to run the command against")
+
+        # Subparser for "history" command
+        self.parser_history = self.subparsers.add_parser("history", help="Show the search jobs dispatched from this notebook")
+        self.parser_history.add_argument("-i", "--instance", required=False, help="only show the jobs of this instance")
+
+        # Subparser for "saved" command
+        self.parser_saved = self.subparsers.add_parser("saved", help="Load the latest artifact of a saved search without running it")
+        self.parser_saved.add_argument("name", help="the name of the saved search")
+        self.parser_saved.add_argument("-i", "--instance", required=False, help="the instance the saved search lives on")
+        self.parser_saved.add_argument("-n", "--name", dest="bind", required=False, help="the variable to bind the results to (default: prev_splunk_<instance>)")
+
+        # Subparser for "stats" command
+        self.parser_stats = self.subparsers.add_parser("stats", help="Show the phase timings of recent queries")
+        self.parser_stats.add_argument("-i", "--instance", required=False, help="only show the queries of this instance")
+        self.parser_stats.add_argument("--clear", default=False, action="store_true", required=False, help="forget the recorded timings")
+        self.parser_stats.add_argument("--hook", required=False, help="the name of a callable in the notebook to call with every new timing record")
+        self.parser_stats.add_argument("--unhook", default=False, action="store_true", required=False, help="stop calling the hook")
+
+        # Subparser for "jobs" command
+        self.parser_jobs = self.subparsers.add_parser("jobs", help="Show the --background searches of this notebook")
+        self.parser_jobs.add_argument("-i", "--instance", required=False, help="only show the searches of this instance")
+
+        # Subparser for "cancel" command
+        self.parser_cancel = self.subparsers.add_parser("cancel", help="Cancel a --background search")
+        self.parser_cancel.add_argument("id", type=int, help="the id of the background search (see %%splunk jobs)")
+
+        # Subparser for "cache" command
+        self.parser_cache = self.subparsers.add_parser("cache", help="Show or clear the cached query results")
+        self.parser_cache.add_argument("-i", "--instance", required=False, help="only show or clear the cached results of this instance")
+        self.parser_cache.add_argument("--clear", default=False, action="store_true", required=False, help="remove the cached results instead of showing them")
+
+        # Parser for the first line of a %%splunk cell
+        self.cell_parser = ArgumentParser(prog=r"%%splunk")
+        self.cell_parser.add_argument("instance", nargs="?", default="", help="the instance to run the query against, or a comma separated list of instances to run it against concurrently")
+        self.cell_parser.add_argument("--all", default=False, action="store_true", help="run the query against every instance concurrently")
+        self.cell_parser.add_argument("--nocache", default=False, action="store_true", help="always run the query, even if its results are cached")
+        self.cell_parser.add_argument("--multi", default=False, action="store_true", help="run every query in the cell concurrently, binding each result to the name in its '# name' header")
+        self.cell_parser.add_argument("--delimiter", default="---", help="the line separating queries in --multi mode (default: ---)")
+        self.cell_parser.add_argument("--preview", default=False, action="store_true", help="show a refreshing preview of the results while the search runs, interrupt to stop early")
+        self.cell_parser.add_argument("--sid", default=None, help="load the results of an existing search job instead of running the query")
+        self.cell_parser.add_argument("--background", default=False, action="store_true", help="run the query on a worker thread and return right away, binding the results when it finishes")
+        self.cell_parser.add_argument("--name", dest="bind", default=None, help="the variable --background or a query on several instances binds the results to (default: prev_splunk_<instance>_bg<id> or prev_splunk_federated)")
+        self.cell_parser.add_argument("--export", default=False, action="store_true", help="stream results from the export endpoint while the search runs instead of waiting for the job to finish")
+        self.cell_parser_slicing = self.cell_parser.add_mutually_exclusive_group()
+        self.cell_parser_slicing.add_argument("--slices", type=int, default=None, help="split the query's time range into this many slices and run them concurrently (relative times are resolved in splunk_server_timezone, or the kernel's timezone)")
+        self.cell_parser_slicing.add_argument("--slice-by", dest="slice_by", default=None, help="split the query's time range into slices of this span (e.g. 6h, 1d, 1w) and run them concurrently")
+
+        self._built = True
+
     def display_help(self, command):
+        self._build()
         self.parser.parse_args([command, "--help"])
         
+
     def parse_input(self, input):
         """Parses the user's line magic from Jupyter
 
@@ -37,6 +113,7 @@ class UserInputParser(ArgumentParser):
             "input" : {}
         }
         
+        self._build()
         try:
             if len(input.strip().split("\n")) > 1:
                 parsed_input["error"] = True
@@ -50,4 +127,31 @@ class UserInputParser(ArgumentParser):
             parsed_input["error"] = True
             parsed_input["message"] = r"Invalid input received, see the output above. Try `%splunk --help` or `%splunk -h`"
         
+        return parsed_input
+
+    def parse_cell_input(self, input):
+        """Parses the first line of a %%splunk cell magic
+
+        Args:
+            input (string): the line following %%splunk (the instance and any options)
+
+        Returns:
+            parsed_input (dict): an object containing an error status, a message,
+                and the parsed cell options from argparse.parse()
+        """
+        parsed_input = {
+            "error" : False,
+            "message" : None,
+            "input" : {}
+        }
+
+        self._build()
+        try:
+            parsed_cell_options = self.cell_parser.parse_args(input.split())
+            parsed_input["input"].update(vars(parsed_cell_options))
+
+        except SystemExit:
+            parsed_input["error"] = True
+            parsed_input["message"] = r"Invalid cell options received, see the output above. Try `%%splunk --help` for proper formatting"
+
         return parsed_input
\ No newline at end of file
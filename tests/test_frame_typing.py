@@ -0,0 +1,36 @@
+import pandas as pd
+
+from splunk_utils.frame_typing import compact_dataframe, infer_types
+
+
+def test_numbers_are_converted():
+    dataframe, _, _ = compact_dataframe(pd.DataFrame({"count": ["1", "2", "3"], "ratio": ["0.5", "1.5", None]}), category_ratio=0)
+
+    assert pd.api.types.is_integer_dtype(dataframe["count"])
+    assert pd.api.types.is_float_dtype(dataframe["ratio"])
+
+
+def test_values_that_numbers_would_change_stay_strings():
+    dataframe, _, _ = compact_dataframe(pd.DataFrame({"zip": ["007", "123", "0"],
+                                                      "id": ["9007199254740993", None, "2"],
+                                                      "huge": ["92233720368547758070", "1", "2"]}), category_ratio=0)
+
+    assert dataframe["zip"].tolist() == ["007", "123", "0"]
+    assert dataframe["id"].iloc[0] == "9007199254740993"
+    assert dataframe["huge"].iloc[0] == "92233720368547758070"
+
+
+def test_time_column_becomes_datetime():
+    dataframe, _, _ = compact_dataframe(pd.DataFrame({"_time": ["2026-10-14T00:00:00.000+00:00", "2026-10-14T01:00:00.000+00:00"]}))
+
+    assert pd.api.types.is_datetime64_any_dtype(dataframe["_time"])
+
+
+def test_infer_types_gives_each_column_one_type():
+    pages = pd.concat([pd.DataFrame({"a": ["1", "2"], "b": ["1", "x"]}),
+                       pd.DataFrame({"a": ["3", None], "b": [2, 3]})], ignore_index=True)
+
+    dataframe = infer_types(pages)
+
+    assert pd.api.types.is_float_dtype(dataframe["a"])
+    assert dataframe["b"].tolist() == ["1", "x", "2", "3"]
@@ -0,0 +1,72 @@
+import datetime
+
+import pytest
+
+from splunk_utils import helper_functions
+
+
+NOW = datetime.datetime(2026, 10, 14, 15, 30, 45)  # a Wednesday
+
+
+def test_resolve_relative_and_snapped_times():
+    resolve = lambda value: helper_functions.resolve_splunk_time(value, now=NOW)
+
+    assert resolve("now") == int(NOW.timestamp())
+    assert resolve("-1h") == int(NOW.timestamp()) - 3600
+    assert resolve("-1d@d") == int(datetime.datetime(2026, 10, 13).timestamp())
+    assert resolve("@w0") == int(datetime.datetime(2026, 10, 11).timestamp())
+    assert resolve("-1mon@mon") == int(datetime.datetime(2026, 9, 1).timestamp())
+    assert resolve("1700000000") == 1700000000
+
+
+def test_resolve_in_the_server_timezone():
+    new_york = helper_functions.resolve_splunk_time("2026-10-14T00:00:00", timezone="America/New_York")
+    utc = helper_functions.resolve_splunk_time("2026-10-14T00:00:00", timezone="UTC")
+
+    assert new_york - utc == 4 * 3600
+    assert helper_functions.resolve_splunk_time("@d", timezone="UTC") % 86400 == 0
+
+
+def test_resolve_rejects_unknown_values():
+    with pytest.raises(ValueError):
+        helper_functions.resolve_splunk_time("yesterday")
+    with pytest.raises(ValueError):
+        helper_functions.resolve_splunk_time("now", timezone="Not/AZone")
+
+
+def test_slices_cover_the_range_without_overlapping():
+    assert helper_functions.slice_time_range(0, 10, count=3) == [(0, 4), (4, 8), (8, 10)]
+    assert helper_functions.slice_time_range(0, 86400 * 2, span="1d") == [(0, 86400), (86400, 86400 * 2)]
+
+
+def test_slices_need_a_range_and_a_size():
+    with pytest.raises(ValueError):
+        helper_functions.slice_time_range(10, 10, count=2)
+    with pytest.raises(ValueError):
+        helper_functions.slice_time_range(0, 10)
+    with pytest.raises(ValueError):
+        helper_functions.slice_time_range(0, 10, span="1fortnight")
+
+
+def test_slice_bounds_come_from_the_inline_modifiers():
+    query = "search index=x earliest=-7d@d latest=@d | fields host"
+
+    assert helper_functions.parse_times(query) == ("-7d@d", "@d")
+    assert "earliest" not in helper_functions.strip_time_modifiers(query)
+
+
+def test_unsliceable_commands():
+    assert helper_functions.unsliceable_commands("search x | stats count | sort - count") == ["sort", "stats"]
+    assert helper_functions.unsliceable_commands("search x | eval y=1 | table y") == []
+
+
+def test_fixed_times():
+    assert helper_functions.is_fixed_time("-1d@d")
+    assert helper_functions.is_fixed_time("2026-10-14T00:00:00")
+    assert not helper_functions.is_fixed_time("-15m")
+    assert not helper_functions.is_fixed_time("now")
+
+
+def test_split_queries():
+    cell = "# first\nsearch a\n---\nsearch b\n---\n\n"
+    assert helper_functions.split_queries(cell) == [("first", "search a"), (None, "search b")]
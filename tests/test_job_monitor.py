@@ -0,0 +1,106 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from splunk_utils.job_monitor import JobHandle, JobMonitor
+
+
+class FakeJob:
+    def __init__(self, sid):
+        self.sid = sid
+        self.refreshed = None
+
+    def refresh(self, state=None):
+        self.refreshed = state
+
+
+class FakeJobs:
+    """Answers /search/jobs listings from a {sid: content} dict, remembering each listing's filter"""
+
+    def __init__(self):
+        self.contents = {}
+        self.searches = []
+
+    def list(self, count=0, search=""):
+        self.searches.append(search)
+        sids = [term[len("sid="):] for term in search.split(" OR ")]
+        return [SimpleNamespace(content=dict(self.contents[sid], sid=sid), state={"sid": sid})
+                for sid in sids if sid in self.contents][:count]
+
+
+def monitor_with_jobs(**kwargs):
+    jobs = FakeJobs()
+    return JobMonitor(SimpleNamespace(jobs=jobs), **kwargs), jobs
+
+
+def track(monitor, sid):
+    """Watch a job without starting the monitor thread, so the test drives the ticks"""
+    handle = JobHandle(FakeJob(sid))
+    monitor._handles[sid] = handle
+    return handle
+
+
+def test_interval_backs_off_as_jobs_age():
+    monitor, _ = monitor_with_jobs(min_interval=0.2, max_interval=5.0, backoff=0.1)
+    assert monitor._interval() == 5.0
+
+    handle = track(monitor, "young")
+
+    assert monitor._interval() == 0.2
+    handle.created = time.time() - 20
+    assert monitor._interval() == pytest.approx(2.0, abs=0.05)
+    handle.created = time.time() - 3600
+    assert monitor._interval() == 5.0
+
+
+def test_tick_lists_only_the_watched_sids_in_batches():
+    monitor, jobs = monitor_with_jobs()
+    monitor.sids_per_request = 2
+    handles = [track(monitor, sid) for sid in ["a", "b", "c"]]
+    jobs.contents = {"a": {"isDone": "1", "dispatchState": "DONE", "resultCount": "7"},
+                     "b": {"isDone": "0", "dispatchState": "RUNNING", "doneProgress": "0.5"},
+                     "c": {"isFailed": "1", "dispatchState": "FAILED", "messages": {"error": "bad"}}}
+    monitor._tick()
+
+    assert jobs.searches == ["sid=a OR sid=b", "sid=c"]
+    assert handles[0].future.result()["resultCount"] == 7
+    assert handles[0].job.refreshed == {"sid": "a"}
+    assert not handles[1].future.done()
+    assert handles[1].stats["doneProgress"] == 50.0
+    with pytest.raises(Exception, match="failed"):
+        handles[2].future.result()
+    assert monitor.outstanding() == ["b"]
+
+
+def test_missing_jobs_fail_after_max_misses():
+    monitor, jobs = monitor_with_jobs()
+    handle = track(monitor, "gone")
+
+    for _ in range(monitor.max_misses):
+        monitor._tick()
+
+    with pytest.raises(Exception, match="no longer exists"):
+        handle.future.result()
+
+
+def test_wait_returns_the_final_stats():
+    monitor, jobs = monitor_with_jobs(min_interval=0.01)
+    jobs.contents = {"done": {"isDone": "1", "dispatchState": "DONE", "resultCount": "3"}}
+
+    stats = monitor.wait(monitor.watch(FakeJob("done")), interval=0.01)
+
+    assert stats["resultCount"] == 3
+    assert monitor.outstanding() == []
+
+
+def test_unwatch_cancels_and_wakes_waiters():
+    monitor, jobs = monitor_with_jobs()
+    jobs.contents = {"slow": {"isDone": "0", "dispatchState": "RUNNING"}}
+    handle = monitor.watch(FakeJob("slow"))
+
+    monitor.unwatch(handle)
+    monitor.unwatch(handle)
+
+    assert handle.future.cancelled()
+    assert monitor.outstanding() == []
@@ -0,0 +1,43 @@
+import io
+import csv
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+from splunk_utils import lookup_sync
+
+
+def stored_hashes(dataframe, keys, columns):
+    """Hash the rows the way existing_hashes_query() does once they're uploaded as CSV"""
+    stored = csv.DictReader(io.StringIO(dataframe.to_csv(index=False)))
+    md5 = lambda row, fields: hashlib.md5("|".join(row[field] for field in fields).encode("utf-8")).hexdigest()
+    return {md5(row, keys): md5(row, columns) for row in stored}
+
+
+def test_hashes_match_the_uploaded_csv():
+    dataframe = pd.DataFrame({"host": ["a", "b", "c,d", "e"],
+                              "score": [1.0, 2.5, np.nan, 1e20],
+                              "count": [1, 2, 3, 4],
+                              "note": ["x", None, "multi\nline", 'q"q']})
+    columns = dataframe.columns.tolist()
+    existing = stored_hashes(dataframe, ["host"], columns)
+
+    key_hashes = lookup_sync.hash_rows(dataframe, ["host"])
+    row_hashes = lookup_sync.hash_rows(dataframe, columns)
+
+    assert lookup_sync.plan_changes(key_hashes, row_hashes, existing, "upsert") == ([], [], [])
+
+
+def test_plan_changes():
+    existing = {"k1": "r1", "k2": "r2"}
+    key_hashes = ["k1", "k2", "k3"]
+    row_hashes = ["r1", "changed", "r3"]
+
+    assert lookup_sync.plan_changes(key_hashes, row_hashes, existing, "append") == ([2], [], [])
+    assert lookup_sync.plan_changes(key_hashes, row_hashes, existing, "upsert") == ([2], [1], [])
+    assert lookup_sync.plan_changes(key_hashes, row_hashes, existing, "delete") == ([], [], [0, 1])
+
+
+def test_csv_values_of_an_empty_dataframe():
+    assert lookup_sync.csv_values(pd.DataFrame({"a": []})) == []
@@ -0,0 +1,57 @@
+import pandas as pd
+
+from splunk_utils.result_cache import ResultCache
+
+
+def frame(rows):
+    return pd.DataFrame({"value": range(rows)})
+
+
+def test_keys_normalize_whitespace_and_include_the_result_format():
+    key = ResultCache.make_key("prod", "search  index=x\n| stats count", 1, 2, "fast", ("pandas", 0))
+
+    assert key == ResultCache.make_key("prod", "search index=x | stats count", 1.0, 2.0, "fast", ("pandas", 0))
+    assert key != ResultCache.make_key("prod", "search index=x | stats count", 1, 2, "fast", ("arrow", 0))
+    assert key != ResultCache.make_key("prod", "search index=x | stats count", 1, 2, "verbose", ("pandas", 0))
+
+
+def test_get_and_put():
+    cache = ResultCache()
+    cache.put(ResultCache.make_key("prod", "q", 1, 2), frame(3))
+
+    dataframe, age = cache.get(ResultCache.make_key("prod", "q", 1, 2))
+    assert len(dataframe) == 3 and age >= 0
+    assert cache.get("missing") == (None, None)
+    assert cache.entries()[0]["hits"] == 1
+
+
+def test_least_recently_used_entries_are_evicted():
+    cache = ResultCache(max_rows=10)
+    cache.put("a", frame(4))
+    cache.put("b", frame(4))
+    cache.get("a")
+    cache.put("c", frame(4))
+
+    assert cache.get("b") == (None, None)
+    assert cache.get("a")[0] is not None and cache.get("c")[0] is not None
+
+
+def test_entries_bigger_than_the_cache_are_refused():
+    cache = ResultCache(max_rows=10)
+    assert not cache.put("big", frame(11))
+    assert cache.entries() == []
+
+
+def test_expired_entries_are_misses():
+    cache = ResultCache(ttl=0)
+    cache.put("key", frame(1))
+    assert cache.get("key") == (None, None)
+
+
+def test_clear_one_instance():
+    cache = ResultCache()
+    cache.put(ResultCache.make_key("prod", "q", 1, 2), frame(1))
+    cache.put(ResultCache.make_key("dev", "q", 1, 2), frame(1))
+
+    assert cache.clear("prod") == 1
+    assert [entry["instance"] for entry in cache.entries()] == ["dev"]
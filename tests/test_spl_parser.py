@@ -0,0 +1,38 @@
+from splunk_utils import spl_parser
+
+
+def test_commands_and_subsearches():
+    parsed = spl_parser.parse_spl('index=web status=500 [search index=auth | fields user] | stats count by host | table host count')
+
+    assert [(command.name, command.depth) for command in parsed.commands] == [("search", 1), ("fields", 1), ("search", 0), ("stats", 0), ("table", 0)]
+    assert parsed.commands[2].implicit
+    assert parsed.pipes == 3
+    assert parsed.subsearches == 1
+    assert parsed.max_depth == 1
+    assert parsed.balanced
+
+
+def test_unbalanced_brackets():
+    assert not spl_parser.parse_spl("search index=x [search index=y").balanced
+    assert not spl_parser.parse_spl("search index=x ]").balanced
+
+
+def test_outer_times_ignore_subsearches_strings_and_eval():
+    query = ('search index=x earliest=-1d@d latest="now" "earliest=-5y" '
+             '[search index=y earliest=-7d | fields user] | eval earliest=1')
+
+    assert spl_parser.outer_times(query) == ("-1d@d", "now")
+    assert spl_parser.outer_times("search index=x | stats count") == (None, None)
+
+
+def test_last_time_modifier_wins():
+    assert spl_parser.outer_times("search earliest=-1d earliest=-2d") == ("-2d", None)
+
+
+def test_remove_time_modifiers():
+    query = "search index=x earliest=-1d latest=now | stats count"
+    assert " ".join(spl_parser.remove_time_modifiers(query).split()) == "search index=x | stats count"
+
+
+def test_lowercase_operators():
+    assert spl_parser.lowercase_operators('search a and b OR c "x or y" | eval z=if(a, "and", "or")') == ["and"]